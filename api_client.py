@@ -0,0 +1,44 @@
+"""Shared construction of the Doubleword API client."""
+
+import os
+import random
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, OpenAI, RateLimitError
+
+
+def create_client():
+    """Create an OpenAI-compatible client from DOUBLEWORD_* environment variables."""
+    return OpenAI(
+        api_key=os.environ['DOUBLEWORD_AUTH_TOKEN'],
+        base_url=os.environ['DOUBLEWORD_BASE_URL']
+    )
+
+
+def create_async_client():
+    """Create an async client for direct chat completions.
+
+    The SDK's own retries are disabled; realtime.py retries with jitter itself.
+    """
+    return AsyncOpenAI(
+        api_key=os.environ['DOUBLEWORD_AUTH_TOKEN'],
+        base_url=os.environ['DOUBLEWORD_BASE_URL'],
+        max_retries=0
+    )
+
+
+def retry_delay(error, attempt, base, cap):
+    """Seconds to wait before retry number attempt: Retry-After if given, else full jitter."""
+    if isinstance(error, APIStatusError):
+        retry_after = error.response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return min(cap, float(retry_after))
+            except ValueError:
+                pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_retryable(error):
+    """True for rate limits, connection problems, timeouts and server errors."""
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
@@ -0,0 +1,134 @@
+"""Streaming JSONL writer that shards batch requests by size.
+
+Requests are written to disk as soon as they are built instead of being held
+in memory, and the writer rolls over to a new shard file whenever the next
+request would push the current shard past its request, byte or estimated
+token budget. Shards are compressed as they are written (FILE_COMPRESSION,
+see compression.py); the byte budget applies to the uncompressed size the
+API receives. A manifest listing every shard is written on close so
+submit_batch.py can create one batch per shard. Requests written with a
+group (e.g. a model/prompt variant) only share shards with their own
+group, so each group is submitted as separate batches.
+"""
+
+import json
+import os
+from pathlib import Path
+from compression import compressed_suffix, open_text
+from token_estimator import estimate_request_tokens
+
+# Defaults follow the OpenAI-compatible batch limits (50,000 requests, 200 MB per file)
+DEFAULT_MAX_REQUESTS = 50000
+DEFAULT_MAX_MB = 200
+
+
+def build_request(custom_id, content, model, max_tokens, url):
+    """Build one chat-completions batch request line."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": url,
+        "body": {
+            "model": model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ],
+            "max_tokens": max_tokens
+        }
+    }
+
+
+class ShardedBatchWriter:
+    """Write batch requests to size-bounded shards plus a JSON manifest."""
+
+    def __init__(self, timestamp, output_dir='.', max_requests=DEFAULT_MAX_REQUESTS,
+                 max_bytes=DEFAULT_MAX_MB * 1024 * 1024, max_tokens=0, prefix='batch'):
+        self.timestamp = timestamp
+        self.output_dir = Path(output_dir)
+        self.prefix = prefix
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.max_tokens = max_tokens  # 0 disables the token budget
+        self.shards = []
+        self.total_requests = 0
+        self._files = {}    # group -> open file of its current shard
+        self._current = {}  # group -> its current shard entry
+
+    @classmethod
+    def from_env(cls, timestamp, output_dir='.', prefix='batch'):
+        """Create a writer with budgets taken from BATCH_MAX_* environment variables."""
+        return cls(
+            timestamp,
+            output_dir=output_dir,
+            prefix=prefix,
+            max_requests=int(os.getenv('BATCH_MAX_REQUESTS', str(DEFAULT_MAX_REQUESTS))),
+            max_bytes=int(float(os.getenv('BATCH_MAX_MB', str(DEFAULT_MAX_MB))) * 1024 * 1024),
+            max_tokens=int(os.getenv('BATCH_MAX_TOKENS', '0'))
+        )
+
+    @property
+    def manifest_path(self):
+        return self.output_dir / f'{self.prefix}_manifest_{self.timestamp}.json'
+
+    def _would_overflow(self, shard, line_bytes, tokens):
+        return (
+            shard['requests'] + 1 > self.max_requests
+            or shard['bytes'] + line_bytes > self.max_bytes
+            or (self.max_tokens and shard['estimated_tokens'] + tokens > self.max_tokens)
+        )
+
+    def _open_shard(self, group=None):
+        if group in self._files:
+            self._files[group].close()
+        name = f'{self.prefix}_requests_{self.timestamp}_{len(self.shards) + 1:03d}'
+        if group:
+            name += f'_{group}'
+        path = self.output_dir / f'{name}.jsonl{compressed_suffix()}'
+        self._files[group] = open_text(path, 'w')
+        shard = {'path': str(path), 'requests': 0, 'bytes': 0, 'estimated_tokens': 0}
+        if group:
+            shard['group'] = group
+        self.shards.append(shard)
+        self._current[group] = shard
+
+    def write_all(self, requests):
+        """Write every request and close; returns the manifest path."""
+        for request in requests:
+            self.write(request)
+        return self.close()
+
+    def write(self, request, group=None):
+        """Append one request to its group's shard, rolling over if a budget is reached."""
+        line = json.dumps(request) + '\n'
+        line_bytes = len(line.encode('utf-8'))
+        tokens = estimate_request_tokens(request)
+
+        # A request that alone exceeds a budget still gets a shard of its own
+        shard = self._current.get(group)
+        if shard is None or (shard['requests'] and self._would_overflow(shard, line_bytes, tokens)):
+            self._open_shard(group)
+
+        self._files[group].write(line)
+        shard = self._current[group]
+        shard['requests'] += 1
+        shard['bytes'] += line_bytes
+        shard['estimated_tokens'] += tokens
+        self.total_requests += 1
+
+    def close(self):
+        """Close the open shards and write the manifest; returns the manifest path."""
+        for file in self._files.values():
+            file.close()
+        self._files = {}
+
+        manifest = {
+            'timestamp': self.timestamp,
+            'total_requests': self.total_requests,
+            'shards': self.shards,
+        }
+        with open(self.manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return self.manifest_path
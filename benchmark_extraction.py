@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Benchmark text extraction per format and compare against a stored baseline.
+
+Runs every registered extractor over data/papers_samples plus a synthetic
+corpus (see generate_corpus.py) and reports throughput, latency percentiles
+and peak memory per format. PDFs are also timed through pdfplumber alone,
+so an upgrade of either PDF engine shows up. Each format runs in a fresh
+process so its peak RSS is not inflated by the others.
+
+  python benchmark_extraction.py                    # run, save, compare to baseline
+  python benchmark_extraction.py --save-baseline    # also make this run the baseline
+  python benchmark_extraction.py --sizes 10,200 --repeat 3
+  python benchmark_extraction.py --input-dir /path/to/docs --no-synthetic
+
+Results are written to data/benchmarks/extraction_YYYYMMDD_HHMMSS.json. The
+exit code is 2 if any metric regressed by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from extractors import extract_document, extractor_id, supported_extensions
+from generate_corpus import DEFAULT_OUTPUT_DIR, DEFAULT_SIZES, generate_corpus, parse_list
+
+BENCHMARK_DIR = Path('data/benchmarks')
+BASELINE_PATH = BENCHMARK_DIR / 'baseline.json'
+DEFAULT_INPUT_DIRS = ['data/papers_samples']
+
+# Metric name -> True if a higher value is better
+METRICS = {
+    'pages_per_s': True,
+    'mb_per_s': True,
+    'chars_per_s': True,
+    'p50_ms': False,
+    'p90_ms': False,
+    'p99_ms': False,
+    'peak_rss_mb': False,
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def _extract_pdfplumber_only(file_path):
+    """Extract every page of a PDF with pdfplumber, bypassing pypdf."""
+    from extractors import extract_pages_pdfplumber
+    import pdfplumber
+    with pdfplumber.open(file_path) as pdf:
+        count = len(pdf.pages)
+    texts = extract_pages_pdfplumber(file_path, range(count))
+    return {'text': '\f'.join(texts[n] for n in range(count)), 'pages': count, 'error': None}
+
+
+def run_group(paths, engine, repeat):
+    """Time each file in a group; runs in a fresh worker process.
+
+    Returns (per-file records, peak RSS in MB).
+    """
+    extract = _extract_pdfplumber_only if engine == 'pdfplumber' else extract_document
+    records = []
+    for path in paths:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = extract(path)
+            timings.append(time.perf_counter() - start)
+        records.append({
+            'path': path,
+            'bytes': os.path.getsize(path),
+            'pages': result['pages'],
+            'chars': len(result['text'] or ''),
+            'seconds': statistics.median(timings),
+            'error': result['error'],
+        })
+    return records, peak_rss_mb()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarise(records, rss):
+    """Aggregate per-file records into one group's metrics."""
+    ok = [record for record in records if not record['error']]
+    seconds = sum(record['seconds'] for record in ok) or float('nan')
+    latencies = [record['seconds'] * 1000 for record in ok] or [float('nan')]
+    return {
+        'files': len(ok),
+        'errors': len(records) - len(ok),
+        'pages': sum(record['pages'] for record in ok),
+        'mb': sum(record['bytes'] for record in ok) / 1024 / 1024,
+        'chars': sum(record['chars'] for record in ok),
+        'seconds': seconds,
+        'pages_per_s': sum(record['pages'] for record in ok) / seconds,
+        'mb_per_s': sum(record['bytes'] for record in ok) / 1024 / 1024 / seconds,
+        'chars_per_s': sum(record['chars'] for record in ok) / seconds,
+        'p50_ms': percentile(latencies, 0.5),
+        'p90_ms': percentile(latencies, 0.9),
+        'p99_ms': percentile(latencies, 0.99),
+        'peak_rss_mb': rss,
+    }
+
+
+def collect_files(input_dirs):
+    """Group supported files by benchmark group name (extension, plus pdf:pdfplumber)."""
+    extensions = supported_extensions()
+    groups = defaultdict(list)
+    for input_dir in input_dirs:
+        for path in sorted(Path(input_dir).iterdir()):
+            extension = path.suffix.lower()
+            if path.is_file() and extension in extensions:
+                groups[extension.lstrip('.')].append(str(path))
+                if extension == '.pdf':
+                    groups['pdf:pdfplumber'].append(str(path))
+    return dict(sorted(groups.items()))
+
+
+def run_benchmark(groups, repeat=1):
+    """Benchmark every group in its own process; returns {group: metrics}."""
+    results = {}
+    for group, paths in groups.items():
+        engine = 'pdfplumber' if group.endswith(':pdfplumber') else None
+        print(f"Benchmarking {group} ({len(paths)} files)...")
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            records, rss = executor.submit(run_group, paths, engine, repeat).result()
+        results[group] = summarise(records, rss)
+        for record in records:
+            if record['error']:
+                print(f"  ⚠ {Path(record['path']).name}: {record['error']}")
+    return results
+
+
+def environment():
+    """Describe the interpreter and extractor library versions."""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'extractors': {extension: extractor_id(extension) for extension in supported_extensions()},
+    }
+
+
+def print_results(results):
+    """Print a table of group metrics."""
+    print(f"\n{'format':<16}{'files':>6}{'pages/s':>10}{'MB/s':>8}{'chars/s':>12}"
+          f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'RSS MB':>8}")
+    for group, m in results.items():
+        rss = f"{m['peak_rss_mb']:.0f}" if m['peak_rss_mb'] is not None else '-'
+        print(f"{group:<16}{m['files']:>6}{m['pages_per_s']:>10.1f}{m['mb_per_s']:>8.2f}"
+              f"{m['chars_per_s']:>12,.0f}{m['p50_ms']:>9.1f}{m['p90_ms']:>9.1f}{m['p99_ms']:>9.1f}{rss:>8}")
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against a baseline run; returns a list of regression strings."""
+    regressions = []
+    print(f"\nComparison with baseline from {baseline.get('timestamp', 'unknown')} "
+          f"(tolerance {tolerance:.0%}):")
+    changed = [ext for ext, ident in environment()['extractors'].items()
+               if baseline.get('environment', {}).get('extractors', {}).get(ext) not in (None, ident)]
+    if changed:
+        print(f"  Extractor versions changed for: {', '.join(changed)}")
+
+    for group, metrics in results.items():
+        before = baseline.get('results', {}).get(group)
+        if not before:
+            print(f"  {group}: not in baseline")
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = before.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append(f"{group} {metric}: {old:,.1f} → {new:,.1f} ({change:+.0%})")
+            elif -worse > tolerance:
+                print(f"  ✓ {group} {metric}: {old:,.1f} → {new:,.1f} ({change:+.0%})")
+
+    for regression in regressions:
+        print(f"  ✗ {regression}")
+    if not regressions:
+        print("  ✓ No regressions")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark text extraction per format')
+    parser.add_argument('--input-dir', action='append', metavar='DIR',
+                        help='Folder of real documents (repeatable; default: data/papers_samples)')
+    parser.add_argument('--no-synthetic', action='store_true', help='Skip the synthetic corpus')
+    parser.add_argument('--corpus-dir', default=DEFAULT_OUTPUT_DIR, metavar='DIR',
+                        help=f'Synthetic corpus location (default: {DEFAULT_OUTPUT_DIR})')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), metavar='PAGES',
+                        help='Page counts of the synthetic files (default: 1,10,50)')
+    parser.add_argument('--repeat', type=int, default=1, metavar='N',
+                        help='Time each file N times and keep the median (default: 1)')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH), metavar='FILE',
+                        help=f'Baseline results to compare against (default: {BASELINE_PATH})')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, metavar='FRACTION',
+                        help='Relative change that counts as a regression (default: 0.2)')
+    args = parser.parse_args()
+
+    input_dirs = [d for d in (args.input_dir or DEFAULT_INPUT_DIRS) if Path(d).is_dir()]
+    if not args.no_synthetic:
+        # Regenerated every run so the corpus always matches --sizes
+        generate_corpus(args.corpus_dir, parse_list(args.sizes, int))
+        input_dirs.append(args.corpus_dir)
+
+    groups = collect_files(input_dirs)
+    if not groups:
+        print("Error: No documents to benchmark.")
+        exit(1)
+
+    results = run_benchmark(groups, args.repeat)
+    print_results(results)
+
+    run = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'inputs': input_dirs,
+        'sizes': None if args.no_synthetic else parse_list(args.sizes, int),
+        'repeat': args.repeat,
+        'environment': environment(),
+        'results': results,
+    }
+    BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+    output_path = BENCHMARK_DIR / f"extraction_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_path, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"\n✓ Results saved to {output_path}")
+
+    regressions = []
+    baseline_path = Path(args.baseline)
+    if baseline_path.exists():
+        with open(baseline_path, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    else:
+        print(f"No baseline at {baseline_path} (use --save-baseline to create one)")
+
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"✓ Baseline saved to {baseline_path}")
+
+    if regressions:
+        exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""Token-budgeted chunking and map-reduce bookkeeping for oversized documents.
+
+A document whose estimated tokens do not fit in one request is split on
+page boundaries (falling back to paragraphs, lines and finally characters
+for a single oversized page) and each chunk is summarised in the first
+batch. Once every chunk summary for a document has come back, a reduce
+request merges them into the final summary using summarisation_prompt.txt.
+The plan for each split document is kept in data/chunk_plans.json so the
+reduce step can be triggered from whichever batch delivers the last chunk.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from batch_writer import build_request
+from token_estimator import CHARS_PER_TOKEN, budget_max_tokens, context_tokens, estimate_tokens
+
+# Extractors separate pages/slides with a form feed so chunks can follow them
+PAGE_BREAK = '\f'
+
+CHUNK_PROMPT_FILE = 'chunk_summarisation_prompt.txt'
+CHUNK_SUMMARIES_DIR = Path('data/chunk_summaries')
+DEFAULT_PLANS_PATH = 'data/chunk_plans.json'
+
+REDUCE_HEADER = (
+    "The document was too long to read in one pass, so it was split into consecutive "
+    "sections and each section was summarised separately. Using only the section "
+    "summaries below, in document order, write the summary of the whole document."
+)
+
+# Serialises load-modify-save cycles when several batches finish at once
+_lock = threading.Lock()
+# Documents whose reduce request is being submitted by a thread of this process
+_submitting = set()
+
+
+def flatten_pages(text):
+    """Replace page breaks with plain newlines before text goes into a prompt."""
+    return text.replace(PAGE_BREAK, '\n')
+
+
+def document_token_budget(prompt, max_tokens):
+    """Return how many document tokens fit in one request with the prompt and output.
+
+    CHUNK_MAX_TOKENS overrides the budget; otherwise it is derived from
+    MODEL_CONTEXT_TOKENS with 10% headroom for estimation error.
+    """
+    override = os.getenv('CHUNK_MAX_TOKENS')
+    if override:
+        return int(override)
+    return int((context_tokens() - max_tokens) * 0.9) - estimate_tokens(prompt)
+
+
+def _pack(pieces, max_chars, separator):
+    """Greedily join pieces into chunks of at most max_chars characters."""
+    chunks = []
+    current = []
+    size = 0
+    for piece in pieces:
+        if len(piece) > max_chars:
+            if current:
+                chunks.append(separator.join(current))
+                current, size = [], 0
+            chunks.extend(_split_oversized(piece, max_chars))
+            continue
+        added = len(piece) + (len(separator) if current else 0)
+        if current and size + added > max_chars:
+            chunks.append(separator.join(current))
+            current, size = [], 0
+            added = len(piece)
+        current.append(piece)
+        size += added
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def _split_oversized(piece, max_chars):
+    """Split a single page that exceeds the budget on paragraphs, lines, then characters."""
+    for separator in ('\n\n', '\n'):
+        parts = piece.split(separator)
+        if len(parts) > 1:
+            return _pack(parts, max_chars, separator)
+    return [piece[i:i + max_chars] for i in range(0, len(piece), max_chars)]
+
+
+def chunk_text(text, max_tokens):
+    """Split text into chunks of at most max_tokens estimated tokens, on page boundaries."""
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    chunks = _pack(text.split(PAGE_BREAK), max_chars, PAGE_BREAK)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def load_chunk_prompt(word_count):
+    """Read the per-chunk prompt and substitute the final summary word count."""
+    with open(CHUNK_PROMPT_FILE, 'r') as f:
+        return f.read().replace('{WORD_COUNT}', str(word_count))
+
+
+def reduce_content(prompt, chunk_summaries):
+    """Build the reduce message from the summary prompt and ordered chunk summaries."""
+    sections = '\n\n'.join(
+        f"### Section {i} of {len(chunk_summaries)}\n\n{summary}"
+        for i, summary in enumerate(chunk_summaries, 1)
+    )
+    return f"{prompt}\n\n{REDUCE_HEADER}\n\nSection summaries:\n\n{sections}"
+
+
+def plans_path():
+    """Return the chunk plan location from CHUNK_PLANS or the default."""
+    return Path(os.getenv('CHUNK_PLANS', DEFAULT_PLANS_PATH))
+
+
+class ChunkPlans:
+    """JSON-backed record of split documents awaiting their reduce step."""
+
+    def __init__(self, path, plans=None):
+        self.path = Path(path)
+        self.plans = plans or {}  # final summary custom_id -> plan
+        self.by_chunk = {
+            chunk_id: summary_id
+            for summary_id, plan in self.plans.items()
+            for chunk_id in plan['chunk_ids']
+        }
+
+    @classmethod
+    def load(cls, path=None):
+        """Load the plans, or return an empty set if none exist yet."""
+        path = Path(path) if path else plans_path()
+        if not path.exists():
+            return cls(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(path, json.load(f))
+
+    def save(self):
+        """Write the plans atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.plans, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, summary_id, chunk_ids, source, prompt, model, max_tokens, url, word_count=None):
+        """Register a split document and what its reduce request should look like.
+
+        A max_tokens of None budgets the reduce request from its length and
+        word_count when it is built.
+        """
+        self.plans[summary_id] = {
+            'source': str(source),
+            'chunk_ids': chunk_ids,
+            'chunk_summaries': {},
+            'prompt': prompt,
+            'model': model,
+            'max_tokens': max_tokens,
+            'word_count': word_count,
+            'url': url,
+            'status': 'mapping',
+        }
+        for chunk_id in chunk_ids:
+            self.by_chunk[chunk_id] = summary_id
+
+    def record(self, chunk_id, summary_path):
+        """Store a chunk summary of a split document."""
+        summary_id = self.by_chunk.get(chunk_id)
+        if summary_id is not None:
+            self.plans[summary_id]['chunk_summaries'][chunk_id] = str(summary_path)
+
+    def ready(self):
+        """summary_ids of documents with every chunk summary in and no reduce submitted yet."""
+        return [summary_id for summary_id, plan in self.plans.items()
+                if plan['status'] == 'mapping' and len(plan['chunk_summaries']) == len(plan['chunk_ids'])]
+
+    def mark_reducing(self, summary_id, batch_ids):
+        """Record the batches a document's reduce request was submitted in."""
+        plan = self.plans.get(summary_id)
+        if plan is not None:
+            plan['status'] = 'reducing'
+            plan['reduce_batch_ids'] = list(batch_ids)
+
+    def reduce_request(self, summary_id):
+        """Build the batch request that merges a document's chunk summaries."""
+        plan = self.plans[summary_id]
+        chunk_summaries = []
+        for chunk_id in plan['chunk_ids']:
+            with open(plan['chunk_summaries'][chunk_id], 'r', encoding='utf-8') as f:
+                chunk_summaries.append(f.read())
+        content = reduce_content(plan['prompt'], chunk_summaries)
+        max_tokens = plan['max_tokens'] or budget_max_tokens(estimate_tokens(content), plan['word_count'])
+        return build_request(summary_id, content, plan['model'], max_tokens, plan['url'])
+
+    def finish(self, summary_id):
+        """Drop a reduced document's plan and its chunk summary files; True if one existed."""
+        plan = self.plans.pop(summary_id, None)
+        if plan is None:
+            return False
+        for chunk_id in plan['chunk_ids']:
+            self.by_chunk.pop(chunk_id, None)
+        for path in plan['chunk_summaries'].values():
+            Path(path).unlink(missing_ok=True)
+        return True
+
+
+def record_chunk_results(saved_chunks, finished_summaries):
+    """Update plans with new chunk summaries and finished reduces.
+
+    saved_chunks is a list of (chunk_id, summary_path) and
+    finished_summaries a list of final summary custom_ids. Returns the
+    reduce requests for documents whose chunks are all in, including any
+    whose reduce failed to submit before. Pass their custom_ids to
+    record_reduce_batches() once submitted, or after a failed attempt.
+    """
+    with _lock:
+        if not plans_path().exists():
+            return []
+        plans = ChunkPlans.load()
+        for chunk_id, path in saved_chunks:
+            plans.record(chunk_id, path)
+        ready = [summary_id for summary_id in plans.ready() if summary_id not in _submitting]
+        _submitting.update(ready)
+        reduce_requests = [plans.reduce_request(summary_id) for summary_id in ready]
+        finished = [summary_id for summary_id in finished_summaries if plans.finish(summary_id)]
+        if saved_chunks or finished:
+            plans.save()
+        return reduce_requests
+
+
+def record_reduce_batches(summary_ids, batch_ids):
+    """Mark reduce requests as submitted in batch_ids, or release them for a retry if there are none.
+
+    A document is only marked as reducing once its request was accepted,
+    so a submission that fails is sent again by the next
+    record_chunk_results() call, in this run or a later one.
+    """
+    with _lock:
+        _submitting.difference_update(summary_ids)
+        if not summary_ids or not batch_ids:
+            return
+        plans = ChunkPlans.load()
+        for summary_id in summary_ids:
+            plans.mark_reducing(summary_id, batch_ids)
+        plans.save()
@@ -0,0 +1,147 @@
+"""Compressed storage for batch request shards and downloaded result files.
+
+FILE_COMPRESSION selects how new files are written: gzip (default), zstd
+or none. Readers choose the format from the file suffix (.gz, .zst), so
+files written under an earlier setting, or uncompressed by older versions,
+can still be read. zstd needs the zstandard package (pip install
+zstandard).
+
+Files are always read and written as streams, one buffer at a time.
+UploadStream exposes a compressed request file to the HTTP client as its
+uncompressed bytes, which the API expects, without decompressing it into
+memory first.
+"""
+
+import gzip
+import io
+import os
+from pathlib import Path
+
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst', 'none': ''}
+
+# Buffer size for streaming reads
+CHUNK_SIZE = 1024 * 1024
+
+
+def compression():
+    """Return the FILE_COMPRESSION setting for new files."""
+    name = os.getenv('FILE_COMPRESSION', 'gzip').lower()
+    if name not in SUFFIXES:
+        raise SystemExit(f"Error: unknown FILE_COMPRESSION '{name}' (use gzip, zstd or none)")
+    return name
+
+
+def compressed_suffix():
+    """Return the suffix appended to new JSONL files ('.gz', '.zst' or '')."""
+    return SUFFIXES[compression()]
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise SystemExit("Error: zstd compression requested but zstandard is not installed "
+                         "(pip install zstandard)")
+    return zstandard
+
+
+def open_binary(path, mode='rb'):
+    """Open a file for binary reading ('rb'), writing ('wb') or appending ('ab').
+
+    Data is compressed or decompressed according to the path's suffix.
+    Reading a file made of several appended gzip members or zstd frames
+    returns all of them in order.
+    """
+    name = str(path)
+    if name.endswith('.gz'):
+        return gzip.open(path, mode)
+    if name.endswith('.zst'):
+        zstandard = _zstandard()
+        if mode == 'rb':
+            reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True,
+                                                                closefd=True)
+            return io.BufferedReader(reader, CHUNK_SIZE)
+        return zstandard.ZstdCompressor().stream_writer(open(path, mode), closefd=True)
+    return open(path, mode)
+
+
+def open_text(path, mode='r'):
+    """Open a possibly compressed file as UTF-8 text for reading, writing or appending."""
+    return io.TextIOWrapper(open_binary(path, mode[0] + 'b'), encoding='utf-8')
+
+
+def temporary_path(path):
+    """Return a sibling path for an atomic rewrite that keeps the compression suffix."""
+    path = Path(path)
+    return path.with_name(f'{path.stem}.tmp{path.suffix}')
+
+
+def uncompressed_name(path):
+    """Return a file's name without its compression suffix."""
+    name = Path(path).name
+    for suffix in SUFFIXES.values():
+        if suffix and name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def uncompressed_size(path):
+    """Return the number of bytes a possibly compressed file expands to."""
+    if not any(str(path).endswith(suffix) for suffix in SUFFIXES.values() if suffix):
+        return os.path.getsize(path)
+    size = 0
+    with open_binary(path) as f:
+        while chunk := f.read(CHUNK_SIZE):
+            size += len(chunk)
+    return size
+
+
+class UploadStream(io.RawIOBase):
+    """Read-only stream of a request file's uncompressed bytes for uploading.
+
+    The HTTP client reads it in chunks while sending. Its uncompressed
+    size is worked out up front by streaming through the file once, so the
+    upload can carry a Content-Length without the payload ever being in
+    memory. Rewinding to the start, as a retried upload does, reopens the
+    file.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.name = uncompressed_name(path)
+        self.size = uncompressed_size(path)
+        self._file = open_binary(path)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._file.read(len(buffer))
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Support seeking to the end (to report the size) and back to the start only."""
+        if whence == io.SEEK_END and offset == 0:
+            self._position = self.size
+        elif whence == io.SEEK_SET and offset == 0:
+            self._file.close()
+            self._file = open_binary(self.path)
+            self._position = 0
+        elif not (whence == io.SEEK_SET and offset == self._position):
+            raise io.UnsupportedOperation('UploadStream can only seek to its start or end')
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
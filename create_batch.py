@@ -1,29 +1,147 @@
 #!/usr/bin/env python3
 """Create JSONL batch requests with support for multiple document formats.
 
-Supported formats: PDF, DOCX, PPTX, ODP, TXT, MD
+Supported formats: PDF, DOCX, PPTX, ODP, TXT, MD, plus any registered
+through EXTRACTOR_PLUGINS (see extractors.py)
 """
 
-import json
 import os
 import argparse
+import time
+from contextlib import nullcontext
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import islice
 from pathlib import Path
-from pypdf import PdfReader
-import pdfplumber
-from docx import Document
-from pptx import Presentation
-from odf.opendocument import load as load_odf
-from odf.text import P
-from odf.draw import Frame
-import glob
 from dotenv import load_dotenv
 from datetime import datetime
+from batch_writer import ShardedBatchWriter, build_request
+from chunking import (ChunkPlans, chunk_text, document_token_budget,
+                      flatten_pages, load_chunk_prompt)
+from dedup import DuplicateIndex, DuplicateLinks, add_dedup_arguments
+from discovery import add_discovery_arguments, discovery_options, iter_files, largest_first
+from extraction_budget import add_budget_arguments, budget_from_args
+from extraction_cache import ExtractionCache, file_sha256, DEFAULT_CACHE_DIR, DEFAULT_MAX_MB
+from extraction_watchdog import ExtractionSupervisor, limits_from_env
+import metrics
+from extractors import (extract_document, extractor_id, get_extractor, load_plugins, merge_results,
+                        page_ranges, supported_extensions)
+from request_ids import chunk_custom_id, chunk_stem, path_hash, safe_stem, summary_custom_id
+from summary_manifest import SummaryManifest, document_key, prompt_hash, record_summaries, same_source
+from text_normalisation import DEFAULT_STEPS, format_savings, normalise_text, parse_steps, savings, steps_identity
+from token_estimator import budget_max_tokens, estimate_tokens
+from variants import load_variants
+
+
+def cache_lookup(cache, file_path, budget=None):
+    """Return (cache_key, cached_result) for a file; either may be None."""
+    file_extension = Path(file_path).suffix.lower()
+    if cache is None or get_extractor(file_extension) is None:
+        return None, None
+    try:
+        key = cache.key(file_sha256(file_path), extractor_id(file_extension, budget))
+    except OSError:
+        return None, None
+    entry = cache.get(key)
+    if entry is None:
+        return key, None
+    return key, {'text': entry['text'], 'pages': entry['pages'], 'method': entry['method'],
+                 'error': None, 'notes': [], 'import_times': {}, 'page_engines': {}, 'cached': True}
+
+
+def cache_store(cache, key, result):
+    """Store a successful extraction result in the cache."""
+    if cache is not None and key is not None and not result['error']:
+        cache.put(key, result['text'], result['pages'], result['method'])
 
-# Parse command line arguments
-parser = argparse.ArgumentParser(
-    description='Create JSONL batch requests from documents',
-    formatter_class=argparse.RawDescriptionHelpFormatter,
-    epilog='''
+
+def file_size(file_path):
+    """Return the size of a file in bytes, or 0 if it cannot be read."""
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def iter_extractions(all_files, workers=1, cache=None, pages_per_task=0, timeout=0, memory_mb=0, budget=None):
+    """Yield (file_path, result) for each file, always in input order.
+
+    all_files may be any iterable, including a generator that is still
+    discovering files; it is consumed only as fast as extraction proceeds.
+    Files found in the extraction cache are returned without being parsed.
+    With workers > 1, the remaining files are fanned out across a process
+    pool, keeping a window of EXTRACTION_PREFETCH files per worker queued
+    ahead. Within the window the largest files are submitted first so a
+    single huge PDF starts early instead of becoming the tail. Results are
+    still yielded in the original order so the output JSONL is
+    deterministic regardless of completion order. With pages_per_task > 0,
+    documents longer than that (PDFs) are split into page ranges extracted
+    by separate workers, unless an extraction budget (see
+    extraction_budget.py) means only part of each document is read.
+
+    With a timeout or memory_mb limit, extractions run in reusable
+    supervised child processes (see extraction_watchdog.py) and the pool
+    is a thread pool that hands them work.
+    """
+    supervisor = None
+    if timeout or memory_mb:
+        supervisor = ExtractionSupervisor(timeout, memory_mb, budget)
+        extract = supervisor.extract
+        executor_class = ThreadPoolExecutor
+    else:
+        extract = partial(extract_document, budget=budget)
+        executor_class = ProcessPoolExecutor
+    if budget is not None:
+        pages_per_task = 0
+
+    with supervisor or nullcontext():
+        if workers <= 1:
+            for file_path in all_files:
+                key, result = cache_lookup(cache, file_path, budget)
+                if result is None:
+                    result = extract(file_path)
+                    cache_store(cache, key, result)
+                yield file_path, result
+            return
+
+        files = iter(all_files)
+        window = workers * int(os.getenv('EXTRACTION_PREFETCH', '4'))
+        # Files read ahead, in input order: [file_path, cache key, cached result, futures]
+        queued = deque()
+
+        # Workers register plugin extractors themselves when the pool uses spawn
+        with executor_class(max_workers=workers, initializer=load_plugins) as executor:
+            def refill():
+                batch = []
+                for file_path in islice(files, window - len(queued)):
+                    key, result = cache_lookup(cache, file_path, budget)
+                    batch.append([file_path, key, result, None])
+                for item in sorted((item for item in batch if item[2] is None),
+                                   key=lambda item: file_size(item[0]), reverse=True):
+                    ranges = page_ranges(item[0], pages_per_task) if pages_per_task else None
+                    item[3] = [executor.submit(extract, item[0], page_range) for page_range in ranges or [None]]
+                queued.extend(batch)
+
+            refill()
+            while queued:
+                file_path, key, result, futures = queued.popleft()
+                if result is None:
+                    results = [future.result() for future in futures]
+                    result = results[0] if len(results) == 1 else merge_results(results)
+                    if len(results) > 1:
+                        result['notes'].insert(0, f"Extracted in {len(results)} page ranges")
+                    cache_store(cache, key, result)
+                refill()
+                yield file_path, result
+
+
+def build_parser():
+    """Return the command line parser for this stage."""
+    parser = argparse.ArgumentParser(
+        description='Create JSONL batch requests from documents',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
 Examples:
   # Process all files in default directory (data/papers/)
   python create_batch.py
@@ -33,227 +151,558 @@ Examples:
 
   # Process all files in a custom directory
   python create_batch.py --input-dir /path/to/documents/
-'''
-)
-parser.add_argument(
-    '--files',
-    nargs='+',
-    metavar='FILE',
-    help='Specific file paths to process'
-)
-parser.add_argument(
-    '--input-dir',
-    metavar='DIR',
-    help='Directory to scan for documents (default: data/papers/)'
-)
-
-args = parser.parse_args()
-
-# Load environment variables
-load_dotenv()
-
-# Read summarization prompt and substitute word count
-with open('summarisation_prompt.txt', 'r') as f:
-    prompt_template = f.read()
-
-# Substitute word count from environment variable (default to 2000)
-word_count = os.getenv('SUMMARY_WORD_COUNT', '2000')
-prompt_template = prompt_template.replace('{WORD_COUNT}', word_count)
-
-# Print environment variables being used
-print("Environment Variables:")
-print(f"  SUMMARY_WORD_COUNT: {word_count}")
-print(f"  CHAT_COMPLETIONS_ENDPOINT: {os.getenv('CHAT_COMPLETIONS_ENDPOINT', '/v1/chat/completions')}")
-print(f"  DOUBLEWORD_MODEL: {os.getenv('DOUBLEWORD_MODEL', 'Qwen/Qwen3-VL-235B-A22B-Instruct-FP8')}")
-print(f"  MAX_TOKENS: {os.getenv('MAX_TOKENS', '5000')}")
-print()
-
-# Collect files based on arguments
-supported_extensions = ['*.pdf', '*.txt', '*.md', '*.docx', '*.pptx', '*.odp']
-all_files = []
-
-if args.files:
-    # Use specific files provided
-    all_files = [str(Path(f).resolve()) for f in args.files]
-    print(f"Processing {len(all_files)} specified file(s)\n")
-elif args.input_dir:
-    # Scan custom directory
-    input_dir = Path(args.input_dir)
-    if not input_dir.exists():
-        print(f"Error: Directory '{args.input_dir}' does not exist")
-        exit(1)
-    for ext in supported_extensions:
-        all_files.extend(glob.glob(str(input_dir / ext)))
-    all_files.sort()
-    print(f"Found {len(all_files)} files in {args.input_dir}\n")
-else:
-    # Default: scan data/papers directory
-    for ext in supported_extensions:
-        all_files.extend(glob.glob(f'data/papers/{ext}'))
-    all_files.sort()
-    print(f"Found {len(all_files)} files in data/papers/\n")
-
-requests = []
-failed_files = []
-extraction_stats = {'pypdf': 0, 'pdfplumber': 0, 'txt': 0, 'docx': 0, 'pptx': 0, 'odp': 0}
-
-def extract_text_pypdf(pdf_path):
-    """Try pypdf first (faster)."""
-    with open(pdf_path, 'rb') as f:
-        reader = PdfReader(f)
-        text = '\n'.join(page.extract_text() for page in reader.pages)
-        return text, len(reader.pages)
-
-def extract_text_pdfplumber(pdf_path):
-    """Fallback to pdfplumber (more robust but slower)."""
-    with pdfplumber.open(pdf_path) as pdf:
-        text = '\n'.join((page.extract_text() or '') for page in pdf.pages)
-        return text, len(pdf.pages)
-
-def extract_from_text(file_path):
-    """Extract text from .txt or .md files."""
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        text = f.read()
-        return text, 1
-
-def extract_from_docx(file_path):
-    """Extract text from .docx files."""
-    doc = Document(file_path)
-    paragraphs = [para.text for para in doc.paragraphs]
-    text = '\n'.join(paragraphs)
-    # Estimate pages (rough: 500 words per page)
-    word_count = len(text.split())
-    pages = max(1, word_count // 500)
-    return text, pages
-
-def extract_from_pptx(file_path):
-    """Extract text from .pptx files."""
-    prs = Presentation(file_path)
-    text_runs = []
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                text_runs.append(shape.text)
-    text = '\n'.join(text_runs)
-    return text, len(prs.slides)
-
-def extract_from_odp(file_path):
-    """Extract text from .odp files."""
-    doc = load_odf(file_path)
-    text_runs = []
-    # Extract all text paragraphs
-    for paragraph in doc.getElementsByType(P):
-        text_content = ''.join(node.data for node in paragraph.childNodes if hasattr(node, 'data'))
-        if text_content.strip():
-            text_runs.append(text_content)
-    text = '\n'.join(text_runs)
-    # Count frames as slide estimate
-    frames = doc.getElementsByType(Frame)
-    pages = max(1, len(frames))
-    return text, pages
-
-for idx, file_path in enumerate(all_files, 1):
-    print(f"[{idx}/{len(all_files)}] Processing {file_path}...")
-
-    text = None
-    pages = 0
-    extraction_method = None
-    file_extension = Path(file_path).suffix.lower()
 
-    try:
-        # Route to appropriate extraction method based on file type
-        if file_extension == '.pdf':
-            # Try pypdf first (faster), fallback to pdfplumber
-            try:
-                text, pages = extract_text_pypdf(file_path)
-                extraction_method = 'pypdf'
-                extraction_stats['pypdf'] += 1
-            except (KeyError, Exception) as e:
-                if 'bbox' in str(e) or isinstance(e, KeyError):
-                    print(f"  ⚠ pypdf failed ({e}), trying pdfplumber...")
-                    text, pages = extract_text_pdfplumber(file_path)
-                    extraction_method = 'pdfplumber'
-                    extraction_stats['pdfplumber'] += 1
-                else:
-                    raise
-
-        elif file_extension == '.docx':
-            text, pages = extract_from_docx(file_path)
-            extraction_method = 'docx'
-            extraction_stats['docx'] += 1
-
-        elif file_extension == '.pptx':
-            text, pages = extract_from_pptx(file_path)
-            extraction_method = 'pptx'
-            extraction_stats['pptx'] += 1
-
-        elif file_extension == '.odp':
-            text, pages = extract_from_odp(file_path)
-            extraction_method = 'odp'
-            extraction_stats['odp'] += 1
-
-        elif file_extension in ['.txt', '.md']:
-            text, pages = extract_from_text(file_path)
-            extraction_method = 'txt'
-            extraction_stats['txt'] += 1
+  # Include subfolders, skipping drafts and anything over 50 MB or older than a week
+  python create_batch.py --input-dir /mnt/share --recursive --exclude '*/drafts/*' --max-size 50MB --modified-since 7d
+
+  # Extract with 8 parallel worker processes
+  python create_batch.py --workers 8
+
+  # Spread each PDF over workers in ranges of 50 pages
+  python create_batch.py --workers 8 --pages-per-task 50
+
+  # Give up on any document that takes more than 60s or 2 GB to extract
+  python create_batch.py --timeout 60 --max-memory-mb 2048
 
+  # Read only ~30k tokens of each document, half from the start and half from the end
+  python create_batch.py --extract-max-tokens 30000 --truncation head_tail
+
+  # Ignore cached extractions and re-parse every document
+  python create_batch.py --rebuild-cache
+
+  # Resubmit documents even if they already have a current summary
+  python create_batch.py --force
+
+  # Also strip reference lists before building prompts
+  python create_batch.py --drop-references
+
+  # Only treat documents as duplicates when at least 95% of their text is shared
+  python create_batch.py --dedup-threshold 0.95
+
+  # Size each request's max_tokens from its length instead of a flat MAX_TOKENS
+  python create_batch.py --auto-max-tokens
+
+  # Compare two models and two prompts (four requests per document), one batch per variant
+  python create_batch.py --models 235b=Qwen/Qwen3-VL-235B-A22B-Instruct-FP8,30b=Qwen/Qwen3-VL-30B-A3B-Instruct-FP8 \\
+      --prompts summarisation_prompt.txt,brief=brief_prompt.txt --shard-by-variant
+
+  # Show how long pypdf, python-docx, etc. took to import
+  python create_batch.py --report-imports
+'''
+    )
+    parser.add_argument(
+        '--files',
+        nargs='+',
+        metavar='FILE',
+        help='Specific file paths to process'
+    )
+    parser.add_argument(
+        '--input-dir',
+        metavar='DIR',
+        help='Directory to scan for documents (default: data/papers/)'
+    )
+    add_discovery_arguments(parser)
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=int(os.getenv('EXTRACTION_WORKERS', '1')),
+        metavar='N',
+        help='Number of parallel extraction processes (default: 1, or EXTRACTION_WORKERS)'
+    )
+    parser.add_argument(
+        '--pages-per-task',
+        type=int,
+        default=int(os.getenv('PDF_PAGES_PER_TASK', '0')),
+        metavar='N',
+        help='With --workers, split PDFs longer than N pages across workers (default: off, or PDF_PAGES_PER_TASK)'
+    )
+    timeout, memory_mb = limits_from_env()
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=timeout,
+        metavar='SECONDS',
+        help='Give up on a document whose extraction takes longer than this '
+             '(default: 300, or EXTRACTION_TIMEOUT; 0 = no limit)'
+    )
+    parser.add_argument(
+        '--max-memory-mb',
+        type=int,
+        default=memory_mb,
+        metavar='MB',
+        help='Memory ceiling for each extraction process (default: none, or EXTRACTION_MAX_MEMORY_MB)'
+    )
+    add_budget_arguments(parser)
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not read or write the extraction cache'
+    )
+    parser.add_argument(
+        '--rebuild-cache',
+        action='store_true',
+        help='Ignore cached extractions and overwrite them with fresh ones'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Submit every document, even those that already have a current summary'
+    )
+    parser.add_argument(
+        '--no-normalise',
+        action='store_true',
+        help='Send extracted text as-is, without removing headers, page numbers, etc.'
+    )
+    parser.add_argument(
+        '--drop-references',
+        action='store_true',
+        help='Also remove the references/bibliography section during normalisation'
+    )
+    add_dedup_arguments(parser)
+    parser.add_argument(
+        '--auto-max-tokens',
+        action='store_true',
+        help='Set each request\'s max_tokens from its length and SUMMARY_WORD_COUNT (or AUTO_MAX_TOKENS=true)'
+    )
+    parser.add_argument(
+        '--models',
+        metavar='LIST',
+        help='Comma-separated models to summarise with, each optionally named as name=model '
+             '(default: SUMMARY_MODELS, or DOUBLEWORD_MODEL)'
+    )
+    parser.add_argument(
+        '--prompts',
+        metavar='LIST',
+        help='Comma-separated prompt template files, each optionally named as name=file '
+             '(default: SUMMARY_PROMPTS, or summarisation_prompt.txt)'
+    )
+    parser.add_argument(
+        '--shard-by-variant',
+        action='store_true',
+        default=os.getenv('BATCH_SHARD_BY_VARIANT', 'false').lower() == 'true',
+        help='Write each model/prompt variant to its own shards, and so its own batches '
+             '(or BATCH_SHARD_BY_VARIANT=true)'
+    )
+    parser.add_argument(
+        '--report-imports',
+        action='store_true',
+        help='Report how long each extractor library took to import'
+    )
+    return parser
+
+
+def create_batch(args):
+    """Extract documents and write batch request shards.
+
+    args is a namespace from build_parser(). Returns the path of the batch
+    manifest listing the shards written.
+    """
+    cache = None
+    if not args.no_cache:
+        cache = ExtractionCache(
+            cache_dir=os.getenv('EXTRACTION_CACHE_DIR', DEFAULT_CACHE_DIR),
+            max_bytes=int(os.getenv('EXTRACTION_CACHE_MAX_MB', str(DEFAULT_MAX_MB))) * 1024 * 1024,
+            read=not args.rebuild_cache
+        )
+
+    # Every document gets one request per model/prompt variant
+    variants = load_variants(args.models, args.prompts)
+
+    # Substitute word count from environment variable (default to 2000)
+    word_count = os.getenv('SUMMARY_WORD_COUNT', '2000')
+    for variant in variants:
+        # Read summarization prompt and substitute word count
+        with open(variant['prompt_file'], 'r') as f:
+            variant['prompt'] = f.read().replace('{WORD_COUNT}', word_count)
+
+    # Print environment variables being used
+    print("Environment Variables:")
+    print(f"  SUMMARY_WORD_COUNT: {word_count}")
+    print(f"  CHAT_COMPLETIONS_ENDPOINT: {os.getenv('CHAT_COMPLETIONS_ENDPOINT', '/v1/chat/completions')}")
+    if len(variants) == 1:
+        print(f"  DOUBLEWORD_MODEL: {variants[0]['model']}")
+    print(f"  MAX_TOKENS: {os.getenv('MAX_TOKENS', '5000')}")
+    print()
+    if len(variants) > 1:
+        print(f"Variants ({len(variants)} requests per document"
+              f"{', one batch each' if args.shard_by_variant else ''}):")
+        for variant in variants:
+            print(f"  {variant['name']}: {variant['model']} with {variant['prompt_file']}")
+        print()
+
+    # Collect files based on arguments
+    # Stems of files in subfolders include their path below the input directory
+    input_root = None
+    if args.files:
+        # Use specific files provided
+        all_files = [str(Path(f).resolve()) for f in args.files]
+        print(f"Processing {len(all_files)} specified file(s)\n")
+    else:
+        # Scan the input directory (default: data/papers), streaming files to extraction as they are found
+        input_dir = Path(args.input_dir or 'data/papers')
+        if args.input_dir and not input_dir.exists():
+            print(f"Error: Directory '{args.input_dir}' does not exist")
+            exit(1)
+        input_root = input_dir
+        found = iter_files(input_dir, supported_extensions(), **discovery_options(args)) if input_dir.exists() else []
+        scope = f"{input_dir}/{' (recursive)' if args.recursive else ''}"
+        if args.order == 'size':
+            all_files = [path for path, _ in largest_first(found)]
+            print(f"Found {len(all_files)} files in {scope}, largest first\n")
         else:
-            print(f"  ⚠ Unsupported file type: {file_extension}")
-            failed_files.append((file_path, f"unsupported file type: {file_extension}"))
+            all_files = (path for path, _ in found)
+            print(f"Scanning {scope}; files are extracted as they are found\n")
+
+    # Text clean-up between extraction and request building
+    normalisation_steps = []
+    if not args.no_normalise and os.getenv('NORMALISE_TEXT', 'true').lower() != 'false':
+        normalisation_steps = parse_steps(os.getenv('NORMALISE_STEPS', ','.join(DEFAULT_STEPS)))
+        drop_refs = os.getenv('NORMALISE_DROP_REFERENCES', 'false').lower() == 'true'
+        if (args.drop_references or drop_refs) and 'references' not in normalisation_steps:
+            normalisation_steps.append('references')
+
+    # Summaries are only current for the same document, model, prompt, length, extraction and clean-up
+    max_tokens = int(os.getenv('MAX_TOKENS', '5000'))
+    auto_max_tokens = args.auto_max_tokens or os.getenv('AUTO_MAX_TOKENS', 'false').lower() == 'true'
+    budget = budget_from_args(args)
+    for variant in variants:
+        variant['settings'] = {
+            'model': variant['model'],
+            'prompt_hash': prompt_hash(variant['prompt']),
+            'max_tokens': 'auto' if auto_max_tokens else max_tokens,
+            'word_count': word_count,
+        }
+        if budget:
+            variant['settings']['extraction'] = budget.identity()
+        if steps_identity(normalisation_steps):
+            variant['settings']['normalisation'] = steps_identity(normalisation_steps)
+    summary_manifest = SummaryManifest.load()
+    document_keys = {}  # (file_path, variant name) -> manifest key
+
+    def own_key(file_path, variant):
+        """The manifest key of a file's summary for one variant (see SummaryManifest.key_for)."""
+        key = document_keys.get((file_path, variant['name']))
+        return summary_manifest.key_for(key, file_path) if key else None
+
+    def is_current(file_path, variant):
+        key = own_key(file_path, variant)
+        return bool(key) and not args.force and summary_manifest.has_current_summary(key)
+
+    # custom_id stem -> the file given it in this run
+    stems = {}
+
+    def document_stem(file_path):
+        """Return the stem for a file's custom_ids, unique among this run and pending requests.
+
+        A file whose stem is already taken, by another file in this run
+        (report.txt with --files a/report.txt b/report.txt) or by another
+        document's pending request, gets a hash of its path appended.
+        """
+        stem = safe_stem(file_path, input_root)
+        for candidate in (stem, f"{stem}-{path_hash(file_path)}"):
+            owner = stems.get(candidate)
+            if owner is None:
+                sources = [summary_manifest.documents.get(summary_manifest.pending.get(
+                    summary_custom_id(candidate, variant['name'])), {}).get('source') for variant in variants]
+                if any(source and not same_source(source, file_path) for source in sources):
+                    continue
+                stems[candidate] = file_path
+                return candidate
+            if owner == file_path:
+                return candidate
+        return candidate
+
+    up_to_date = []
+
+    def needs_summary(files):
+        """Yield the files still missing a current summary, setting aside the rest."""
+        for file_path in files:
+            try:
+                content_hash = file_sha256(file_path)
+            except OSError:
+                yield file_path
+                continue
+            for variant in variants:
+                document_keys[file_path, variant['name']] = document_key(content_hash, **variant['settings'])
+            # A document is only skipped once every variant has a current summary
+            if all(is_current(file_path, variant) for variant in variants):
+                up_to_date.append(file_path)
+                metrics.record_document(file_path, 'up_to_date')
+                continue
+            yield file_path
+
+    def report_up_to_date():
+        if up_to_date:
+            print(f"Skipping {len(up_to_date)} file(s) that already have a current summary "
+                  f"(use --force to resubmit)\n")
+
+    # A known list is checked up front; a directory scan is checked as files stream past
+    listed = isinstance(all_files, list)
+    all_files = needs_summary(all_files)
+    if listed:
+        all_files = list(all_files)
+        report_up_to_date()
+
+    # Documents too long for one request are split and summarised map-reduce style
+    url = os.getenv('CHAT_COMPLETIONS_ENDPOINT', '/v1/chat/completions')
+    chunk_prompt = load_chunk_prompt(word_count)
+    for variant in variants:
+        variant['document_budget'] = document_token_budget(variant['prompt'], max_tokens)
+    chunk_budget = document_token_budget(chunk_prompt, max_tokens)
+    chunk_plans = ChunkPlans.load()
+    chunked_documents = 0
+
+    # Exact and near duplicates share one representative's summary instead of being submitted
+    duplicate_index = None if args.no_dedup else DuplicateIndex(threshold=args.dedup_threshold)
+    duplicate_links = DuplicateLinks.load()
+    # (representative summary custom_id, its summary path, batch ID) of summaries to share right away
+    shared_now = []
+    duplicates_found = 0
+
+    def link_duplicate(file_path, representative, variant):
+        """Link a document to its representative's summary for one variant; True if linked.
+
+        The representative's request must be awaiting its result (from this
+        run or an earlier one) or have a current summary; otherwise the
+        document is summarised itself.
+        """
+        name = variant['name']
+        if (file_path, name) not in document_keys or not representative['content_hash']:
+            return False
+        key = summary_manifest.key_for(document_key(representative['content_hash'], **variant['settings']),
+                                       representative['source'])
+        entry = summary_manifest.documents.get(key, {})
+        # The representative's own custom_id, whatever stem it was given
+        summary_id = entry.get('custom_id')
+        current = summary_manifest.has_current_summary(key) and Path(entry.get('summary_path', '')).is_file()
+        if not summary_id or (summary_manifest.pending.get(summary_id) != key and not current):
+            return False
+        duplicate_id = summary_custom_id(document_stem(file_path), name)
+        duplicate_links.add(summary_id, duplicate_id, file_path, representative['source'],
+                            representative['similarity'])
+        summary_manifest.mark_pending(own_key(file_path, variant), duplicate_id, file_path,
+                                      content_hash=file_sha256(file_path), **variant['settings'])
+        if current:
+            shared_now.append((summary_id, entry['summary_path'], entry.get('batch_id', 'dedup')))
+        return True
+
+    def request_max_tokens(content):
+        """Flat MAX_TOKENS, or a budget from the content length with --auto-max-tokens."""
+        if auto_max_tokens:
+            return budget_max_tokens(estimate_tokens(content), word_count)
+        return max_tokens
+
+    normalisation_totals = {'chars_before': 0, 'chars_after': 0, 'tokens_before': 0, 'tokens_after': 0}
+
+    if args.workers > 1:
+        split = f", PDFs split every {args.pages_per_task} pages" if args.pages_per_task > 0 else ''
+        print(f"Extracting with {args.workers} worker processes{split}\n")
+    if args.timeout or args.max_memory_mb:
+        limits = [f"{args.timeout:g}s" if args.timeout else '',
+                  f"{args.max_memory_mb} MB" if args.max_memory_mb else '']
+        print(f"Each extraction is limited to {' and '.join(limit for limit in limits if limit)}\n")
+    if budget:
+        sections = f" of {budget.sections} sections" if budget.policy == 'sampled' else ''
+        print(f"Reading at most {budget.max_chars:,} characters per document ({budget.policy}{sections})\n")
+
+    # Requests are streamed to size-bounded shard files as they are built
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    writer = ShardedBatchWriter.from_env(timestamp)
+    build_start = time.perf_counter()
+    failed_files = []
+    extraction_stats = Counter()
+    page_engine_totals = Counter()
+    # Slowest import of each extractor module across the processes that loaded it
+    import_times = {}
+    # (seconds, file_path) of every document extracted in this run
+    extraction_times = []
+
+    extractions = iter_extractions(all_files, args.workers, cache, args.pages_per_task,
+                                   args.timeout, args.max_memory_mb, budget)
+    documents_seen = 0
+    for idx, (file_path, result) in enumerate(extractions, 1):
+        documents_seen = idx
+        print(f"[{idx}{f'/{len(all_files)}' if listed else ''}] Processing {file_path}...")
+
+        for note in result['notes']:
+            print(f"  {note}")
+        for module, seconds in result.get('import_times', {}).items():
+            import_times[module] = max(seconds, import_times.get(module, 0))
+        if not result.get('cached'):
+            extraction_times.append((result.get('seconds', 0), file_path))
+
+        if result['error']:
+            failed_files.append((file_path, result['error']))
+            metrics.record_document(file_path, 'failed', result)
             continue
 
-    except Exception as e:
-        print(f"  ✗ Error: {e}")
-        failed_files.append((file_path, str(e)))
-        continue
-
-    # Skip if no meaningful text extracted
-    if not text or len(text.strip()) < 100:
-        print(f"  ⚠ Skipped (insufficient text: {len(text)} chars)")
-        failed_files.append((file_path, "insufficient text"))
-        continue
-
-    print(f"  ✓ Extracted {len(text)} characters from {pages} pages [{extraction_method}]")
-
-    # Create batch request with sanitized custom_id
-    # Remove special chars from filename for custom_id (max 64 chars including 'summary-' prefix)
-    safe_filename = Path(file_path).stem.replace('%', '_').replace(' ', '_').replace('&', 'and')[:55]
-
-    request = {
-        "custom_id": f"summary-{safe_filename}",
-        "method": "POST",
-        "url": os.getenv('CHAT_COMPLETIONS_ENDPOINT', '/v1/chat/completions'),
-        "body": {
-            "model": os.getenv('DOUBLEWORD_MODEL', 'Qwen/Qwen3-VL-235B-A22B-Instruct-FP8'),
-            "messages": [
-                {
-                    "role": "user",
-                    "content": f"{prompt_template}\n\nDocument text:\n{text}"
-                }
-            ],
-            "max_tokens": int(os.getenv('MAX_TOKENS', '5000'))
-        }
-    }
-    requests.append(request)
-
-# Write JSONL file with timestamp
-timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-output_file = f'batch_requests_{timestamp}.jsonl'
-with open(output_file, 'w') as f:
-    for req in requests:
-        f.write(json.dumps(req) + '\n')
-
-print(f"\n{'='*60}")
-print(f"✓ Created {output_file} with {len(requests)} requests")
-print(f"\nExtraction methods used:")
-for method, count in extraction_stats.items():
-    if count > 0:
-        label = "pdfplumber (fallback)" if method == 'pdfplumber' else method
-        print(f"  {label}: {count} files")
-
-if failed_files:
-    print(f"\n⚠ Failed to process {len(failed_files)} files:")
-    for path, reason in failed_files:
-        print(f"  - {Path(path).name}: {reason}")
-
-print(f"\nNext step: python submit_batch.py")
+        text = result['text']
+        pages = result['pages']
+        extraction_method = result['method']
+        extraction_stats[extraction_method] += 1
+        page_engine_totals.update(result.get('page_engines', {}))
+
+        normalised = None
+        if normalisation_steps and text:
+            raw_text = text
+            text = normalise_text(raw_text, normalisation_steps)
+            normalised = savings(raw_text, text)
+            for key, value in normalised.items():
+                normalisation_totals[key] += value
+
+        # Skip if no meaningful text extracted
+        if not text or len(text.strip()) < 100:
+            print(f"  ⚠ Skipped (insufficient text: {len(text)} chars)")
+            failed_files.append((file_path, "insufficient text"))
+            metrics.record_document(file_path, 'insufficient_text', result)
+            continue
+
+        cached_label = ', cached' if result.get('cached') else ''
+        print(f"  ✓ Extracted {len(text)} characters from {pages} pages [{extraction_method}{cached_label}]")
+        engines = {engine: count for engine, count in result.get('page_engines', {}).items() if count}
+        if len(engines) > 1 or engines.get('empty'):
+            print(f"  Pages by engine: {', '.join(f'{engine} {count}' for engine, count in engines.items())}")
+        if normalised:
+            print(f"  ✓ Normalised: {format_savings(normalised)}")
+
+        # Create batch requests with sanitized custom_ids, one per variant still to summarise
+        safe_filename = document_stem(file_path)
+        document_tokens = estimate_tokens(text)
+        stale = [variant for variant in variants if not is_current(file_path, variant)]
+
+        if duplicate_index is not None:
+            representative = duplicate_index.match(text, file_path, file_sha256(file_path))
+            linked = [variant for variant in stale
+                      if representative and link_duplicate(file_path, representative, variant)]
+            if linked:
+                duplicates_found += 1
+                relation = 'same text as' if representative['similarity'] >= 1 else \
+                    f"{representative['similarity']:.0%} similar to"
+                print(f"  ≈ Duplicate ({relation} {Path(representative['source']).name}); sharing its summary")
+                stale = [variant for variant in stale if variant not in linked]
+                if not stale:
+                    metrics.record_document(file_path, 'duplicate', result, document_tokens)
+                    continue
+
+        # The document is split once and the chunks shared by every variant it overflows
+        chunks = None
+        if any(document_tokens > variant['document_budget'] for variant in stale):
+            chunks = chunk_text(text, chunk_budget)
+            if len(chunks) > 999:
+                print(f"  ✗ Too long to split ({len(chunks)} chunks, limit 999)")
+                failed_files.append((file_path, f"too long: {len(chunks)} chunks"))
+                metrics.record_document(file_path, 'too_long', result, document_tokens)
+                continue
+            print(f"  ✂ Split into {len(chunks)} chunks of up to ~{chunk_budget} tokens (map-reduce)")
+            chunked_documents += 1
+
+        for variant in stale:
+            name, model = variant['name'], variant['model']
+            group = name if args.shard_by_variant else None
+            fits = document_tokens <= variant['document_budget']
+            # A split document's summary is named after its chunks, whose IDs leave less room for the stem
+            summary_id = summary_custom_id(safe_filename if fits else chunk_stem(safe_filename, name), name)
+            if fits:
+                content = f"{variant['prompt']}\n\nDocument text:\n{flatten_pages(text)}"
+                writer.write(build_request(summary_id, content, model, request_max_tokens(content), url), group)
+            else:
+                chunk_ids = []
+                for index, chunk in enumerate(chunks, 1):
+                    chunk_id = chunk_custom_id(safe_filename, index, len(chunks), name)
+                    content = (f"{chunk_prompt}\n\nDocument section {index} of {len(chunks)}:\n"
+                               f"{flatten_pages(chunk)}")
+                    writer.write(build_request(chunk_id, content, model, request_max_tokens(content), url), group)
+                    chunk_ids.append(chunk_id)
+                chunk_plans.add(summary_id, chunk_ids, file_path, variant['prompt'], model,
+                                None if auto_max_tokens else max_tokens, url, word_count)
+
+            if (file_path, name) in document_keys:
+                summary_manifest.mark_pending(own_key(file_path, variant), summary_id, file_path,
+                                              content_hash=file_sha256(file_path), **variant['settings'])
+
+        metrics.record_document(file_path, 'ok', result, document_tokens, chunks=len(chunks) if chunks else 1,
+                                variants=len(stale))
+
+    manifest_path = writer.close()
+    if not listed:
+        print()
+        report_up_to_date()
+    metrics.record_stage('build_requests', time.perf_counter() - build_start, manifest=manifest_path,
+                         documents=documents_seen, requests=writer.total_requests,
+                         shards=len(writer.shards), bytes=sum(shard['bytes'] for shard in writer.shards))
+    summary_manifest.save()
+    if duplicate_index is not None:
+        duplicate_index.close()
+        duplicate_links.save()
+        if shared_now:
+            # Duplicates of documents summarised in an earlier run get their copy now
+            from process_results import share_with_duplicates
+            for summary_id, summary_path, batch_id in shared_now:
+                record_summaries(batch_id, share_with_duplicates([(summary_id, summary_path)], batch_id))
+    if chunked_documents:
+        chunk_plans.save()
+
+    print(f"\n{'='*60}")
+    print(f"✓ Created {len(writer.shards)} shard(s) with {writer.total_requests} requests")
+    for shard in writer.shards:
+        print(f"  {shard['path']}: {shard['requests']} requests, "
+              f"{shard['bytes'] / 1024 / 1024:.1f} MB, ~{shard['estimated_tokens']} tokens")
+    print(f"✓ Manifest: {manifest_path}")
+    if duplicates_found:
+        print(f"≈ {duplicates_found} duplicate document(s) not submitted; "
+              f"they share their representative's summary (see python dedup.py clusters)")
+    if chunked_documents:
+        print(f"✂ {chunked_documents} document(s) split into chunks; "
+              f"their reduce batch is submitted automatically when all chunks are done")
+    print(f"\nExtraction methods used:")
+    for method, count in extraction_stats.items():
+        if count > 0:
+            label = "pdfplumber (fallback)" if method == 'pdfplumber' else method
+            print(f"  {label}: {count} files")
+    if page_engine_totals:
+        print(f"  PDF pages: {', '.join(f'{engine} {count}' for engine, count in page_engine_totals.items() if count)}")
+
+    if args.report_imports:
+        print("\nExtractor imports (first use):")
+        for module, seconds in sorted(import_times.items(), key=lambda item: -item[1]):
+            print(f"  {module}: {seconds:.3f}s")
+        if not import_times:
+            print("  none (no files needed a parsing library)")
+
+    if extraction_times:
+        extraction_times.sort(reverse=True)
+        total_seconds = sum(seconds for seconds, _ in extraction_times)
+        print(f"\nSlowest extractions ({total_seconds:.1f}s across {len(extraction_times)} files):")
+        for seconds, path in extraction_times[:5]:
+            share = seconds / total_seconds if total_seconds else 0
+            print(f"  {seconds:7.2f}s ({share:.0%})  {Path(path).name}")
+
+    if cache is not None:
+        print(f"\nExtraction cache: {cache.hits} hits, {cache.misses} misses")
+
+    if normalisation_totals['chars_before']:
+        print(f"\nNormalisation ({', '.join(normalisation_steps)}):")
+        print(f"  {format_savings(normalisation_totals)}")
+
+    if failed_files:
+        print(f"\n⚠ Failed to process {len(failed_files)} files:")
+        for path, reason in failed_files:
+            print(f"  - {Path(path).name}: {reason}")
+
+    return manifest_path
+
+
+def main():
+    # Load environment variables
+    load_dotenv()
+
+    # Parse command line arguments
+    args = build_parser().parse_args()
+    create_batch(args)
+    metrics.write_prometheus('create_batch')
+
+    print(f"\nNext step: python submit_batch.py")
+
+
+if __name__ == '__main__':
+    main()
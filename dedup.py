@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""Exact and near-duplicate detection over extracted text.
+
+create_batch.py checks every document against an index of those already
+seen before building its requests. A document whose text matches an
+earlier one exactly, or whose estimated Jaccard similarity over 5-word
+shingles reaches DEDUP_THRESHOLD, is not submitted: it is linked to that
+representative and gets a copy of its summary when the summary arrives.
+
+Similarity is estimated with one-permutation MinHash (each shingle is
+hashed once into one of 128 bins, keeping the minimum per bin), and
+candidates are found with LSH: signatures are cut into bands and only
+documents sharing a band bucket are compared, so a new document is checked
+in roughly constant time however large the index grows. Only cluster
+representatives are bucketed, so clusters do not drift through chains of
+slightly different versions.
+
+The index lives in data/dedup_index.db (DEDUP_INDEX) and persists across
+runs, so a re-upload next week is caught too. Links waiting for a
+representative's summary are kept in data/duplicate_links.json.
+
+  python dedup.py clusters             # representatives and their duplicates
+  python dedup.py check a.pdf b.pdf    # estimated similarity of two files
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+DEFAULT_INDEX_PATH = 'data/dedup_index.db'
+DEFAULT_LINKS_PATH = 'data/duplicate_links.json'
+DEFAULT_THRESHOLD = 0.85
+
+SHINGLE_WORDS = 5
+NUM_BINS = 128  # power of two
+_BIN_BITS = NUM_BINS.bit_length() - 1
+_EMPTY = (1 << 64) - 1
+
+_WORD = re.compile(r'\w+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    text_hash TEXT NOT NULL,
+    source TEXT NOT NULL,
+    content_hash TEXT,
+    signature BLOB NOT NULL,
+    representative TEXT,
+    similarity REAL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (text_hash, source)
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    text_hash TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, text_hash, source)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# Serialises load-modify-save cycles of the links file when several batches finish at once
+_lock = threading.Lock()
+
+
+def index_path():
+    """Return the index location from DEDUP_INDEX or the default."""
+    return Path(os.getenv('DEDUP_INDEX', DEFAULT_INDEX_PATH))
+
+
+def links_path():
+    """Return the duplicate links location from DUPLICATE_LINKS or the default."""
+    return Path(os.getenv('DUPLICATE_LINKS', DEFAULT_LINKS_PATH))
+
+
+def text_hash(text):
+    """Hash of the text's words, ignoring case, whitespace and punctuation."""
+    return hashlib.sha256(' '.join(_WORD.findall(text.lower())).encode('utf-8')).hexdigest()
+
+
+def _hash64(value):
+    """Stable 64-bit hash (Python's hash() changes between processes)."""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def signature(text):
+    """One-permutation MinHash signature of the text's word shingles.
+
+    Each shingle's hash picks a bin with its low bits and competes for the
+    bin's minimum with the rest. Bins no shingle fell into (short texts)
+    borrow the value of the next filled bin, so any two signatures stay
+    comparable bin by bin.
+    """
+    words = _WORD.findall(text.lower())
+    count = max(1, len(words) - SHINGLE_WORDS + 1)
+    mins = [_EMPTY] * NUM_BINS
+    for start in range(count):
+        value = _hash64(' '.join(words[start:start + SHINGLE_WORDS]))
+        index = value & (NUM_BINS - 1)
+        value >>= _BIN_BITS
+        if value < mins[index]:
+            mins[index] = value
+    original = list(mins)
+    if _EMPTY in original:
+        for index in range(NUM_BINS):
+            if original[index] == _EMPTY:
+                # Next filled bin to the right, wrapping round, offset by the distance
+                distance = next(d for d in range(1, NUM_BINS) if original[(index + d) % NUM_BINS] != _EMPTY)
+                mins[index] = original[(index + distance) % NUM_BINS] + distance
+    return array('Q', mins)
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(a == b for a, b in zip(first, second)) / NUM_BINS
+
+
+def _probability(s, bands, rows):
+    """Chance that two documents of similarity s share at least one band."""
+    return 1 - (1 - s ** rows) ** bands
+
+
+@lru_cache(maxsize=None)
+def lsh_parameters(threshold):
+    """Return the (bands, rows) that best separate pairs above and below threshold.
+
+    Minimises the summed chance of missing a pair above the threshold and
+    of comparing a pair below it, as in the usual MinHash LSH setup; the
+    bands cover at most NUM_BINS bins.
+    """
+    steps = 100
+    best = None
+    for bands in range(1, NUM_BINS + 1):
+        for rows in range(1, NUM_BINS // bands + 1):
+            false_positive = sum(_probability(threshold * (i + 0.5) / steps, bands, rows)
+                                 for i in range(steps)) * threshold / steps
+            false_negative = sum(1 - _probability(threshold + (1 - threshold) * (i + 0.5) / steps, bands, rows)
+                                 for i in range(steps)) * (1 - threshold) / steps
+            error = false_positive + false_negative
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class DuplicateIndex:
+    """SQLite index of document signatures with LSH band buckets."""
+
+    def __init__(self, path=None, threshold=DEFAULT_THRESHOLD):
+        self.path = Path(path) if path else index_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.bands, self.rows = lsh_parameters(threshold)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        layout = f"{NUM_BINS}:{self.bands}x{self.rows}"
+        stored = self.db.execute("SELECT value FROM settings WHERE name = 'layout'").fetchone()
+        if stored is None or stored['value'] != layout:
+            self._rebucket(layout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Commit everything added and close the database."""
+        self.db.commit()
+        self.db.close()
+
+    def _buckets(self, sig):
+        """(band, bucket) pairs of a signature."""
+        for band in range(self.bands):
+            part = sig[band * self.rows:(band + 1) * self.rows].tobytes()
+            yield band, int.from_bytes(hashlib.blake2b(part, digest_size=8).digest(), 'big', signed=True)
+
+    def _rebucket(self, layout):
+        """Re-bucket every representative after the threshold, and so the band layout, changed."""
+        self.db.execute('DELETE FROM buckets')
+        for row in self.db.execute('SELECT text_hash, source, signature FROM documents '
+                                   'WHERE representative IS NULL').fetchall():
+            self._insert_buckets(row['text_hash'], row['source'], _unpack(row['signature']))
+        self.db.execute("INSERT OR REPLACE INTO settings (name, value) VALUES ('layout', ?)", (layout,))
+        self.db.commit()
+
+    def _insert_buckets(self, digest, source, sig):
+        self.db.executemany('INSERT OR IGNORE INTO buckets (band, bucket, text_hash, source) VALUES (?, ?, ?, ?)',
+                            [(band, bucket, digest, source) for band, bucket in self._buckets(sig)])
+
+    def match(self, text, source, content_hash=None):
+        """Register a document and return the representative it duplicates, or None.
+
+        The result is a dict with the representative's source, content_hash
+        (file hash, for its summary manifest keys) and the similarity, 1.0
+        for the same text. A document seen before under the same path keeps
+        the role it had, unless the threshold has since been raised above
+        its similarity.
+        """
+        # The same file named relative to different directories is one source
+        source = os.path.realpath(source)
+        digest = text_hash(text)
+        rows = self.db.execute('SELECT * FROM documents WHERE text_hash = ? ORDER BY representative IS NOT NULL, '
+                               'created_at', (digest,)).fetchall()
+        own = next((row for row in rows if row['source'] == source), None)
+        if own is not None and (own['representative'] is None or own['similarity'] >= self.threshold):
+            return self._representative(own['representative'], own['similarity'])
+        rows = [row for row in rows if row['source'] != source]
+        if rows:
+            # Same text under another path: link to that copy's representative
+            first = rows[0]
+            match = self._representative(first['representative'], first['similarity']) or \
+                {'source': first['source'], 'content_hash': first['content_hash'], 'similarity': 1.0,
+                 'text_hash': first['text_hash']}
+            self._add(digest, source, content_hash, _unpack(first['signature']), match)
+            return match
+
+        sig = signature(text)
+        candidates = set()
+        for band, bucket in self._buckets(sig):
+            candidates.update((row['text_hash'], row['source']) for row in self.db.execute(
+                'SELECT text_hash, source FROM buckets WHERE band = ? AND bucket = ?', (band, bucket)))
+        best = None
+        for candidate_hash, candidate_source in candidates:
+            if candidate_source == source:
+                # An earlier version of this same file is not a separate document
+                continue
+            row = self.db.execute('SELECT * FROM documents WHERE text_hash = ? AND source = ?',
+                                  (candidate_hash, candidate_source)).fetchone()
+            score = similarity(sig, _unpack(row['signature']))
+            if score >= self.threshold and (best is None or score > best['similarity']):
+                best = {'source': row['source'], 'content_hash': row['content_hash'], 'similarity': score,
+                        'text_hash': row['text_hash']}
+        self._add(digest, source, content_hash, sig, best)
+        return best
+
+    def _representative(self, key, score):
+        """The representative row 'text_hash|source' of a recorded duplicate, or None."""
+        if not key:
+            return None
+        digest, _, source = key.partition('|')
+        row = self.db.execute('SELECT * FROM documents WHERE text_hash = ? AND source = ?',
+                              (digest, source)).fetchone()
+        if row is None:
+            return None
+        return {'source': row['source'], 'content_hash': row['content_hash'], 'similarity': score,
+                'text_hash': row['text_hash']}
+
+    def _add(self, digest, source, content_hash, sig, match):
+        """Record a document; representatives also go into the LSH buckets."""
+        representative = f"{match['text_hash']}|{match['source']}" if match else None
+        self.db.execute(
+            'INSERT OR REPLACE INTO documents (text_hash, source, content_hash, signature, representative, '
+            'similarity, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (digest, source, content_hash, sig.tobytes(), representative, match['similarity'] if match else None,
+             datetime.now().isoformat(timespec='seconds')),
+        )
+        if not match:
+            self._insert_buckets(digest, source, sig)
+
+    def clusters(self):
+        """Return {representative source: [(duplicate source, similarity)]} for clusters with duplicates."""
+        clusters = {}
+        for row in self.db.execute('SELECT source, representative, similarity FROM documents '
+                                   'WHERE representative IS NOT NULL ORDER BY representative, source'):
+            representative = row['representative'].partition('|')[2]
+            clusters.setdefault(representative, []).append((row['source'], row['similarity']))
+        return clusters
+
+
+def _unpack(blob):
+    """Signature array from its stored bytes."""
+    sig = array('Q')
+    sig.frombytes(blob)
+    return sig
+
+
+class DuplicateLinks:
+    """JSON-backed record of duplicates waiting for their representative's summary."""
+
+    def __init__(self, path, links=None):
+        self.path = Path(path)
+        self.links = links or {}  # representative summary custom_id -> [duplicate]
+
+    @classmethod
+    def load(cls, path=None):
+        """Load the links, or return an empty set if none exist yet."""
+        path = Path(path) if path else links_path()
+        if not path.exists():
+            return cls(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(path, json.load(f))
+
+    def save(self):
+        """Write the links atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.links, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, summary_id, custom_id, source, representative, score):
+        """Link a duplicate's summary custom_id to its representative's."""
+        duplicates = self.links.setdefault(summary_id, [])
+        duplicates[:] = [duplicate for duplicate in duplicates if duplicate['custom_id'] != custom_id]
+        duplicates.append({'custom_id': custom_id, 'source': str(source),
+                           'representative': str(representative), 'similarity': round(score, 3)})
+
+
+def take_links(summary_ids):
+    """Remove and return {summary custom_id: [duplicate]} for representatives whose summaries arrived."""
+    with _lock:
+        if not links_path().exists():
+            return {}
+        links = DuplicateLinks.load()
+        taken = {summary_id: links.links.pop(summary_id) for summary_id in summary_ids if summary_id in links.links}
+        if taken:
+            links.save()
+        return taken
+
+
+def duplicate_note(duplicate):
+    """Markdown header explaining that a duplicate's summary was written for its representative."""
+    relation = 'Same text as' if duplicate['similarity'] >= 1 else \
+        f"Near-duplicate ({duplicate['similarity']:.0%} similar) of"
+    return (f"> {relation} `{Path(duplicate['representative']).name}`; "
+            f"this summary was generated from that document.\n\n")
+
+
+def add_dedup_arguments(parser):
+    """Add the duplicate detection options, with defaults from DEDUP_* variables."""
+    parser.add_argument(
+        '--no-dedup',
+        action='store_true',
+        default=os.getenv('DEDUP', 'true').lower() == 'false',
+        help='Summarise every document, even exact or near duplicates of others (or DEDUP=false)'
+    )
+    parser.add_argument(
+        '--dedup-threshold',
+        type=float,
+        default=float(os.getenv('DEDUP_THRESHOLD', str(DEFAULT_THRESHOLD))),
+        metavar='SIMILARITY',
+        help=f'Estimated shingle similarity (0-1) from which a document counts as a near duplicate '
+             f'(default: {DEFAULT_THRESHOLD}, or DEDUP_THRESHOLD)'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect the near-duplicate index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('clusters', help='List representatives and the documents linked to them')
+    check = subparsers.add_parser('check', help='Estimate the similarity of two documents')
+    check.add_argument('files', nargs=2, metavar='FILE')
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        from extractors import extract_document
+        from text_normalisation import DEFAULT_STEPS, normalise_text
+        signatures = []
+        for file_path in args.files:
+            result = extract_document(file_path)
+            if result['error']:
+                raise SystemExit(f"Error: {file_path}: {result['error']}")
+            text = normalise_text(result['text'], DEFAULT_STEPS)
+            signatures.append((text_hash(text), signature(text)))
+        exact = signatures[0][0] == signatures[1][0]
+        print(f"Estimated similarity: {1.0 if exact else similarity(signatures[0][1], signatures[1][1]):.2f}"
+              f"{' (same text)' if exact else ''}")
+        return
+
+    if not index_path().exists():
+        print(f"No index at {index_path()} yet")
+        return
+    with DuplicateIndex(threshold=float(os.getenv('DEDUP_THRESHOLD', str(DEFAULT_THRESHOLD)))) as index:
+        clusters = index.clusters()
+    for representative, duplicates in sorted(clusters.items()):
+        print(representative)
+        for source, score in duplicates:
+            print(f"  {'=' if score >= 1 else '≈'} {source} ({score:.2f})")
+    print(f"\n{len(clusters)} cluster(s), {sum(map(len, clusters.values()))} duplicate(s)")
+
+
+if __name__ == '__main__':
+    main()
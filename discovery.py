@@ -0,0 +1,173 @@
+"""Streaming discovery of input documents.
+
+Directories are walked with os.scandir, one directory at a time, and each
+matching file is yielded as soon as it is found, so extraction starts on
+the first file instead of after the whole tree has been listed. Files can
+be filtered by extension, include/exclude glob patterns, size and
+modification time:
+
+  python create_batch.py --input-dir /mnt/share --recursive \\
+      --include 'reports/*' --exclude '*/drafts/*' --max-size 50MB --modified-since 7d
+
+Entries are visited in name order within each directory, so the output is
+the same on every run. --order size lists the whole tree first and yields
+the largest files first, which balances parallel extraction workers at the
+cost of waiting for the full listing.
+"""
+
+import os
+import re
+import time
+from datetime import datetime
+from fnmatch import fnmatch
+from pathlib import Path
+
+_SIZE = re.compile(r'\s*(\d+(?:\.\d+)?)\s*(b|kb|mb|gb)?\s*', re.IGNORECASE)
+_SIZE_UNITS = {'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3}
+_AGE = re.compile(r'\s*(\d+(?:\.\d+)?)\s*([mhd])\s*', re.IGNORECASE)
+_AGE_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_size(value):
+    """Parse '500KB', '20MB', '1.5GB' or a plain byte count into bytes."""
+    match = _SIZE.fullmatch(str(value))
+    if not match:
+        raise ValueError(f"invalid size '{value}' (use e.g. 500KB, 20MB)")
+    return int(float(match.group(1)) * _SIZE_UNITS[(match.group(2) or 'b').lower()])
+
+
+def parse_since(value):
+    """Parse an ISO date/datetime or a relative age ('30m', '12h', '7d') into a Unix time."""
+    match = _AGE.fullmatch(str(value))
+    if match:
+        return time.time() - float(match.group(1)) * _AGE_UNITS[match.group(2).lower()]
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"invalid time '{value}' (use e.g. 2025-01-31, 2025-01-31T09:00 or 7d)")
+
+
+def _matches(relative_path, patterns):
+    """True if a slash-separated relative path or its final name matches any glob pattern."""
+    name = relative_path.rsplit('/', 1)[-1]
+    return any(fnmatch(relative_path, pattern) or fnmatch(name, pattern) for pattern in patterns)
+
+
+def iter_files(root, extensions, recursive=False, include=(), exclude=(), min_size=None, max_size=None,
+               modified_since=None):
+    """Yield (path, os.stat_result) for each matching file under root, as it is found.
+
+    extensions is a collection of lowercase suffixes ('.pdf'). include
+    patterns, if any, must match a file's path relative to root (or its
+    name); exclude patterns drop files and, when recursing, whole
+    directories. Symlinked directories are not followed.
+    """
+    extensions = set(extensions)
+    # Stack of (directory, path relative to root) still to visit, in reverse name order
+    stack = [(str(root), '')]
+    while stack:
+        directory, relative_dir = stack.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"  ⚠ Cannot read {directory}: {e.strerror}")
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            relative_path = f'{relative_dir}{entry.name}'
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not _matches(relative_path, exclude):
+                        subdirectories.append((entry.path, f'{relative_path}/'))
+                    continue
+                if not entry.is_file() or Path(entry.name).suffix.lower() not in extensions:
+                    continue
+                if include and not _matches(relative_path, include):
+                    continue
+                if exclude and _matches(relative_path, exclude):
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            if min_size is not None and stat.st_size < min_size:
+                continue
+            if max_size is not None and stat.st_size > max_size:
+                continue
+            if modified_since is not None and stat.st_mtime < modified_since:
+                continue
+            yield entry.path, stat
+        stack.extend(reversed(subdirectories))
+
+
+def largest_first(files):
+    """Return discovered (path, stat) pairs ordered largest first, then by path."""
+    return sorted(files, key=lambda item: (-item[1].st_size, item[0]))
+
+
+def add_discovery_arguments(parser):
+    """Add the file discovery options, with defaults from DISCOVERY_* variables."""
+    def env_list(name):
+        return [pattern.strip() for pattern in os.getenv(name, '').split(',') if pattern.strip()]
+
+    parser.add_argument(
+        '--recursive',
+        action='store_true',
+        default=os.getenv('DISCOVERY_RECURSIVE', 'false').lower() == 'true',
+        help='Also scan subdirectories of the input directory (or DISCOVERY_RECURSIVE=true)'
+    )
+    parser.add_argument(
+        '--include',
+        action='append',
+        default=env_list('DISCOVERY_INCLUDE'),
+        metavar='PATTERN',
+        help='Only process files whose relative path or name matches this glob (repeatable, or DISCOVERY_INCLUDE)'
+    )
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        default=env_list('DISCOVERY_EXCLUDE'),
+        metavar='PATTERN',
+        help='Skip files and directories matching this glob (repeatable, or DISCOVERY_EXCLUDE)'
+    )
+    parser.add_argument(
+        '--min-size',
+        type=parse_size,
+        default=os.getenv('DISCOVERY_MIN_SIZE') or None,
+        metavar='SIZE',
+        help='Skip files smaller than this, e.g. 10KB (or DISCOVERY_MIN_SIZE)'
+    )
+    parser.add_argument(
+        '--max-size',
+        type=parse_size,
+        default=os.getenv('DISCOVERY_MAX_SIZE') or None,
+        metavar='SIZE',
+        help='Skip files larger than this, e.g. 50MB (or DISCOVERY_MAX_SIZE)'
+    )
+    parser.add_argument(
+        '--modified-since',
+        type=parse_since,
+        default=os.getenv('DISCOVERY_MODIFIED_SINCE') or None,
+        metavar='WHEN',
+        help='Skip files last modified before a date (2025-01-31) or age (7d, 12h) (or DISCOVERY_MODIFIED_SINCE)'
+    )
+    parser.add_argument(
+        '--order',
+        choices=['name', 'size'],
+        default=os.getenv('DISCOVERY_ORDER', 'name'),
+        help='name: stream files in path order as found (default); size: largest first, '
+             'after listing the whole tree (or DISCOVERY_ORDER)'
+    )
+
+
+def discovery_options(args):
+    """Return the iter_files keyword arguments chosen on the command line."""
+    return {
+        'recursive': args.recursive,
+        'include': args.include,
+        'exclude': args.exclude,
+        'min_size': args.min_size,
+        'max_size': args.max_size,
+        'modified_since': args.modified_since,
+    }
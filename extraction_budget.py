@@ -0,0 +1,373 @@
+"""Character budgets and truncation policies for extraction.
+
+Without a budget every document is extracted in full. With one, an
+extractor's pages (slides, paragraphs or lines) are read one at a time and
+reading stops as soon as the budget is spent, so a 1,000-page PDF costs
+about as much as the few pages that fit in the prompt:
+
+  python create_batch.py --extract-max-tokens 30000 --truncation head_tail
+
+Policies decide which part of a document fills the budget:
+  head        the beginning of the document (default)
+  head_tail   half from the beginning, the rest from the end
+  sampled     EXTRACTION_SAMPLE_SECTIONS evenly spaced sections
+
+PDFs know their page count, so head_tail and sampled jump straight to the
+pages they need and never parse the rest. Other formats are streamed once
+from the start while only about a budget's worth of text is kept. Skipped
+text is replaced by a one-line marker so the model knows the document
+continues.
+"""
+
+import os
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass
+from itertools import chain
+from token_estimator import CHARS_PER_TOKEN
+
+POLICIES = ('head', 'head_tail', 'sampled')
+DEFAULT_SAMPLE_SECTIONS = 5
+
+
+@dataclass(frozen=True)
+class ExtractionBudget:
+    """How many characters to extract from each document, and from where."""
+    max_chars: int
+    policy: str = 'head'
+    sections: int = DEFAULT_SAMPLE_SECTIONS
+
+    def identity(self):
+        """Short description used in cache keys and summary settings."""
+        sections = f"x{self.sections}" if self.policy == 'sampled' else ''
+        return f"{self.policy}{sections}:{self.max_chars}"
+
+
+def add_budget_arguments(parser):
+    """Add the extraction budget options, with defaults from EXTRACTION_* variables."""
+    parser.add_argument(
+        '--extract-max-chars',
+        type=int,
+        default=int(os.getenv('EXTRACTION_MAX_CHARS', '0')),
+        metavar='N',
+        help='Stop extracting a document after N characters (default: no limit, or EXTRACTION_MAX_CHARS)'
+    )
+    parser.add_argument(
+        '--extract-max-tokens',
+        type=int,
+        default=int(os.getenv('EXTRACTION_MAX_TOKENS', '0')),
+        metavar='N',
+        help=f'Stop extracting a document after about N tokens ({CHARS_PER_TOKEN} characters each; '
+             'default: no limit, or EXTRACTION_MAX_TOKENS)'
+    )
+    parser.add_argument(
+        '--truncation',
+        choices=POLICIES,
+        default=os.getenv('EXTRACTION_TRUNCATION', 'head'),
+        help='Which part of a document fills the budget: head (default), head_tail, or sampled '
+             'sections (or EXTRACTION_TRUNCATION)'
+    )
+    parser.add_argument(
+        '--sample-sections',
+        type=int,
+        default=int(os.getenv('EXTRACTION_SAMPLE_SECTIONS', str(DEFAULT_SAMPLE_SECTIONS))),
+        metavar='N',
+        help=f'Number of sections taken by --truncation sampled (default: {DEFAULT_SAMPLE_SECTIONS}, '
+             'or EXTRACTION_SAMPLE_SECTIONS)'
+    )
+
+
+def budget_from_args(args):
+    """Return the ExtractionBudget chosen on the command line, or None for no limit.
+
+    When both a character and a token limit are given, the smaller wins.
+    """
+    limits = [limit for limit in (args.extract_max_chars, args.extract_max_tokens * CHARS_PER_TOKEN) if limit > 0]
+    if not limits:
+        return None
+    return ExtractionBudget(min(limits), args.truncation, max(1, args.sample_sections))
+
+
+def _marker(detail, separator):
+    """Line standing in for text that was not extracted."""
+    marker = f"[... {detail} not extracted ...]"
+    # Pages joined without a separator (lines) still need the marker on a line of its own
+    return marker if separator else f"\n{marker}\n"
+
+
+def _page_span(first, last, total):
+    """'page 7 of 90' or 'pages 7-12 of 90' (1-based, inclusive)."""
+    return f"page {first} of {total}" if first == last else f"pages {first}-{last} of {total}"
+
+
+def select_pages(read_pages, total, budget, separator):
+    """Read just enough pages of a random-access document to fill the budget.
+
+    read_pages(numbers) must be a generator yielding the text of each page
+    number taken from the iterable numbers, taking them one at a time so
+    the selection can be steered while it runs. total is the document's
+    page count. Returns (text, pages read, whether anything was left out).
+    """
+    if budget.policy == 'sampled':
+        count = max(1, min(budget.sections, total))
+        starts = [index * total // count for index in range(count)] + [total]
+        plan = [{'start': starts[index], 'stop': starts[index + 1], 'share': budget.max_chars // count}
+                for index in range(count)]
+    else:
+        share = budget.max_chars // 2 if budget.policy == 'head_tail' else budget.max_chars
+        plan = [{'start': 0, 'stop': total, 'share': share}]
+    for section in plan:
+        section.update(texts=[], chars=0, cut=False, tail=False)
+    current = [None]
+    # First page the tail may read; the head's last page again if the head stopped inside it
+    floor = [total]
+
+    def numbers():
+        carry = 0
+        for section in plan:
+            # Budget left over by a short section moves on to the next one
+            section['share'] += carry
+            current[0] = section
+            for number in range(section['start'], section['stop']):
+                if section['chars'] >= section['share']:
+                    break
+                yield number
+            carry = section['share'] - section['chars']
+        if budget.policy != 'head_tail':
+            return
+        head = plan[0]
+        floor[0] = len(head['texts']) - (1 if head['cut'] else 0)
+        tail = {'start': total, 'share': budget.max_chars - head['chars'], 'texts': [], 'chars': 0,
+                'cut': False, 'tail': True}
+        plan.append(tail)
+        current[0] = tail
+        for number in range(total - 1, floor[0] - 1, -1):
+            if tail['chars'] >= tail['share']:
+                break
+            tail['start'] = number
+            yield number
+
+    read = 0
+    for text in read_pages(numbers()):
+        read += 1
+        section = current[0]
+        room = section['share'] - section['chars']
+        if section['tail']:
+            if section['start'] < len(plan[0]['texts']):
+                # The page the head stopped in: only its unread end is new
+                text = text[len(plan[0]['texts'][-1]):]
+            if len(text) > room:
+                text, section['cut'] = text[len(text) - room:], True
+        elif len(text) > room:
+            text, section['cut'] = text[:room], True
+        section['texts'].append(text)
+        section['chars'] += len(text)
+
+    parts = []
+    omitted = []
+
+    def omit(detail):
+        parts.append(_marker(detail, separator))
+        omitted.append(detail)
+
+    position = 0  # first page not yet covered
+    after_cut = False
+    for section in plan:
+        texts = section['texts'][::-1] if section['tail'] else section['texts']
+        if not texts:
+            continue
+        start = section['start']
+        if start > position:
+            omit(_page_span(position + 1, start, total))
+        elif start < position:
+            # The tail finishes the page the head stopped in
+            if section['cut']:
+                omit(f"part of page {start + 1}")
+                parts.append(separator.join(texts))
+            else:
+                parts[-1] += texts[0]
+                parts.extend([separator.join(texts[1:])] if len(texts) > 1 else [])
+        elif after_cut:
+            omit(f"rest of page {position}")
+        elif section['tail'] and section['cut']:
+            omit(f"start of page {start + 1}")
+        if start >= position:
+            parts.append(separator.join(texts))
+        position = start + len(section['texts'])
+        after_cut = section['cut'] and not section['tail']
+    if position < total:
+        omit(_page_span(position + 1, total, total))
+    elif after_cut:
+        omit(f"rest of page {total}")
+    return separator.join(parts), read, bool(omitted)
+
+
+def select_stream(pages, budget, separator):
+    """Fill the budget from pages that can only be read in order.
+
+    pages is any iterable of page texts, typically a generator, and is
+    closed as soon as no more of it is needed. Returns (text, pages read,
+    whether anything was left out).
+    """
+    pages = iter(pages)
+    try:
+        if budget.policy == 'head':
+            return _stream_head(pages, budget.max_chars, separator)
+        if budget.policy == 'head_tail':
+            return _stream_head_tail(pages, budget.max_chars, separator)
+        return _stream_sampled(pages, budget.max_chars, budget.sections, separator)
+    finally:
+        close = getattr(pages, 'close', None)
+        if close:
+            close()
+
+
+def _stream_head(pages, max_chars, separator):
+    """The first max_chars characters; reading stops there."""
+    texts = []
+    chars = read = 0
+    truncated = False
+    for text in pages:
+        read += 1
+        if chars >= max_chars:
+            # Only read to learn that the document goes on
+            truncated = True
+            break
+        if len(text) > max_chars - chars:
+            text, truncated = text[:max_chars - chars], True
+        texts.append(text)
+        chars += len(text)
+        if truncated:
+            break
+    if truncated:
+        texts.append(_marker('rest of document', separator))
+    return separator.join(texts), read, truncated
+
+
+def _stream_head_tail(pages, max_chars, separator):
+    """Half the budget from the start and the rest from the end, keeping a bounded tail."""
+    head, tail = [], deque()
+    head_chars = tail_chars = skipped = read = 0
+    # True while the tail starts with the rest of the page the head stopped in
+    continued = False
+    for text in pages:
+        read += 1
+        room = max_chars // 2 - head_chars
+        if room > 0:
+            head.append(text[:room])
+            head_chars += len(head[-1])
+            text = text[room:]
+            if not text:
+                continue
+            continued = True
+        tail.append(text)
+        tail_chars += len(text)
+        # Whole pages fall out of the tail once the rest cover its share
+        while tail_chars - len(tail[0]) >= max_chars - head_chars:
+            skipped += len(tail[0])
+            tail_chars -= len(tail.popleft())
+            continued = False
+    excess = tail_chars - (max_chars - head_chars)
+    if excess > 0:
+        tail[0] = tail[0][excess:]
+        skipped += excess
+        continued = False
+
+    text = separator.join(head)
+    if skipped:
+        text += separator + _marker(f"{skipped:,} characters", separator)
+    if tail:
+        text += ('' if continued else separator) + separator.join(tail)
+    return text, read, bool(skipped)
+
+
+def _stream_sampled(pages, max_chars, count, separator):
+    """Evenly spaced sections of a document whose length is not known in advance.
+
+    Text is buffered until the budget is exceeded. From then on a new
+    section starts every stride pages and keeps up to twice its share of
+    the budget from the pages it spans (more while there are fewer sections
+    than wanted). Whenever there are more than twice as many sections as
+    needed, neighbouring sections are merged in pairs and the stride
+    doubles, so only a few times the budget is held at any time. At the
+    end, sections are picked at evenly spaced page numbers, each continuing
+    into the unpicked sections after it, and budget left unused by a short
+    section passes on to the next.
+    """
+    buffered = []
+    chars = 0
+    for text in pages:
+        buffered.append(text)
+        chars += len(text)
+        if chars > max_chars:
+            break
+    else:
+        return separator.join(buffered), len(buffered), False
+
+    cap = 2 * (max_chars // count)
+    # Per section: [first page number, character offset of that page, texts, characters taken]
+    sections = []
+    stride = 1
+    offset = read = 0
+    for index, text in enumerate(chain(buffered, pages)):
+        read += 1
+        if index % stride == 0:
+            sections.append([index, offset, [], 0])
+            if len(sections) > 2 * count:
+                sections = [_merge_sections(sections[i:i + 2], cap) for i in range(0, len(sections), 2)]
+                stride *= 2
+        section = sections[-1]
+        # While there are few sections, each may have to fill more than its share
+        limit = max(cap, max_chars // len(sections))
+        if section[3] < limit:
+            section[2].append(text[:limit - section[3]])
+            section[3] += len(section[2][-1])
+        offset += len(text)
+
+    # The section starting at or before each evenly spaced page, with the ones up to the next pick
+    starts = [section[0] for section in sections]
+    picks = sorted({bisect_right(starts, number * read // count) - 1 for number in range(count)})
+    picked = [_merge_sections(sections[pick:end], cap) for pick, end in zip(picks, picks[1:] + [len(sections)])]
+
+    parts = []
+    position = 0  # character offset up to which text is covered
+    carry = 0
+    for index, (_, start, texts, taken) in enumerate(picked):
+        allowance = max_chars * (index + 1) // len(picked) - max_chars * index // len(picked) + carry
+        texts = _take(texts, allowance)
+        taken = sum(len(text) for text in texts)
+        carry = allowance - taken
+        if start > position:
+            parts.append(_marker(f"{start - position:,} characters", separator))
+        parts.append(separator.join(texts))
+        position = start + taken
+    if position < offset:
+        parts.append(_marker(f"{offset - position:,} characters", separator))
+    return separator.join(parts), read, True
+
+
+def _merge_sections(sections, cap):
+    """Join consecutive sections into one holding up to cap characters.
+
+    A section that is not full took the whole of each of its pages, so the
+    next section's text continues it directly.
+    """
+    first, texts, taken = sections[0][:2], list(sections[0][2]), sections[0][3]
+    for section in sections[1:]:
+        if taken >= cap:
+            break
+        for text in _take(section[2], cap - taken):
+            texts.append(text)
+            taken += len(text)
+    return [*first, texts, taken]
+
+
+def _take(texts, limit):
+    """The leading texts holding at most limit characters, cutting the last one."""
+    kept = []
+    for text in texts:
+        if limit <= 0:
+            break
+        kept.append(text[:limit])
+        limit -= len(kept[-1])
+    return kept
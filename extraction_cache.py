@@ -0,0 +1,111 @@
+"""Content-addressed on-disk cache for extracted document text.
+
+Entries are keyed by the SHA-256 of the file contents plus an extractor id
+(extractor name and library versions), so a renamed file is still a hit while
+an upgraded pypdf/pdfplumber invalidates old entries. The cache is capped in
+size and evicts least-recently-used entries, tracked through file mtimes.
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = '.cache/extraction'
+DEFAULT_MAX_MB = 1024
+
+
+def file_sha256(file_path):
+    """Return the hex SHA-256 of a file's contents.
+
+    Results are memoised on path, size and mtime so a file consulted by
+    several stages in one run is only read once.
+    """
+    stat = os.stat(file_path)
+    return _sha256_of(str(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=None)
+def _sha256_of(file_path, size, mtime_ns, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """LRU-evicting cache of {text, pages, method} keyed by content + extractor."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024,
+                 read=True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.read = read
+        self.hits = 0
+        self.misses = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def key(self, content_hash, extractor_id):
+        """Combine a content hash and extractor id into a cache key."""
+        return hashlib.sha256(f"{content_hash}:{extractor_id}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _entries(self):
+        """Yield (path, size, mtime) for every cache entry."""
+        for path in self.cache_dir.glob('*/*.json'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+    def get(self, key):
+        """Return the cached entry dict for key, or None on a miss."""
+        path = self._path(key)
+        if not self.read or not path.exists():
+            self.misses += 1
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # Touch the entry so eviction sees it as recently used
+        os.utime(path)
+        self.hits += 1
+        return entry
+
+    def put(self, key, text, pages, method):
+        """Store an extraction result and evict old entries if over the cap."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        old_size = path.stat().st_size if path.exists() else 0
+
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'text': text, 'pages': pages, 'method': method}, f)
+        os.replace(tmp_path, path)
+
+        self._total_bytes += path.stat().st_size - old_size
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits its cap."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
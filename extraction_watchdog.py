@@ -0,0 +1,187 @@
+"""Run document extractions in supervised processes with time and memory limits.
+
+A malformed PDF can keep pdfminer busy for minutes or grow its memory
+without bound. Extractions therefore run in long-lived child processes,
+each watched by the thread that hands it work: the parent kills a child
+once EXTRACTION_TIMEOUT seconds have passed, and every child caps its own
+address space at EXTRACTION_MAX_MEMORY_MB (POSIX only) so a runaway parse
+fails with MemoryError instead of exhausting the machine. Either way an
+error result is returned and the run carries on with the next document.
+
+Children are reused from one document to the next, so parser libraries
+are imported once per process rather than once per document. A child is
+only replaced after it is killed for a timeout, runs out of memory or
+crashes.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from extractors import extract_document
+
+DEFAULT_TIMEOUT = 300
+
+# Children are started from a single-threaded server where available: forking
+# the parent directly while its supervising threads hold locks can deadlock them
+_context = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None)
+
+
+def limits_from_env():
+    """Return (timeout seconds, memory limit MB) from the environment; 0 disables a limit."""
+    timeout = float(os.getenv('EXTRACTION_TIMEOUT', str(DEFAULT_TIMEOUT)))
+    memory_mb = int(os.getenv('EXTRACTION_MAX_MEMORY_MB', '0'))
+    return timeout, memory_mb
+
+
+def _set_memory_limit(memory_mb):
+    """Cap this process's address space, where the platform supports it."""
+    try:
+        import resource
+    except ImportError:
+        return
+    limit = memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _serve(conn, memory_mb):
+    """Child process body: extract each document sent until told to stop.
+
+    After running out of memory the child exits, as its heap may not
+    recover; the parent starts a fresh one.
+    """
+    if memory_mb:
+        _set_memory_limit(memory_mb)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        file_path, page_range, budget = request
+        result = extract_document(file_path, page_range, budget)
+        exhausted = bool(memory_mb) and result['error'] == 'MemoryError'
+        if exhausted:
+            result['error'] = f"memory limit exceeded ({memory_mb} MB)"
+            result['notes'] = [f"✗ {result['error']}"]
+        conn.send((result, exhausted))
+        if exhausted:
+            return
+
+
+def _failed(reason):
+    """An extract_document()-style result for an extraction that never finished."""
+    return {'text': None, 'pages': 0, 'method': None, 'error': reason, 'notes': [f"✗ {reason}"],
+            'import_times': {}, 'page_engines': {}}
+
+
+class _Worker:
+    """One extraction child process and the parent's end of its pipe."""
+
+    def __init__(self, memory_mb):
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(target=_serve, args=(child_conn, memory_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.documents = 0
+
+    def stop(self, kill=False):
+        """Ask the child to exit (or kill it) and wait for it."""
+        if not kill:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+        self.process.join()
+
+
+class ExtractionSupervisor:
+    """Pool of reusable extraction processes with a timeout and memory limit.
+
+    extract() may be called from several threads at once; each call takes
+    an idle process, or starts one, and returns it to the pool afterwards
+    unless it had to be killed. Use as a context manager, or call close(),
+    to stop the processes.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, memory_mb=0, budget=None):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.budget = budget
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _take(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.stop(kill=True)
+        return _Worker(self.memory_mb)
+
+    def _run(self, worker, file_path, page_range):
+        """Extract one document in worker; returns (result, whether the worker can be reused)."""
+        try:
+            worker.conn.send((file_path, page_range, self.budget))
+        except OSError:
+            return _failed(f"extraction process exited with code {worker.process.exitcode}"), False
+        worker.documents += 1
+        if not worker.conn.poll(self.timeout or None):
+            return _failed(f"extraction timed out after {self.timeout:g}s"), False
+        try:
+            result, exhausted = worker.conn.recv()
+        except (EOFError, OSError):
+            # The child died before answering (e.g. killed for memory)
+            worker.process.join()
+            reason = f"extraction process exited with code {worker.process.exitcode}"
+            if self.memory_mb:
+                reason += f" (memory limit {self.memory_mb} MB)"
+            return _failed(reason), False
+        return result, not exhausted
+
+    def extract(self, file_path, page_range=None):
+        """Extract a document in a supervised process, giving up after the timeout.
+
+        Returns the same dict as extract_document(); a timeout, memory
+        exhaustion or crash of the process becomes an error result. A
+        process that had already extracted other documents may fail for
+        memory they left behind, so such a failure, other than a timeout,
+        is retried once in a fresh process.
+        """
+        start = time.perf_counter()
+        while True:
+            worker = self._take()
+            reused = worker.documents > 0
+            result, healthy = self._run(worker, file_path, page_range)
+            if healthy:
+                with self._lock:
+                    self._idle.append(worker)
+                break
+            worker.stop(kill=True)
+            if not reused or result['error'].startswith('extraction timed out'):
+                break
+        result['seconds'] = time.perf_counter() - start
+        return result
+
+    def close(self):
+        """Stop every idle process."""
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.stop()
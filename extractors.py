@@ -0,0 +1,433 @@
+"""Registry of text extractors keyed by file extension.
+
+Each extractor's parsing library is imported the first time a file of its
+type is extracted, so a run over plain text never pays for pypdf,
+pdfplumber (pdfminer + PIL), python-docx, python-pptx or odfpy. New formats
+are added with register_extractor(), either here or from a plugin module
+named in EXTRACTOR_PLUGINS (comma-separated import paths):
+
+    # my_extractors.py
+    from extractors import register_extractor
+
+    def extract_from_html(file_path):
+        from bs4 import BeautifulSoup
+        with open(file_path, 'rb') as f:
+            return BeautifulSoup(f, 'html.parser').get_text('\\n'), 1
+
+    register_extractor(['.html', '.htm'], extract_from_html, method='html',
+                       packages=['beautifulsoup4'], imports=['bs4'])
+
+An extractor takes a file path and returns (text, pages), or a dict with
+text, pages and optionally method, notes and page_engines when it needs to
+report more. It can instead be a generator that yields the text of each
+page, slide or paragraph in turn; with an extraction budget (see
+extraction_budget.py) it is then closed as soon as enough text has been
+read, rather than parsing the whole document first:
+
+    def extract_from_log(file_path):
+        with open(file_path, encoding='utf-8', errors='ignore') as f:
+            yield from f
+
+    register_extractor(['.log'], extract_from_log, method='log', separator='')
+
+A generator registered with page_count takes (file_path, numbers) and
+yields the pages numbered in numbers, in that order (all pages if None).
+It must take the numbers one at a time, because they are chosen as the
+text comes in. A generator with a report parameter is passed a dict it can
+fill with pages, method, notes and page_engines.
+"""
+
+import importlib
+import inspect
+import os
+import time
+from dataclasses import dataclass, field
+from importlib.metadata import version, PackageNotFoundError
+from pathlib import Path
+from chunking import PAGE_BREAK
+from extraction_budget import select_pages, select_stream
+
+# Bump when the extraction logic in this file changes so cached text is re-extracted
+EXTRACTORS_VERSION = '4'
+
+
+@dataclass
+class Extractor:
+    """A registered extractor and the libraries it needs."""
+    function: object
+    method: str
+    packages: list = field(default_factory=list)  # distributions in the cache identity
+    imports: list = field(default_factory=list)   # modules imported on first use
+    page_count: object = None  # set if function accepts (file_path, start, stop) or (file_path, numbers)
+    separator: str = PAGE_BREAK  # joins the pages a generator yields
+    streaming: bool = False      # function is a page generator
+    reports: bool = False        # generator takes a report dict
+    loaded: bool = False
+
+
+_REGISTRY = {}
+
+# Seconds spent importing each extractor module in this process
+IMPORT_TIMES = {}
+
+_plugins_loaded = False
+
+
+def register_extractor(extensions, function, method, packages=(), imports=(), page_count=None,
+                       separator=PAGE_BREAK):
+    """Register function as the extractor for each extension (e.g. '.html').
+
+    packages are distribution names whose versions invalidate cached text
+    when they change; imports are modules to import before the first call.
+    An extractor that can read a page range takes (file_path, start, stop)
+    and passes a page_count(file_path) function so large files can be split.
+    separator joins the pages yielded by a generator extractor.
+    A later registration for the same extension replaces the earlier one.
+    """
+    streaming = inspect.isgeneratorfunction(function)
+    reports = streaming and 'report' in inspect.signature(function).parameters
+    extractor = Extractor(function, method, list(packages), list(imports), page_count, separator,
+                          streaming, reports)
+    for extension in extensions:
+        _REGISTRY[extension.lower()] = extractor
+
+
+def load_plugins():
+    """Import the modules named in EXTRACTOR_PLUGINS so they can register extractors."""
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+    _plugins_loaded = True
+    for module in os.getenv('EXTRACTOR_PLUGINS', '').split(','):
+        if module.strip():
+            importlib.import_module(module.strip())
+
+
+def supported_extensions():
+    """Return the registered extensions, sorted."""
+    load_plugins()
+    return sorted(_REGISTRY)
+
+
+def get_extractor(file_extension):
+    """Return the Extractor for an extension, or None if none is registered."""
+    load_plugins()
+    return _REGISTRY.get(file_extension.lower())
+
+
+def _import_timed(module):
+    """Import a module, recording its import time the first time."""
+    start = time.perf_counter()
+    imported = importlib.import_module(module)
+    IMPORT_TIMES.setdefault(module, time.perf_counter() - start)
+    return imported
+
+
+def _load(extractor):
+    """Import an extractor's modules on first use, timing each import."""
+    if extractor.loaded:
+        return
+    for module in extractor.imports:
+        _import_timed(module)
+    extractor.loaded = True
+
+
+def extractor_id(file_extension, budget=None):
+    """Return the name/version identity of the extractor for a file extension.
+
+    An extraction budget is part of the identity, since it changes the text.
+    """
+    extractor = get_extractor(file_extension)
+    packages = []
+    for package in extractor.packages if extractor else []:
+        try:
+            packages.append(f"{package}-{version(package)}")
+        except PackageNotFoundError:
+            packages.append(f"{package}-unknown")
+    identity = f"{file_extension.lstrip('.')}/v{EXTRACTORS_VERSION}/" + '+'.join(packages)
+    return f"{identity}/{budget.identity()}" if budget else identity
+
+
+def page_ranges(file_path, pages_per_task):
+    """Split a document into (start, stop) page ranges of at most pages_per_task.
+
+    Returns None if its extractor cannot read page ranges or the document
+    fits in a single range.
+    """
+    extractor = get_extractor(Path(file_path).suffix)
+    if extractor is None or extractor.page_count is None or pages_per_task <= 0:
+        return None
+    try:
+        _load(extractor)
+        total = extractor.page_count(file_path)
+    except Exception:
+        # Let the normal extraction path report the error
+        return None
+    if total <= pages_per_task:
+        return None
+    return [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+
+
+def merge_results(results):
+    """Combine the results of consecutive page ranges into one document result."""
+    merged = {'text': None, 'pages': 0, 'method': None, 'error': None, 'notes': [],
+              'import_times': {}, 'page_engines': {}, 'seconds': 0}
+    methods = []
+    for result in results:
+        merged['notes'].extend(note for note in result['notes'] if note not in merged['notes'])
+        # Total worker time spent on the document across its ranges
+        merged['seconds'] += result.get('seconds', 0)
+        for module, seconds in result['import_times'].items():
+            merged['import_times'][module] = max(seconds, merged['import_times'].get(module, 0))
+        if result['error']:
+            merged['error'] = merged['error'] or result['error']
+            continue
+        merged['pages'] += result['pages']
+        methods.extend(m for m in result['method'].split('+') if m not in methods)
+        for engine, count in result.get('page_engines', {}).items():
+            merged['page_engines'][engine] = merged['page_engines'].get(engine, 0) + count
+    if not merged['error']:
+        merged['text'] = PAGE_BREAK.join(result['text'] for result in results)
+        merged['method'] = '+'.join(methods)
+    return merged
+
+
+def _read_pages(extractor, file_path, page_range=None, budget=None):
+    """Run a page generator extractor, closing it once the budget is reached.
+
+    Returns the dict a non-generator extractor would, plus the truncation
+    note if any text was left out.
+    """
+    report = {}
+
+    def pages(numbers=None):
+        args = (file_path,) if extractor.page_count is None else (file_path, numbers)
+        return extractor.function(*args, **({'report': report} if extractor.reports else {}))
+
+    separator = extractor.separator
+    total = None
+    truncated = False
+    if page_range or budget is None:
+        texts = list(pages(range(*page_range) if page_range else None))
+        text, read = separator.join(texts), len(texts)
+    else:
+        if extractor.page_count is not None:
+            try:
+                total = extractor.page_count(file_path)
+            except Exception:
+                # Read from the start instead; the generator reports any real error
+                pass
+        if total is None:
+            text, read, truncated = select_stream(pages(), budget, separator)
+        else:
+            text, read, truncated = select_pages(pages, total, budget, separator)
+
+    notes = report.get('notes', [])
+    if truncated:
+        pages_read = f", read {read} of {total} pages" if total is not None else ''
+        notes.append(f"✂ Truncated to {len(text):,} characters ({budget.policy}{pages_read})")
+    return {
+        'text': text,
+        'pages': report.get('pages', read),
+        'method': report.get('method', extractor.method),
+        'notes': notes,
+        'page_engines': report.get('page_engines', {}),
+    }
+
+
+def extract_document(file_path, page_range=None, budget=None):
+    """Extract text from a single document with the extractor for its extension.
+
+    Runs in the main process or in a pool worker, so it never touches shared
+    state and never prints; progress lines are returned in 'notes' for the
+    caller to print in input order. page_range is an optional (start, stop)
+    from page_ranges(). budget is an optional ExtractionBudget; generator
+    extractors stop reading once it is spent, and the text of any other
+    extractor is cut down to it afterwards.
+
+    Returns a dict with keys: text, pages, method, error, notes, seconds,
+    import_times and page_engines (pages handled by each engine, if known).
+    """
+    result = {'text': None, 'pages': 0, 'method': None, 'error': None, 'notes': [],
+              'import_times': {}, 'page_engines': {}}
+    file_extension = Path(file_path).suffix.lower()
+    start = time.perf_counter()
+
+    try:
+        extractor = get_extractor(file_extension)
+        if extractor is None:
+            result['notes'].append(f"⚠ Unsupported file type: {file_extension}")
+            result['error'] = f"unsupported file type: {file_extension}"
+            return result
+
+        already_imported = set(IMPORT_TIMES)
+        _load(extractor)
+        if extractor.streaming:
+            output = _read_pages(extractor, file_path, page_range, budget)
+        else:
+            output = extractor.function(file_path, *page_range) if page_range else extractor.function(file_path)
+        result['import_times'] = {module: seconds for module, seconds in IMPORT_TIMES.items()
+                                  if module not in already_imported}
+        if isinstance(output, dict):
+            result['notes'].extend(output.get('notes', []))
+            result['page_engines'] = output.get('page_engines', {})
+            result['text'], result['pages'] = output['text'], output['pages']
+            result['method'] = output.get('method', extractor.method)
+        else:
+            result['text'], result['pages'] = output
+            result['method'] = extractor.method
+
+        if budget is not None and not extractor.streaming and not page_range and result['text']:
+            # Already fully extracted, so the budget only bounds what is sent on
+            lines = result['text'].splitlines(keepends=True)
+            result['text'], _, truncated = select_stream(lines, budget, '')
+            if truncated:
+                result['notes'].append(f"✂ Truncated to {len(result['text']):,} characters ({budget.policy})")
+
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+        result['notes'].append(f"✗ Error: {result['error']}")
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def pdf_page_count(pdf_path):
+    """Return the number of pages in a PDF."""
+    from pypdf import PdfReader
+    return len(PdfReader(pdf_path).pages)
+
+def extract_pages_pdfplumber(pdf_path, page_numbers):
+    """Extract the given pages with pdfplumber (more robust but slower).
+
+    Returns {page number: text}; a page that still fails maps to ''.
+    """
+    # pdfplumber is only imported when a PDF actually needs it
+    pdfplumber = _import_timed('pdfplumber')
+    texts = {}
+    with pdfplumber.open(pdf_path) as pdf:
+        for number in page_numbers:
+            try:
+                texts[number] = pdf.pages[number].extract_text() or ''
+            except Exception:
+                texts[number] = ''
+    return texts
+
+def extract_from_pdf(file_path, numbers=None, report=None):
+    """Yield the text of .pdf pages one at a time.
+
+    Each page is read with pypdf (faster); only a page where pypdf raises or
+    returns no text is re-read with pdfplumber. numbers selects the pages
+    and their order (default: all), so a large PDF can be spread over
+    several workers or cut short by an extraction budget.
+    """
+    from pypdf import PdfReader
+    report = {} if report is None else report
+    notes = report.setdefault('notes', [])
+    engines = report.setdefault('page_engines', {'pypdf': 0, 'pdfplumber': 0, 'empty': 0})
+    plumber = None
+    errors = 0
+    try:
+        try:
+            reader = PdfReader(file_path)
+            total = len(reader.pages)
+        except Exception as e:
+            # pypdf cannot parse the document at all; hand every page to pdfplumber
+            notes.append(f"⚠ pypdf could not open the file ({e}), using pdfplumber")
+            reader = None
+            plumber = _import_timed('pdfplumber').open(file_path)
+            total = len(plumber.pages)
+
+        for number in range(total) if numbers is None else numbers:
+            if not 0 <= number < total:
+                continue
+            text = ''
+            if reader is not None:
+                try:
+                    text = reader.pages[number].extract_text() or ''
+                except Exception:
+                    errors += 1
+            if text.strip():
+                engines['pypdf'] += 1
+            else:
+                # pdfplumber is only imported when a page actually needs it
+                if plumber is None:
+                    plumber = _import_timed('pdfplumber').open(file_path)
+                try:
+                    retry = plumber.pages[number].extract_text() or ''
+                except Exception:
+                    retry = ''
+                if retry.strip():
+                    text = retry
+                    engines['pdfplumber'] += 1
+                else:
+                    engines['empty'] += 1
+            yield text
+    finally:
+        if plumber is not None:
+            plumber.close()
+        if errors:
+            notes.append(f"⚠ pypdf failed on {errors} page(s), retried with pdfplumber")
+        report['method'] = '+'.join(engine for engine in ('pypdf', 'pdfplumber') if engines[engine]) or 'pypdf'
+
+def extract_from_text(file_path, report=None):
+    """Yield the lines of .txt or .md files."""
+    if report is not None:
+        report['pages'] = 1
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        # Bounded reads, so a file without line breaks is still read piecemeal
+        yield from iter(lambda: f.readline(64 * 1024), '')
+
+def extract_from_docx(file_path, report=None):
+    """Yield the paragraphs of .docx files."""
+    from docx import Document
+    doc = Document(file_path)
+    word_count = 0
+    try:
+        for para in doc.paragraphs:
+            text = para.text
+            word_count += len(text.split())
+            yield text
+    finally:
+        if report is not None:
+            # Estimate pages (rough: 500 words per page)
+            report['pages'] = max(1, word_count // 500)
+
+def extract_from_pptx(file_path, report=None):
+    """Yield the text of each .pptx slide that has any."""
+    from pptx import Presentation
+    prs = Presentation(file_path)
+    if report is not None:
+        report['pages'] = len(prs.slides)
+    for slide in prs.slides:
+        text_runs = []
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                text_runs.append(shape.text)
+        if text_runs:
+            yield '\n'.join(text_runs)
+
+def extract_from_odp(file_path, report=None):
+    """Yield the text paragraphs of .odp files."""
+    from odf.opendocument import load as load_odf
+    from odf.text import P
+    from odf.draw import Frame
+    doc = load_odf(file_path)
+    if report is not None:
+        # Count frames as slide estimate
+        report['pages'] = max(1, len(doc.getElementsByType(Frame)))
+    for paragraph in doc.getElementsByType(P):
+        text_content = ''.join(node.data for node in paragraph.childNodes if hasattr(node, 'data'))
+        if text_content.strip():
+            yield text_content
+
+
+register_extractor(['.pdf'], extract_from_pdf, method='pypdf',
+                   packages=['pypdf', 'pdfplumber'], imports=['pypdf'], page_count=pdf_page_count)
+register_extractor(['.docx'], extract_from_docx, method='docx',
+                   packages=['python-docx'], imports=['docx'], separator='\n')
+register_extractor(['.pptx'], extract_from_pptx, method='pptx',
+                   packages=['python-pptx'], imports=['pptx'])
+register_extractor(['.odp'], extract_from_odp, method='odp',
+                   packages=['odfpy'], imports=['odf.opendocument'], separator='\n')
+register_extractor(['.txt', '.md'], extract_from_text, method='txt', separator='')
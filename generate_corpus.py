@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Generate a synthetic document corpus for extraction benchmarks.
+
+Writes one PDF, DOCX, PPTX, ODP and TXT file per requested size, filled
+with deterministic pseudo-random prose so runs are comparable:
+
+  python generate_corpus.py                          # sizes 1,10,50 pages
+  python generate_corpus.py --sizes 5,200 --output-dir /tmp/corpus
+  python generate_corpus.py --formats pdf,docx --seed 7
+
+PDFs are written directly (no PDF library needed); DOCX, PPTX and ODP use
+the same python-docx, python-pptx and odfpy packages the extractors read
+them with.
+"""
+
+import argparse
+import random
+from pathlib import Path
+
+DEFAULT_OUTPUT_DIR = 'data/synthetic_corpus'
+DEFAULT_SIZES = [1, 10, 50]
+FORMATS = ['pdf', 'docx', 'pptx', 'odp', 'txt']
+
+# Roughly one printed page of text
+LINES_PER_PAGE = 45
+WORDS_PER_LINE = 12
+
+_WORDS = (
+    "actuarial model insurance risk capital reserve premium claim portfolio "
+    "climate bond green investment scenario economic generator regulation "
+    "data science machine learning pipeline feature training evaluation "
+    "language model inference token summary document analysis report "
+    "market volatility interest rate inflation liability asset mortality "
+    "the of and to in for with on by from as is are was that this which"
+).split()
+
+
+def make_pages(pages, seed):
+    """Return a list of pages, each a list of text lines."""
+    rng = random.Random(seed)
+    result = []
+    for page in range(1, pages + 1):
+        lines = [f"Section {page}: {rng.choice(_WORDS).title()} {rng.choice(_WORDS)}"]
+        for _ in range(LINES_PER_PAGE - 1):
+            words = [rng.choice(_WORDS) for _ in range(WORDS_PER_LINE)]
+            lines.append(' '.join(words).capitalize() + '.')
+        result.append(lines)
+    return result
+
+
+def _pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path, pages):
+    """Write a minimal multi-page PDF with one Helvetica text stream per page."""
+    objects = []  # object bodies, numbered from 1
+    page_ids = []
+    font_id = 3
+    objects.append(None)  # 1: catalog, filled in below
+    objects.append(None)  # 2: page tree, filled in below
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    for lines in pages:
+        commands = ['BT', '/F1 10 Tf', '12 TL', '50 780 Td']
+        commands.extend(f"({_pdf_escape(line)}) '" for line in lines)
+        commands.append('ET')
+        stream = '\n'.join(commands).encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (font_id, content_id)
+        )
+        page_ids.append(len(objects))
+
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids).encode('ascii')
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, xref))
+
+
+def write_docx(path, pages):
+    """Write a DOCX with one paragraph per line and a page break between pages."""
+    from docx import Document
+    from docx.enum.text import WD_BREAK
+    doc = Document()
+    for number, lines in enumerate(pages):
+        doc.add_heading(lines[0], level=2)
+        for line in lines[1:]:
+            doc.add_paragraph(line)
+        if number < len(pages) - 1:
+            doc.paragraphs[-1].add_run().add_break(WD_BREAK.PAGE)
+    doc.save(path)
+
+
+def write_pptx(path, pages):
+    """Write a PPTX with one slide per page."""
+    from pptx import Presentation
+    prs = Presentation()
+    layout = prs.slide_layouts[1]  # title and content
+    for lines in pages:
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = lines[0]
+        slide.placeholders[1].text = '\n'.join(lines[1:])
+    prs.save(path)
+
+
+def write_odp(path, pages):
+    """Write an ODP with one slide (draw:page) per page."""
+    from odf.opendocument import OpenDocumentPresentation
+    from odf.draw import Frame, Page, TextBox
+    from odf.style import MasterPage, PageLayout
+    from odf.text import P
+    doc = OpenDocumentPresentation()
+    layout = PageLayout(name='Layout')
+    doc.automaticstyles.addElement(layout)
+    master = MasterPage(name='Default', pagelayoutname=layout)
+    doc.masterstyles.addElement(master)
+    for number, lines in enumerate(pages, 1):
+        page = Page(name=f'page{number}', masterpagename=master)
+        frame = Frame(width='25cm', height='18cm', x='1cm', y='1cm')
+        box = TextBox()
+        for line in lines:
+            box.addElement(P(text=line))
+        frame.addElement(box)
+        page.addElement(frame)
+        doc.presentation.addElement(page)
+    doc.save(str(path))
+
+
+def write_txt(path, pages):
+    """Write plain text with a blank line between pages."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join('\n'.join(lines) for lines in pages))
+
+
+WRITERS = {
+    'pdf': write_pdf,
+    'docx': write_docx,
+    'pptx': write_pptx,
+    'odp': write_odp,
+    'txt': write_txt,
+}
+
+
+def generate_corpus(output_dir=DEFAULT_OUTPUT_DIR, sizes=DEFAULT_SIZES, formats=FORMATS, seed=0):
+    """Write one file per format and size; returns the list of paths written."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for size in sizes:
+        pages = make_pages(size, seed + size)
+        for fmt in formats:
+            path = output_dir / f"synthetic_{size:04d}p.{fmt}"
+            WRITERS[fmt](path, pages)
+            paths.append(path)
+    return paths
+
+
+def parse_list(value, cast=str):
+    """Parse a comma-separated option value."""
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic corpus for extraction benchmarks')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, metavar='DIR',
+                        help=f'Where to write the files (default: {DEFAULT_OUTPUT_DIR})')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), metavar='PAGES',
+                        help='Comma-separated page counts, one file per format for each (default: 1,10,50)')
+    parser.add_argument('--formats', default=','.join(FORMATS), metavar='LIST',
+                        help=f"Comma-separated formats (default: {','.join(FORMATS)})")
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated text')
+    args = parser.parse_args()
+
+    formats = parse_list(args.formats)
+    unknown = [fmt for fmt in formats if fmt not in WRITERS]
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(unknown)}")
+
+    paths = generate_corpus(args.output_dir, parse_list(args.sizes, int), formats, args.seed)
+    total_mb = sum(path.stat().st_size for path in paths) / 1024 / 1024
+    print(f"✓ Wrote {len(paths)} files ({total_mb:.1f} MB) to {args.output_dir}/")
+
+
+if __name__ == '__main__':
+    main()
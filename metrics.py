@@ -0,0 +1,200 @@
+"""Structured timing metrics for the pipeline.
+
+Every measurement is appended as one JSON line to METRICS_LOG
+(default data/metrics/events.jsonl) with a timestamp and run ID, so runs
+can be compared over time. The same measurements are aggregated in memory
+and written at the end of each script as a Prometheus textfile,
+data/metrics/<script>.prom, for node_exporter's textfile collector
+(point --collector.textfile.directory at METRICS_DIR).
+
+Set METRICS_ENABLED=false to turn both off.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_METRICS_DIR = 'data/metrics'
+
+# Histogram buckets in seconds, from a small text file up to a long batch queue
+SECONDS_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600, 14400, 86400)
+
+HELP = {
+    'batch_extraction_seconds': 'Time to extract text from one document',
+    'batch_documents_total': 'Documents seen by create_batch.py, by outcome',
+    'batch_document_bytes_total': 'Bytes of documents extracted',
+    'batch_document_pages_total': 'Pages of documents extracted',
+    'batch_document_chars_total': 'Characters of text extracted',
+    'batch_document_tokens_total': 'Estimated tokens of text sent for summarisation',
+    'batch_stage_seconds': 'Duration of a pipeline stage',
+    'batch_upload_bytes_total': 'Bytes of request files uploaded',
+    'batch_results_total': 'Batch results saved',
+    'batch_realtime_request_seconds': 'Time to complete one realtime chat completion, including retries',
+    'batch_run_timestamp_seconds': 'Unix time the metrics were last written',
+}
+
+RUN_ID = os.getenv('METRICS_RUN_ID') or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+
+def enabled():
+    """True unless METRICS_ENABLED is set to false."""
+    return os.getenv('METRICS_ENABLED', 'true').lower() != 'false'
+
+
+def metrics_dir():
+    """Return the metrics directory from METRICS_DIR or the default."""
+    return Path(os.getenv('METRICS_DIR', DEFAULT_METRICS_DIR))
+
+
+def log_path():
+    """Return the event log location from METRICS_LOG or the default."""
+    return Path(os.getenv('METRICS_LOG', metrics_dir() / 'events.jsonl'))
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def emit(event, **fields):
+    """Append one event to the JSONL log."""
+    if not enabled():
+        return
+    record = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'run_id': RUN_ID,
+              'event': event, **fields}
+    line = json.dumps(record, default=str) + '\n'
+    with _lock:
+        path = log_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def inc(name, amount=1, **labels):
+    """Add to a counter."""
+    with _lock:
+        key = (name, _labels(labels))
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    """Record one observation in a seconds histogram."""
+    with _lock:
+        key = (name, _labels(labels))
+        histogram = _histograms.setdefault(key, [0] * (len(SECONDS_BUCKETS) + 2))
+        for i, bound in enumerate(SECONDS_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+def record_stage(stage, seconds, **fields):
+    """Emit a stage event and observe its duration under batch_stage_seconds."""
+    observe('batch_stage_seconds', seconds, stage=stage)
+    emit(stage, seconds=round(seconds, 4), **fields)
+
+
+@contextmanager
+def timed_stage(stage, **fields):
+    """Time a block as a pipeline stage; the block may add fields to the yielded dict."""
+    start = time.perf_counter()
+    extra = dict(fields)
+    try:
+        yield extra
+    finally:
+        record_stage(stage, time.perf_counter() - start, **extra)
+
+
+def record_document(path, status, result=None, tokens=0, **fields):
+    """Record one document's extraction outcome and size."""
+    extension = Path(path).suffix.lower().lstrip('.') or 'none'
+    inc('batch_documents_total', status=status, format=extension)
+    event = {'path': str(path), 'status': status, 'format': extension, **fields}
+    if result is not None:
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        chars = len(result.get('text') or '')
+        seconds = result.get('seconds', 0)
+        event.update({
+            'method': result.get('method'),
+            'cached': bool(result.get('cached')),
+            'extraction_seconds': round(seconds, 4),
+            'bytes': size,
+            'pages': result.get('pages', 0),
+            'chars': chars,
+            'estimated_tokens': tokens,
+            'error': result.get('error'),
+        })
+        if not result.get('cached') and not result.get('error'):
+            observe('batch_extraction_seconds', seconds, format=extension)
+            inc('batch_document_bytes_total', size, format=extension)
+            inc('batch_document_pages_total', result.get('pages', 0), format=extension)
+            inc('batch_document_chars_total', chars, format=extension)
+        if tokens:
+            inc('batch_document_tokens_total', tokens, format=extension)
+    emit('document', **event)
+
+
+def _escape(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def prometheus_text():
+    """Render the in-memory metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(SECONDS_BUCKETS, values):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+
+    name = 'batch_run_timestamp_seconds'
+    lines.append(f"# HELP {name} {HELP[name]}")
+    lines.append(f"# TYPE {name} gauge")
+    lines.append(f"{name} {time.time():.0f}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(job):
+    """Write this process's metrics atomically to METRICS_DIR/<job>.prom; returns the path."""
+    if not enabled():
+        return None
+    path = metrics_dir() / f"{job}.prom"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.prom.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+    return path
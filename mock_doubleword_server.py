@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Doubleword Files and Batches API.
+
+Implements the subset of the OpenAI-compatible API used by this pipeline
+(file upload and download, batch create/retrieve/list/cancel, and direct
+chat completions for realtime.py) with OpenAI-shaped JSON, so the pipeline can be load-tested offline by pointing
+DOUBLEWORD_BASE_URL at it:
+
+  python mock_doubleword_server.py --port 8089 --queue-delay 2 --request-latency 0.01
+  DOUBLEWORD_BASE_URL=http://127.0.0.1:8089/v1 DOUBLEWORD_AUTH_TOKEN=mock python run_batch_pipeline.py
+
+Batch progress is computed from wall-clock time on each retrieve, so a
+10,000-request batch costs no background work. Nothing is persisted.
+
+For a load test, write synthetic requests and submit them as usual:
+
+  python mock_doubleword_server.py --make-requests 10000
+  python submit_batch.py --manifest loadtest_manifest_<timestamp>.json
+  python poll_and_process.py
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_SUMMARY = """## Document Metadata
+
+**S/N:** 1
+**Title:** Not available
+**Authors:** Not available
+
+---
+
+## Summary
+
+This is a canned summary returned by the local mock Doubleword server.
+"""
+
+
+class MockState:
+    """In-memory files and batches, shared by all request handler threads."""
+
+    def __init__(self, config):
+        self.config = config
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+
+    def add_file(self, content, filename, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            self.files[file_id] = {
+                'content': content,
+                'object': {
+                    'id': file_id,
+                    'object': 'file',
+                    'bytes': len(content),
+                    'created_at': int(time.time()),
+                    'filename': filename,
+                    'purpose': purpose,
+                    'status': 'processed',
+                },
+            }
+        return self.files[file_id]['object']
+
+    def add_batch(self, input_file_id, endpoint, completion_window, metadata):
+        content = self.files[input_file_id]['content']
+        requests = [json.loads(line) for line in content.decode('utf-8').splitlines() if line.strip()]
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        now = time.time()
+        with self.lock:
+            expires = self.random.random() < self.config.expiry_rate
+            failures = {r['custom_id'] for r in requests if self.random.random() < self.config.failure_rate}
+            self.batches[batch_id] = {
+                'requests': requests,
+                'failures': failures,
+                'expires': expires,
+                'created': now,
+                'cancelled_at': None,
+                'object': {
+                    'id': batch_id,
+                    'object': 'batch',
+                    'endpoint': endpoint,
+                    'errors': None,
+                    'input_file_id': input_file_id,
+                    'completion_window': completion_window,
+                    'status': 'validating',
+                    'output_file_id': None,
+                    'error_file_id': None,
+                    'created_at': int(now),
+                    'in_progress_at': None,
+                    'expires_at': int(now) + 86400,
+                    'finalizing_at': None,
+                    'completed_at': None,
+                    'failed_at': None,
+                    'expired_at': None,
+                    'cancelling_at': None,
+                    'cancelled_at': None,
+                    'request_counts': {'total': len(requests), 'completed': 0, 'failed': 0},
+                    'metadata': metadata,
+                },
+            }
+        return self.refresh(batch_id)
+
+    def completion_body(self, request):
+        """Build an OpenAI-style chat completion for one batch request."""
+        body = request.get('body', {})
+        if self.config.completion_mode == 'echo':
+            prompt = body.get('messages', [{}])[-1].get('content', '')
+            content = f"# Echo\n\n{prompt[:self.config.echo_chars]}"
+        else:
+            content = CANNED_SUMMARY
+        prompt_chars = sum(len(m.get('content', '')) for m in body.get('messages', []))
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'mock-model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_chars // 4,
+                'completion_tokens': len(content) // 4,
+                'total_tokens': prompt_chars // 4 + len(content) // 4,
+            },
+        }
+
+    def refresh(self, batch_id):
+        """Advance a batch's status from elapsed time and return its object."""
+        with self.lock:
+            batch = self.batches[batch_id]
+            obj = batch['object']
+            if obj['status'] in ('completed', 'failed', 'expired', 'cancelled'):
+                return dict(obj)
+
+            now = time.time()
+            started = batch['created'] + self.config.queue_delay
+            total = obj['request_counts']['total']
+            if batch['cancelled_at'] is not None:
+                obj['status'] = 'cancelled'
+                obj['cancelled_at'] = int(now)
+                return dict(obj)
+            if now < started:
+                return dict(obj)
+
+            obj['status'] = 'in_progress'
+            obj['in_progress_at'] = obj['in_progress_at'] or int(started)
+            per_second = self.config.concurrency / max(self.config.request_latency, 1e-6)
+            done = min(total, int((now - started) * per_second))
+
+            if batch['expires'] and done >= total // 2:
+                obj['status'] = 'expired'
+                obj['expired_at'] = int(now)
+                done = total // 2
+                self._write_results(batch, batch['requests'][:done])
+                return dict(obj)
+
+            failed = sum(1 for r in batch['requests'][:done] if r['custom_id'] in batch['failures'])
+            obj['request_counts'] = {'total': total, 'completed': done - failed, 'failed': failed}
+            if done >= total:
+                obj['status'] = 'completed'
+                obj['finalizing_at'] = int(now)
+                obj['completed_at'] = int(now)
+                self._write_results(batch, batch['requests'])
+            return dict(obj)
+
+    def _write_results(self, batch, finished):
+        """Create output and error files for the finished requests (lock held)."""
+        output_lines = []
+        error_lines = []
+        for request in finished:
+            line_id = f"batch_req_{uuid.uuid4().hex[:24]}"
+            if request['custom_id'] in batch['failures']:
+                error_lines.append(json.dumps({
+                    'id': line_id,
+                    'custom_id': request['custom_id'],
+                    'response': {'status_code': 500, 'request_id': line_id,
+                                 'body': {'error': {'message': 'mock failure', 'type': 'server_error'}}},
+                    'error': None,
+                }))
+            else:
+                output_lines.append(json.dumps({
+                    'id': line_id,
+                    'custom_id': request['custom_id'],
+                    'response': {'status_code': 200, 'request_id': line_id,
+                                 'body': self.completion_body(request)},
+                    'error': None,
+                }))
+
+        obj = batch['object']
+        for lines, key in ((output_lines, 'output_file_id'), (error_lines, 'error_file_id')):
+            if not lines:
+                continue
+            file_id = f"file-{uuid.uuid4().hex[:24]}"
+            content = ('\n'.join(lines) + '\n').encode('utf-8')
+            self.files[file_id] = {'content': content, 'object': {
+                'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                'filename': f"{key}.jsonl", 'purpose': 'batch_output', 'status': 'processed'}}
+            obj[key] = file_id
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Route OpenAI-compatible requests to the shared MockState."""
+
+    state = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.state.config.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self, what):
+        self._send_json({'error': {'message': f"No such {what}", 'type': 'invalid_request_error'}}, 404)
+
+    def _authorised(self):
+        """Check the bearer token when the server was started with --api-key."""
+        api_key = self.state.config.api_key
+        if api_key and self.headers.get('Authorization') != f"Bearer {api_key}":
+            self._send_json({'error': {'message': 'Invalid API key', 'type': 'invalid_request_error'}}, 401)
+            return False
+        return True
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', '0'))
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        if not self._authorised():
+            return
+        path = self.path.split('?')[0]
+        if match := re.fullmatch(r'/v1/files/([^/]+)/content', path):
+            self._send_file_content(match.group(1))
+        elif match := re.fullmatch(r'/v1/files/([^/]+)', path):
+            entry = self.state.files.get(match.group(1))
+            if entry is None:
+                return self._not_found('file')
+            self._send_json(entry['object'])
+        elif match := re.fullmatch(r'/v1/batches/([^/]+)', path):
+            if match.group(1) not in self.state.batches:
+                return self._not_found('batch')
+            self._send_json(self.state.refresh(match.group(1)))
+        elif path == '/v1/batches':
+            data = [self.state.refresh(batch_id) for batch_id in list(self.state.batches)]
+            self._send_json({'object': 'list', 'data': data[::-1], 'has_more': False})
+        else:
+            self._not_found('route')
+
+    def do_POST(self):
+        body = self._read_body()
+        if not self._authorised():
+            return
+        path = self.path.split('?')[0]
+        if path == '/v1/files':
+            self._create_file(body)
+        elif path == '/v1/batches':
+            params = json.loads(body or b'{}')
+            if params.get('input_file_id') not in self.state.files:
+                return self._not_found('file')
+            self._send_json(self.state.add_batch(
+                params['input_file_id'], params.get('endpoint', '/v1/chat/completions'),
+                params.get('completion_window', '24h'), params.get('metadata')))
+        elif path == '/v1/chat/completions':
+            self._chat_completion(json.loads(body or b'{}'))
+        elif match := re.fullmatch(r'/v1/batches/([^/]+)/cancel', path):
+            if match.group(1) not in self.state.batches:
+                return self._not_found('batch')
+            self.state.batches[match.group(1)]['cancelled_at'] = time.time()
+            self._send_json(self.state.refresh(match.group(1)))
+        else:
+            self._not_found('route')
+
+    def _chat_completion(self, body):
+        """Answer one chat completion after --request-latency, failing or throttling some."""
+        with self.state.lock:
+            draw = self.state.random.random()
+        time.sleep(self.state.config.request_latency)
+        if draw < self.state.config.throttle_rate:
+            self._send_json({'error': {'message': 'mock rate limit', 'type': 'rate_limit_error'}},
+                            status=429, headers={'Retry-After': '1'})
+        elif draw < self.state.config.throttle_rate + self.state.config.failure_rate:
+            self._send_json({'error': {'message': 'mock failure', 'type': 'server_error'}}, status=500)
+        else:
+            self._send_json(self.state.completion_body({'body': body}))
+
+    def _create_file(self, body):
+        """Parse a multipart/form-data upload with the stdlib email parser."""
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('utf-8')
+        message = BytesParser(policy=HTTP).parsebytes(header + body)
+        content, filename, purpose = b'', 'upload.jsonl', 'batch'
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name == 'file':
+                content = part.get_payload(decode=True) or b''
+                filename = part.get_filename() or filename
+            elif name == 'purpose':
+                purpose = part.get_content().strip()
+        self._send_json(self.state.add_file(content, filename, purpose))
+
+    def _send_file_content(self, file_id):
+        """Send file bytes, honouring a single 'bytes=N-' Range header."""
+        entry = self.state.files.get(file_id)
+        if entry is None:
+            return self._not_found('file')
+        content = entry['content']
+        start = 0
+        range_header = self.headers.get('Range', '')
+        if match := re.fullmatch(r'bytes=(\d+)-', range_header.strip()):
+            start = min(int(match.group(1)), len(content))
+        chunk = content[start:]
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(chunk)))
+        self.send_header('Accept-Ranges', 'bytes')
+        if start:
+            self.send_header('Content-Range', f"bytes {start}-{len(content) - 1}/{len(content)}")
+        self.end_headers()
+        self.wfile.write(chunk)
+
+
+def write_load_test(count, model, prefix='loadtest'):
+    """Write count small summary requests as batch shards plus a manifest; returns its path."""
+    from batch_writer import ShardedBatchWriter, build_request
+    rng = random.Random(count)
+    words = CANNED_SUMMARY.split()
+    writer = ShardedBatchWriter.from_env(time.strftime('%Y%m%d_%H%M%S'), prefix=prefix)
+    return writer.write_all(
+        build_request(f"summary-loadtest_{i:06d}",
+                      'Summarise this document.\n\n' + ' '.join(rng.choices(words, k=200)),
+                      model, 500, '/v1/chat/completions')
+        for i in range(count)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local mock Doubleword Files/Batches API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--queue-delay', type=float, default=2.0,
+                        help='Seconds a batch stays in validating before processing starts')
+    parser.add_argument('--request-latency', type=float, default=0.05,
+                        help='Seconds each request takes on one simulated worker')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='Simulated requests processed in parallel per batch')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='Fraction of requests written to the error file (or answered 500 in realtime)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Fraction of realtime chat completions answered 429 with Retry-After: 1')
+    parser.add_argument('--expiry-rate', type=float, default=0.0,
+                        help='Fraction of batches that expire half-way through')
+    parser.add_argument('--completion-mode', choices=['canned', 'echo'], default='canned',
+                        help='Return a fixed summary or echo the start of the prompt')
+    parser.add_argument('--echo-chars', type=int, default=500,
+                        help='Prompt characters echoed back in echo mode')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for failure and expiry draws')
+    parser.add_argument('--api-key', default=None,
+                        help='Reject requests whose bearer token differs (default: accept any)')
+    parser.add_argument('--verbose', action='store_true', help='Log every HTTP request')
+    parser.add_argument('--make-requests', type=int, metavar='N',
+                        help='Write N synthetic requests as loadtest shards plus a manifest, then exit')
+    config = parser.parse_args()
+
+    if config.make_requests:
+        manifest_path = write_load_test(config.make_requests, os.getenv('DOUBLEWORD_MODEL', 'mock-model'))
+        print(f"✓ Wrote {config.make_requests} requests; submit with: "
+              f"python submit_batch.py --manifest {manifest_path}")
+        return
+
+    MockHandler.state = MockState(config)
+    server = ThreadingHTTPServer((config.host, config.port), MockHandler)
+    print(f"Mock Doubleword API listening on http://{config.host}:{config.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping mock server")
+
+
+if __name__ == '__main__':
+    main()
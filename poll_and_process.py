@@ -1,81 +1,255 @@
 #!/usr/bin/env python3
-"""Poll batch job status and automatically download results when complete."""
+"""Poll batch jobs concurrently and process each batch's results as soon as it completes."""
 
 import os
-import glob
 import time
-import subprocess
-from openai import OpenAI
+import asyncio
+from openai import NotFoundError
 from dotenv import load_dotenv
+import metrics
+from api_client import create_client, is_retryable, retry_delay
+from process_results import latest_batch_ids, process_batch
+
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# Once this fraction of a batch is done, polling tightens back to the minimum interval
+NEAR_COMPLETION = 0.9
+
+
+def next_interval(interval, progressed, completed, total, min_interval, max_interval, backoff):
+    """Return the delay before the next status check of one batch.
+
+    Stays at the current interval while the batch is making progress, backs
+    off geometrically (up to max_interval) while it is stalled, and drops to
+    min_interval when the batch is nearly done so completion is noticed fast.
+    """
+    if total and completed >= total * NEAR_COMPLETION:
+        return min_interval
+    if progressed:
+        return interval
+    return min(max_interval, interval * backoff)
+
+
+def wait_until_queryable(client, batch_ids, timeout=60, interval=1, backoff=2):
+    """Retry retrieving newly created batches until every one can be queried.
+
+    A batch ID may briefly return 404 after creation. Waits at most timeout
+    seconds; returns False if some batch never became visible.
+    """
+    pending = list(batch_ids)
+    deadline = time.monotonic() + timeout
+    while pending:
+        still_pending = []
+        for batch_id in pending:
+            try:
+                client.batches.retrieve(batch_id)
+            except NotFoundError:
+                still_pending.append(batch_id)
+        pending = still_pending
+        if not pending:
+            break
+        if time.monotonic() >= deadline:
+            print(f"✗ Batch(es) not queryable after {timeout:g}s: {', '.join(pending)}")
+            return False
+        print(f"Waiting for {len(pending)} batch(es) to become queryable...")
+        time.sleep(min(interval, max(0, deadline - time.monotonic())))
+        interval *= backoff
+    return True
+
+
+def polling_intervals():
+    """Return (min_interval, max_interval, backoff) from the POLLING_* variables."""
+    # POLLING_INTERVAL is the longest wait between checks once a batch stalls
+    max_interval = float(os.environ.get('POLLING_INTERVAL', '30'))
+    min_interval = min(max_interval, float(os.environ.get('POLLING_MIN_INTERVAL', '5')))
+    backoff = float(os.environ.get('POLLING_BACKOFF', '2'))
+    return min_interval, max_interval, backoff
+
+
+async def call_with_retries(batch_id, action, function, *args, min_interval, max_interval):
+    """Run a blocking API call in a thread, retrying transient errors with jittered backoff.
+
+    Rate limits, connection errors, 5xx responses and a batch that is
+    briefly unknown (404) are retried up to POLLING_MAX_RETRIES times in a
+    row; anything else, or the last failure, is raised.
+    """
+    max_retries = int(os.environ.get('POLLING_MAX_RETRIES', '5'))
+    attempt = 0
+    while True:
+        try:
+            return await asyncio.to_thread(function, *args)
+        except Exception as e:
+            if not (is_retryable(e) or isinstance(e, NotFoundError)) or attempt >= max_retries:
+                raise
+            delay = retry_delay(e, attempt, min_interval, max_interval)
+            attempt += 1
+            print(f"⚠ {batch_id}: {action} failed ({type(e).__name__}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def record_batch_timings(batch, started_seen=None):
+    """Emit time-in-queue and time-to-completion metrics for a finished batch.
+
+    Uses the API's timestamps, falling back to when polling first saw the
+    batch in progress (started_seen) and the current time.
+    """
+    created = getattr(batch, 'created_at', None)
+    if not created:
+        return
+    started = getattr(batch, 'in_progress_at', None) or started_seen
+    finished = next((getattr(batch, f'{status}_at', None) for status in TERMINAL_STATUSES
+                     if getattr(batch, f'{status}_at', None)), None) or time.time()
+    counts = batch.request_counts
+    fields = {'batch_id': batch.id, 'status': batch.status, 'requests': counts.total,
+              'completed': counts.completed, 'failed': counts.failed}
+    if started:
+        metrics.record_stage('batch_queue', max(0, started - created), **fields)
+    metrics.record_stage('batch_completion', max(0, finished - created), **fields)
+
+
+async def poll_batch(client, batch_id, latest_status, min_interval, max_interval, backoff):
+    """Poll one batch until it reaches a terminal status, processing results on completion.
+
+    Returns the final batch status and the IDs of any follow-up batches
+    (reduce steps for split documents, retries of failed requests)
+    submitted while processing. An API error that persists through its
+    retries ends polling of this batch only, with status 'error'.
+    """
+    try:
+        return await _poll_batch(client, batch_id, latest_status, min_interval, max_interval, backoff)
+    except Exception as e:
+        latest_status[batch_id] = 'error'
+        print(f"\n✗ Stopped polling {batch_id}: {type(e).__name__}: {e}")
+        print("Run poll_and_process.py again to resume it")
+        return 'error', []
+
+
+async def _poll_batch(client, batch_id, latest_status, min_interval, max_interval, backoff):
+    interval = min_interval
+    last_seen = None
+    started_seen = None
 
-# Load environment variables
-load_dotenv()
-
-# Initialize client
-client = OpenAI(
-    api_key=os.environ['DOUBLEWORD_AUTH_TOKEN'],
-    base_url=os.environ['DOUBLEWORD_BASE_URL']
-)
-
-# Get polling interval from environment variable (default: 30 seconds)
-POLLING_INTERVAL = int(os.environ.get('POLLING_INTERVAL', '30'))
-
-# Find most recent batch_id file
-batch_id_files = glob.glob('batch_id_*.txt')
-if not batch_id_files:
-    print("Error: No batch_id_*.txt files found. Run submit_batch.py first.")
-    exit(1)
-
-latest_batch_id_file = max(batch_id_files, key=os.path.getmtime)
-with open(latest_batch_id_file, 'r') as f:
-    batch_id = f.read().strip()
-
-print(f"Using batch ID from: {latest_batch_id_file}")
-
-print(f"Polling batch job: {batch_id}")
-print("Press Ctrl+C to stop polling\n")
-
-try:
     while True:
-        batch = client.batches.retrieve(batch_id)
+        # The sync client is shared with result processing, so run it in a thread
+        batch = await call_with_retries(batch_id, 'status check', client.batches.retrieve, batch_id,
+                                        min_interval=min_interval, max_interval=max_interval)
         status = batch.status
         completed = batch.request_counts.completed
         total = batch.request_counts.total
+        latest_status[batch_id] = status
+        if status != 'validating' and started_seen is None:
+            started_seen = time.time()
+        if status in TERMINAL_STATUSES:
+            record_batch_timings(batch, started_seen)
 
         timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        print(f"[{timestamp}] Status: {status} | Progress: {completed}/{total}")
+        print(f"[{timestamp}] {batch_id} Status: {status} | Progress: {completed}/{total}")
 
         if status == 'completed':
-            print("\n✓ Batch completed successfully!")
+            print(f"\n✓ Batch {batch_id} completed successfully!")
             print("Downloading and processing results...\n")
-
-            # Run process_results.py
-            result = subprocess.run(['.venv/bin/python', 'process_results.py'])
-
-            if result.returncode == 0:
-                print("\n✓ All summaries saved to data/summaries/")
-            else:
-                print("\n✗ Error processing results")
-            break
+            # Process in a worker thread so other batches keep polling meanwhile
+            results_count, follow_up_ids = await call_with_retries(
+                batch_id, 'processing', process_batch, client, batch,
+                min_interval=min_interval, max_interval=max_interval)
+            print(f"\n✓ Saved {results_count} results from {batch_id}")
+            return status, follow_up_ids
 
         elif status == 'failed':
-            print(f"\n✗ Batch failed!")
+            print(f"\n✗ Batch {batch_id} failed!")
             if hasattr(batch, 'errors') and batch.errors:
                 print(f"Errors: {batch.errors}")
-            break
+            return status, []
 
         elif status == 'expired':
-            print(f"\n✗ Batch expired!")
-            break
+            print(f"\n✗ Batch {batch_id} expired! Saving partial results and retrying the rest...\n")
+            results_count, follow_up_ids = await call_with_retries(
+                batch_id, 'processing', process_batch, client, batch,
+                min_interval=min_interval, max_interval=max_interval)
+            print(f"\n✓ Saved {results_count} results from {batch_id}")
+            return status, follow_up_ids
 
         elif status == 'cancelled':
-            print(f"\n✗ Batch was cancelled!")
-            break
+            print(f"\n✗ Batch {batch_id} was cancelled!")
+            return status, []
 
-        # Wait before next check
-        time.sleep(POLLING_INTERVAL)
+        # The first check and any status change count as progress
+        progressed = last_seen is None or (status, completed) != last_seen
+        last_seen = (status, completed)
+        interval = next_interval(interval, progressed, completed, total,
+                                 min_interval, max_interval, backoff)
 
-except KeyboardInterrupt:
-    print("\n\nPolling stopped by user")
-    print(f"Current status: {status}")
-    print("Run this script again to resume polling")
+        # Wait before next check
+        await asyncio.sleep(interval)
+
+
+async def poll_batches(client, batch_ids, latest_status, min_interval, max_interval, backoff):
+    """Poll every batch concurrently, following up batches they spawn.
+
+    Returns {batch_id: final status}.
+    """
+    def start(batch_id):
+        return asyncio.create_task(
+            poll_batch(client, batch_id, latest_status, min_interval, max_interval, backoff)
+        )
+
+    tasks = {start(batch_id): batch_id for batch_id in batch_ids}
+    statuses = {}
+    while tasks:
+        finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            batch_id = tasks.pop(task)
+            statuses[batch_id], follow_up_ids = task.result()
+            for follow_up_id in follow_up_ids:
+                print(f"Following up batch {follow_up_id} submitted by {batch_id}")
+                tasks[start(follow_up_id)] = follow_up_id
+    return statuses
+
+
+def poll_and_process(client, batch_ids):
+    """Poll batches until they finish, processing results as each completes.
+
+    Returns {batch_id: final status}, including follow-up batches, or None
+    if polling was interrupted with Ctrl+C.
+    """
+    min_interval, max_interval, backoff = polling_intervals()
+    print(f"Polling {len(batch_ids)} batch job(s) every {min_interval:g}-{max_interval:g}s")
+    print("Press Ctrl+C to stop polling\n")
+
+    latest_status = {}
+    try:
+        return asyncio.run(poll_batches(
+            client, batch_ids, latest_status, min_interval, max_interval, backoff
+        ))
+    except KeyboardInterrupt:
+        print("\n\nPolling stopped by user")
+        for batch_id, status in latest_status.items():
+            print(f"Current status of {batch_id}: {status}")
+        print("Run poll_and_process.py to resume polling")
+        return None
+
+
+def main():
+    # Load environment variables
+    load_dotenv()
+
+    # One client for polling and downloading results
+    client = create_client()
+
+    latest_batch_id_file, batch_ids = latest_batch_ids()
+    print(f"Using batch ID(s) from: {latest_batch_id_file}")
+
+    statuses = poll_and_process(client, batch_ids)
+    metrics.write_prometheus('poll_and_process')
+    if statuses is None:
+        return
+
+    if 'completed' in statuses.values():
+        print("\n✓ All summaries saved to data/summaries/")
+    else:
+        print("\n✗ No batches completed")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,75 +4,414 @@
 import os
 import glob
 import json
+import time
 from pathlib import Path
 from datetime import datetime
-from openai import OpenAI
 from dotenv import load_dotenv
+import metrics
+from api_client import create_client
+from batch_writer import ShardedBatchWriter
+from compression import compressed_suffix, open_binary, open_text, temporary_path
+from chunking import CHUNK_SUMMARIES_DIR, record_chunk_results, record_reduce_batches
+from dedup import duplicate_note, take_links
+from request_ids import parse_custom_id
+from submit_batch import save_batch_ids, submit_shards
+from summary_manifest import SummaryManifest, record_summaries
+from summary_store import SummaryStore, document_for
 
-# Load environment variables
-load_dotenv()
+SUMMARIES_DIR = Path('data/summaries')
+SPOOL_DIR = Path('data/results_spool')
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
 
-# Initialize client
-client = OpenAI(
-    api_key=os.environ['DOUBLEWORD_AUTH_TOKEN'],
-    base_url=os.environ['DOUBLEWORD_BASE_URL']
-)
 
-# Find most recent batch_id file
-batch_id_files = glob.glob('batch_id_*.txt')
-if not batch_id_files:
-    print("Error: No batch_id_*.txt files found. Run submit_batch.py first.")
-    exit(1)
+def latest_batch_ids():
+    """Return the batch IDs in the most recent batch_id_*.txt file.
 
-latest_batch_id_file = max(batch_id_files, key=os.path.getmtime)
-with open(latest_batch_id_file, 'r') as f:
-    batch_id = f.read().strip()
+    Exits with an error message if no batch ID file exists.
+    """
+    batch_id_files = glob.glob('batch_id_*.txt')
+    if not batch_id_files:
+        print("Error: No batch_id_*.txt files found. Run submit_batch.py first.")
+        exit(1)
 
-print(f"Retrieving batch results: {batch_id}\n")
+    latest_batch_id_file = max(batch_id_files, key=os.path.getmtime)
+    with open(latest_batch_id_file, 'r') as f:
+        return latest_batch_id_file, [line.strip() for line in f if line.strip()]
 
-# Get batch status
-batch = client.batches.retrieve(batch_id)
 
-if batch.status != 'completed':
-    print(f"✗ Batch not completed yet. Status: {batch.status}")
-    exit(1)
+def spool_path_for(file_id, spool_dir=SPOOL_DIR):
+    """Return where a downloaded file is spooled, compressed per FILE_COMPRESSION."""
+    return spool_dir / f'{file_id}.jsonl{compressed_suffix()}'
 
-print(f"✓ Batch completed successfully")
-print(f"Output file ID: {batch.output_file_id}\n")
 
-# Download results file
-print("Downloading results...")
-file_response = client.files.content(batch.output_file_id)
+def iter_spooled_lines(client, file_id, spool_dir=SPOOL_DIR, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Yield the lines of a batch output file while streaming it to a local spool.
 
-# Create summaries directory
-summaries_dir = Path('data/summaries')
-summaries_dir.mkdir(parents=True, exist_ok=True)
-print(f"Summaries will be saved to: {summaries_dir}/\n")
+    The file is downloaded in chunks and compressed into
+    {file_id}.part.jsonl.gz (or .zst, or uncompressed, per
+    FILE_COMPRESSION), then renamed to {file_id}.jsonl.gz once complete, so
+    only one chunk is held in memory. If a partial spool is found from an
+    interrupted run, its complete lines are yielded first and the download
+    resumes from the last complete line with an HTTP Range request.
+    """
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    spool_path = spool_path_for(file_id, spool_dir)
+    part_path = spool_dir / f'{file_id}.part.jsonl{compressed_suffix()}'
 
-# Process each result
-results_count = 0
-for line in file_response.text.split('\n'):
-    if not line.strip():
-        continue
+    if spool_path.exists():
+        with open_text(spool_path) as f:
+            yield from f
+        return
 
-    result = json.loads(line)
-    custom_id = result['custom_id']
+    offset = 0
+    if part_path.exists():
+        # Copy the complete lines to a fresh spool, dropping a partial trailing
+        # line or a compressed block cut off mid-write; the rest is downloaded again
+        tmp_path = temporary_path(part_path)
+        with open_binary(part_path) as src, open_binary(tmp_path, 'wb') as dst:
+            try:
+                for raw in src:
+                    if not raw.endswith(b'\n'):
+                        break
+                    dst.write(raw)
+                    offset += len(raw)
+                    yield raw.decode('utf-8')
+            except Exception as e:
+                # gzip raises EOFError or BadGzipFile, zstandard a ZstdError, on a truncated tail
+                print(f"Partial spool of {file_id} ends in a truncated block ({type(e).__name__})")
+        os.replace(tmp_path, part_path)
+        print(f"Resuming download of {file_id} from byte {offset}")
 
-    # Extract summary from response
-    summary = result['response']['body']['choices'][0]['message']['content']
+    extra_headers = {'Range': f'bytes={offset}-'} if offset else None
+    with client.files.with_streaming_response.content(file_id, extra_headers=extra_headers) as response:
+        # A server that ignores Range resends the whole file; skip what we already have
+        skip = offset if offset and response.status_code != 206 else 0
+        buffer = b''
+        with open_binary(part_path, 'ab') as spool:
+            for chunk in response.iter_bytes(chunk_size):
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk = chunk[dropped:]
+                    skip -= dropped
+                    if not chunk:
+                        continue
+                spool.write(chunk)
+                spool.flush()
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n')
+                for raw in lines:
+                    yield raw.decode('utf-8') + '\n'
+        if buffer:
+            yield buffer.decode('utf-8')
 
-    # Extract filename from custom_id (e.g., "summary-DGM" -> "DGM")
-    filename = custom_id.replace('summary-', '')
+    os.replace(part_path, spool_path)
 
-    # Generate timestamp
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+def submit_follow_up(client, requests, prefix, metadata=None):
+    """Write follow-up requests to their own shards and submit them; returns the batch IDs."""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    writer = ShardedBatchWriter.from_env(timestamp, prefix=prefix)
+    writer.write_all(requests)
+    batch_ids = submit_shards(client, [shard['path'] for shard in writer.shards], metadata)
+    batch_id_file = save_batch_ids(batch_ids)
+    print(f"\n{len(batch_ids)} follow-up batch ID(s) saved to {batch_id_file}")
+    return batch_ids
+
+
+def save_summary(custom_id, summary, summaries_dir=SUMMARIES_DIR):
+    """Write one summary as markdown; returns the path written.
+
+    Summaries of a model/prompt variant go to a subdirectory named after it.
+    """
+    parsed = parse_custom_id(custom_id)
+    if parsed['kind'] == 'chunk':
+        # Partial summary of a split document, kept until its reduce step
+        CHUNK_SUMMARIES_DIR.mkdir(parents=True, exist_ok=True)
+        output_path = CHUNK_SUMMARIES_DIR / f'{custom_id}.md'
+    else:
+        # Extract filename from custom_id (e.g., "summary-DGM" -> "DGM")
+        filename = parsed['stem']
+        if parsed['variant']:
+            summaries_dir = summaries_dir / parsed['variant']
+            summaries_dir.mkdir(parents=True, exist_ok=True)
+
+        # Generate timestamp
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        output_path = summaries_dir / f'{filename}_summary_{timestamp}.md'
 
     # Save summary with timestamp as markdown
-    output_path = summaries_dir / f'{filename}_summary_{timestamp}.md'
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(summary)
+    return output_path
+
+
+def share_with_duplicates(saved_summaries, batch_id, summaries_dir=SUMMARIES_DIR):
+    """Give the duplicates linked to newly saved summaries a copy of them.
+
+    saved_summaries is a list of (custom_id, summary_path) of final
+    summaries. Each linked duplicate (see dedup.py) gets its own markdown
+    file, headed by a note naming the document the summary was written
+    for, and a row in the summary store. Returns their (custom_id, path).
+    """
+    links = take_links([custom_id for custom_id, _ in saved_summaries])
+    if not links:
+        return []
+    paths = dict(saved_summaries)
+    documents = SummaryManifest.load().pending_documents()
+    shared = []
+    with SummaryStore() as store:
+        for summary_id, duplicates in links.items():
+            with open(paths[summary_id], 'r', encoding='utf-8') as f:
+                summary = f.read()
+            for duplicate in duplicates:
+                output_path = save_summary(duplicate['custom_id'], duplicate_note(duplicate) + summary, summaries_dir)
+                store.add(duplicate['custom_id'], summary, batch_id, document_for(documents, duplicate['custom_id']),
+                          markdown_path=output_path)
+                shared.append((duplicate['custom_id'], str(output_path)))
+                print(f"✓ Linked duplicate: {output_path}")
+    return shared
+
+
+def result_content(result):
+    """Return (summary text, None) for a successful output line, or (None, reason)."""
+    if result.get('error'):
+        error = result['error']
+        return None, error.get('message', str(error)) if isinstance(error, dict) else str(error)
+    response = result.get('response') or {}
+    body = response.get('body') or {}
+    if response.get('status_code', 200) != 200:
+        message = (body.get('error') or {}).get('message', 'no error message')
+        return None, f"HTTP {response.get('status_code')}: {message}"
+    choices = body.get('choices') or []
+    if not choices or not (choices[0].get('message') or {}).get('content'):
+        return None, 'response has no content'
+    return choices[0]['message']['content'], None
+
+
+def result_usage(result):
+    """Return (model, token usage dict) reported in a successful output line."""
+    body = (result.get('response') or {}).get('body') or {}
+    return body.get('model'), body.get('usage')
+
+
+def read_error_file(client, batch, spool_dir=SPOOL_DIR):
+    """Return {custom_id: reason} for every line of the batch's error file."""
+    failures = {}
+    if not getattr(batch, 'error_file_id', None):
+        return failures
+    for line in iter_spooled_lines(client, batch.error_file_id, spool_dir):
+        if line.strip():
+            result = json.loads(line)
+            failures[result['custom_id']] = result_content(result)[1] or 'listed in error file'
+    spool_path_for(batch.error_file_id, spool_dir).unlink(missing_ok=True)
+    return failures
+
+
+def unfinished_requests(client, batch, succeeded, spool_dir=SPOOL_DIR):
+    """Diff the batch's input file against the succeeded custom_ids.
+
+    Returns the original request of every custom_id without a saved result,
+    whether it failed, errored or is missing from the output altogether.
+    """
+    requests = []
+    for line in iter_spooled_lines(client, batch.input_file_id, spool_dir):
+        if line.strip():
+            request = json.loads(line)
+            if request['custom_id'] not in succeeded:
+                requests.append(request)
+    spool_path_for(batch.input_file_id, spool_dir).unlink(missing_ok=True)
+    return requests
+
+
+def retry_failures(client, batch, succeeded, failures, spool_dir=SPOOL_DIR):
+    """Resubmit a batch's failed and missing requests as a smaller retry batch.
+
+    A retry batch records its attempt number in the batch metadata; once
+    BATCH_MAX_RETRIES attempts have been made the remaining failures are
+    only reported. Returns the retry batch IDs.
+    """
+    total = batch.request_counts.total if batch.request_counts else None
+    if total is not None and len(succeeded) >= total and not failures:
+        return []
+
+    retry_requests = unfinished_requests(client, batch, succeeded, spool_dir)
+    if not retry_requests:
+        return []
+
+    attempt = int((batch.metadata or {}).get('retry_attempt', 0))
+    max_retries = int(os.getenv('BATCH_MAX_RETRIES', '2'))
+    print(f"\n⚠ {len(retry_requests)} request(s) from {batch.id} did not produce a summary:")
+    for request in retry_requests:
+        print(f"  - {request['custom_id']}: {failures.get(request['custom_id'], 'missing from output')}")
+    metrics.emit('retry', batch_id=batch.id, attempt=attempt + 1, requests=len(retry_requests),
+                 errored=len(failures), missing=len(retry_requests) - len(failures),
+                 exhausted=attempt >= max_retries)
+
+    if attempt >= max_retries:
+        print(f"✗ Giving up after {attempt} retr{'y' if attempt == 1 else 'ies'} (BATCH_MAX_RETRIES={max_retries}); "
+              f"rerun create_batch.py to resubmit these documents")
+        return []
+
+    print(f"Submitting retry batch (attempt {attempt + 1} of {max_retries})...")
+    return submit_follow_up(client, retry_requests, prefix='retry',
+                            metadata={'retry_attempt': str(attempt + 1)})
+
+
+def batch_spool_dir(batch_id, spool_dir=SPOOL_DIR):
+    """Directory holding one batch's spooled files while it is processed."""
+    return spool_dir / batch_id
+
+
+def done_path_for(batch, spool_dir=SPOOL_DIR):
+    """Where process_batch() lists the results of a batch it has saved so far.
+
+    The file exists from the start of processing until every result has
+    been handled, so a batch whose processing was cut short still has one.
+    """
+    return batch_spool_dir(batch.id, spool_dir) / f'{batch.output_file_id or batch.id}.done'
+
+
+def process_batch(client, batch, summaries_dir=SUMMARIES_DIR, spool_dir=SPOOL_DIR):
+    """Stream a finished batch's output file and save one summary per result.
+
+    Each summary is written as soon as its line is parsed, both as markdown
+    and to the summary store with its token usage. Processed
+    custom_ids are recorded next to the spool, in a directory of its own for
+    the batch, so an interrupted run resumes without rewriting summaries it
+    already saved, and every saved summary
+    is recorded in the summary manifest once the batch is done. Results for
+    chunks of a split document go to data/chunk_summaries/; when the last
+    chunk of a document arrives, a reduce batch is submitted to merge them.
+    Requests that errored, failed or are missing from the output (e.g. in
+    an expired batch) are resubmitted as a retry batch.
+
+    Returns (number of results saved, IDs of follow-up batches submitted).
+    """
+    file_id = batch.output_file_id
+    print(f"Output file ID: {file_id}\n")
+
+    # Create summaries directory
+    summaries_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Summaries will be saved to: {summaries_dir}/\n")
+
+    done_path = done_path_for(batch, spool_dir)
+    spool_dir = batch_spool_dir(batch.id, spool_dir)
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    # custom_id -> summary path, for results saved before an interruption
+    done = {}
+    if done_path.exists():
+        with open(done_path, 'r', encoding='utf-8') as f:
+            done = dict(line.rstrip('\n').split('\t', 1) for line in f if line.strip())
+        print(f"Resuming: {len(done)} results already processed")
+
+    # Download results file
+    print("Downloading results...")
+    download_start = time.perf_counter()
+
+    # Process each result
+    results_count = 0
+    failures = {}  # custom_id -> reason
+    lines = iter_spooled_lines(client, file_id, spool_dir) if file_id else []
+    documents = SummaryManifest.load().pending_documents()
+    with open(done_path, 'a', encoding='utf-8') as done_file, SummaryStore() as store:
+        for line in lines:
+            if not line.strip():
+                continue
+
+            result = json.loads(line)
+            custom_id = result['custom_id']
+            if custom_id in done:
+                continue
+
+            # Extract summary from response
+            summary, error = result_content(result)
+            if error:
+                failures[custom_id] = error
+                continue
+
+            output_path = save_summary(custom_id, summary, summaries_dir)
+            model, usage = result_usage(result)
+            store.add(custom_id, summary, batch.id, document_for(documents, custom_id), model, usage, output_path)
+            done_file.write(f"{custom_id}\t{output_path}\n")
+            done_file.flush()
+            done[custom_id] = str(output_path)
+
+            print(f"✓ Saved: {output_path}")
+            results_count += 1
+
+    spool_path = spool_path_for(file_id, spool_dir)
+    metrics.record_stage('download_parse', time.perf_counter() - download_start, batch_id=batch.id,
+                         file_id=file_id, results=results_count, resumed=len(done) - results_count,
+                         failed=len(failures), bytes=spool_path.stat().st_size if spool_path.exists() else 0)
+    metrics.inc('batch_results_total', results_count)
+
+    saved_chunks = [(cid, path) for cid, path in done.items() if parse_custom_id(cid)['kind'] == 'chunk']
+    saved_summaries = [(cid, path) for cid, path in done.items() if parse_custom_id(cid)['kind'] != 'chunk']
+    saved_summaries += share_with_duplicates(saved_summaries, batch.id, summaries_dir)
+    record_summaries(batch.id, saved_summaries)
+
+    follow_up_ids = []
+    reduce_requests = record_chunk_results(saved_chunks, [cid for cid, _ in saved_summaries])
+    if reduce_requests:
+        print(f"\nAll chunks received for {len(reduce_requests)} document(s); submitting reduce batch...")
+        try:
+            follow_up_ids = submit_follow_up(client, reduce_requests, prefix='reduce')
+        finally:
+            record_reduce_batches([request['custom_id'] for request in reduce_requests], follow_up_ids)
+
+    failures.update(read_error_file(client, batch, spool_dir))
+    follow_up_ids += retry_failures(client, batch, done, failures, spool_dir)
+
+    # Every line is processed, so the spool is no longer needed
+    spool_path.unlink(missing_ok=True)
+    done_path.unlink(missing_ok=True)
+    try:
+        spool_dir.rmdir()
+    except OSError:
+        pass
+
+    return results_count, follow_up_ids
+
+
+def main():
+    # Load environment variables
+    load_dotenv()
+
+    # Initialize client
+    client = create_client()
+
+    _, batch_ids = latest_batch_ids()
+
+    results_count = 0
+    completed_batches = 0
+
+    for batch_id in batch_ids:
+        print(f"Retrieving batch results: {batch_id}\n")
+
+        # Get batch status
+        batch = client.batches.retrieve(batch_id)
+
+        if batch.status not in ('completed', 'expired'):
+            print(f"✗ Batch not completed yet. Status: {batch.status}\n")
+            continue
+
+        completed_batches += 1
+        if batch.status == 'expired':
+            print("⚠ Batch expired; saving the results it has and retrying the rest")
+        else:
+            print(f"✓ Batch completed successfully")
+        saved, follow_up_ids = process_batch(client, batch)
+        results_count += saved
+        if follow_up_ids:
+            print("Run poll_and_process.py to follow the reduce/retry batch")
+
+    metrics.write_prometheus('process_results')
+    if completed_batches == 0:
+        exit(1)
+
+    print(f"\n✓ Successfully processed {results_count} summaries")
 
-    print(f"✓ Saved: {output_path}")
-    results_count += 1
 
-print(f"\n✓ Successfully processed {results_count} summaries")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Delete old request shards, manifests, batch ID files and abandoned result spools.
+
+Every run leaves request shards (*_requests_*.jsonl.gz), manifests and
+batch_id_*.txt files in the working directory, and an interrupted result
+download leaves its partial spool in data/results_spool/<batch ID>/. This
+script removes them by age, by total size, or both:
+
+  python prune_artifacts.py --max-age-days 30           # older than 30 days
+  python prune_artifacts.py --max-mb 500                # oldest first until under 500 MB
+  python prune_artifacts.py --max-age-days 7 --dry-run  # list what would go
+
+Without flags the limits come from RETENTION_MAX_AGE_DAYS and
+RETENTION_MAX_MB. When either is set, run_batch_pipeline.py prunes
+automatically at the end of each run and watch_pipeline.py after each scan.
+
+The newest batch manifest and the shards it lists, and the batch ID files
+written since (the latest batches and their retry and reduce follow-ups),
+are always kept so submit_batch.py and poll_and_process.py can still
+resume. Requests watch_pipeline.py has not submitted yet, and the spools
+of batches it is following, are kept too. The spool of any other batch
+whose processing was interrupted, and its batch ID file, only go once
+older than the age limit. Summaries are never touched.
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+from process_results import SPOOL_DIR, batch_spool_dir
+from submit_batch import latest_manifest
+
+ARTIFACT_PATTERNS = ('*_requests_*.jsonl*', '*_manifest_*.json', 'batch_id_*.txt')
+
+
+def retention_limits():
+    """Return (max_age_days, max_mb) from RETENTION_* variables; None where unset."""
+    max_age_days = os.getenv('RETENTION_MAX_AGE_DAYS')
+    max_mb = os.getenv('RETENTION_MAX_MB')
+    return (float(max_age_days) if max_age_days else None,
+            float(max_mb) if max_mb else None)
+
+
+def read_batch_id_files():
+    """Return {batch ID file: [batch IDs]} for every batch_id_*.txt."""
+    files = {}
+    for path in glob.glob('batch_id_*.txt'):
+        with open(path, 'r') as f:
+            files[path] = [line.strip() for line in f if line.strip()]
+    return files
+
+
+def protected_paths(spool_dir=SPOOL_DIR):
+    """Return (artifacts that must be kept, artifacts kept until abandoned).
+
+    Batches still in flight are those the watch daemon follows and those
+    in batch ID files written since the newest batch manifest (the latest
+    run's batches and its retry and reduce follow-ups). Their spools and
+    batch ID files are always kept. A batch whose processing was
+    interrupted keeps its spool directory; that spool and the batch ID
+    files naming the batch are kept too, unless older than the age limit.
+    """
+    protected = set()
+    manifest_file = latest_manifest()
+    if manifest_file:
+        protected.add(manifest_file)
+        with open(manifest_file, 'r') as f:
+            protected.update(shard['path'] for shard in json.load(f)['shards'])
+
+    batch_id_files = read_batch_id_files()
+    in_flight = set()
+    if batch_id_files:
+        newest = max(batch_id_files, key=os.path.getmtime)
+        since = os.path.getmtime(manifest_file) if manifest_file else os.path.getmtime(newest)
+        for path, batch_ids in batch_id_files.items():
+            if path == newest or os.path.getmtime(path) >= since:
+                protected.add(path)
+                in_flight.update(batch_ids)
+
+    # Requests the watch daemon holds back or is still submitting, and its batches
+    watch_state = Path(os.getenv('WATCH_STATE', 'data/watch_state.json'))
+    if watch_state.exists():
+        with open(watch_state, 'r') as f:
+            state = json.load(f)
+        for entry in state.get('pending', []):
+            protected.add(entry['manifest'])
+            protected.update(entry['shards'])
+        protected.update(entry['shard'] for entry in state.get('submitting', []))
+        in_flight.update(state.get('in_flight', {}))
+
+    pending = set()
+    spool_dir = Path(spool_dir)
+    interrupted = {entry.name for entry in os.scandir(spool_dir) if entry.is_dir()} if spool_dir.is_dir() else set()
+    for batch_id in interrupted:
+        files = {entry.path for entry in os.scandir(batch_spool_dir(batch_id, spool_dir)) if entry.is_file()}
+        (protected if batch_id in in_flight else pending).update(files)
+    pending.update(path for path, batch_ids in batch_id_files.items() if interrupted.intersection(batch_ids))
+    protected = {os.path.normpath(path) for path in protected}
+    return protected, {os.path.normpath(path) for path in pending} - protected
+
+
+def find_artifacts(spool_dir=SPOOL_DIR):
+    """Return [(path, size, mtime, pending)] for every prunable artifact, oldest first.
+
+    pending is True for the spools of interrupted batches and their batch
+    ID files, which may only be removed once abandoned.
+    """
+    paths = set()
+    for pattern in ARTIFACT_PATTERNS:
+        paths.update(glob.glob(pattern))
+    if Path(spool_dir).is_dir():
+        for entry in os.scandir(spool_dir):
+            if entry.is_dir():
+                paths.update(child.path for child in os.scandir(entry.path) if child.is_file())
+            elif entry.is_file():
+                paths.add(entry.path)
+
+    protected, pending = protected_paths(spool_dir)
+    artifacts = []
+    for path in paths:
+        path = os.path.normpath(path)
+        if path in protected:
+            continue
+        stat = os.stat(path)
+        artifacts.append((path, stat.st_size, stat.st_mtime, path in pending))
+    return sorted(artifacts, key=lambda artifact: artifact[2])
+
+
+def prune_artifacts(max_age_days=None, max_mb=None, dry_run=False, spool_dir=SPOOL_DIR):
+    """Delete artifacts older than max_age_days, then the oldest until under max_mb.
+
+    The spools of interrupted batches count towards max_mb but are only
+    deleted once older than max_age_days, as abandoned.
+
+    Returns (list of paths removed, bytes freed).
+    """
+    artifacts = find_artifacts(spool_dir)
+    doomed = []
+    if max_age_days is not None:
+        cutoff = time.time() - max_age_days * 86400
+        doomed = [artifact for artifact in artifacts if artifact[2] < cutoff]
+        artifacts = [artifact for artifact in artifacts if artifact[2] >= cutoff]
+    if max_mb is not None:
+        total = sum(artifact[1] for artifact in artifacts)
+        for artifact in [artifact for artifact in artifacts if not artifact[3]]:
+            if total <= max_mb * 1024 * 1024:
+                break
+            doomed.append(artifact)
+            total -= artifact[1]
+
+    if not dry_run:
+        for path, _, _, _ in doomed:
+            Path(path).unlink(missing_ok=True)
+        # Batch spool directories left empty
+        for directory in {Path(path).parent for path, _, _, _ in doomed} - {Path(spool_dir)}:
+            if directory.parent == Path(spool_dir):
+                try:
+                    directory.rmdir()
+                except OSError:
+                    pass
+    return [path for path, _, _, _ in doomed], sum(artifact[1] for artifact in doomed)
+
+
+def prune_from_env():
+    """Prune with the RETENTION_* limits, if either is set, and report what was removed."""
+    max_age_days, max_mb = retention_limits()
+    if max_age_days is None and max_mb is None:
+        return
+    removed, freed = prune_artifacts(max_age_days, max_mb)
+    if removed:
+        print(f"✓ Retention: removed {len(removed)} old artifact(s), {freed / 1024 / 1024:.1f} MB")
+
+
+def main():
+    # Load environment variables
+    load_dotenv()
+
+    max_age_days, max_mb = retention_limits()
+    parser = argparse.ArgumentParser(description='Delete old request shards, manifests, batch ID files and spools')
+    parser.add_argument('--max-age-days', type=float, default=max_age_days, metavar='DAYS',
+                        help='Delete artifacts older than this (default: RETENTION_MAX_AGE_DAYS)')
+    parser.add_argument('--max-mb', type=float, default=max_mb, metavar='MB',
+                        help='Then delete the oldest until the rest fit in this many MB '
+                             '(default: RETENTION_MAX_MB)')
+    parser.add_argument('--dry-run', action='store_true', help='List what would be deleted without deleting it')
+    args = parser.parse_args()
+
+    if args.max_age_days is None and args.max_mb is None:
+        print("Error: no retention limit set. Use --max-age-days and/or --max-mb, "
+              "or set RETENTION_MAX_AGE_DAYS / RETENTION_MAX_MB")
+        exit(1)
+
+    removed, freed = prune_artifacts(args.max_age_days, args.max_mb, args.dry_run)
+    for path in removed:
+        print(f"{'Would delete' if args.dry_run else 'Deleted'}: {path}")
+    verb = 'Would free' if args.dry_run else 'Freed'
+    print(f"\n✓ {verb} {freed / 1024 / 1024:.1f} MB from {len(removed)} artifact(s)")
+
+
+if __name__ == '__main__':
+    main()
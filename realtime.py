@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Send batch requests straight to the chat completions endpoint.
+
+For a handful of documents the batch round trip (upload, create, queue,
+poll) takes minutes even when inference takes seconds. This stage sends
+the same request bodies create_batch.py wrote to the shards as concurrent
+chat completions instead and saves the summaries exactly as
+process_results.py does:
+
+  python realtime.py                          # most recent batch manifest
+  python realtime.py --manifest batch_manifest_20250101_120000.json
+
+Concurrency is bounded by REALTIME_CONCURRENCY, requests and estimated
+tokens per minute by a token bucket, and rate-limit, timeout and 5xx
+errors are retried with exponential backoff and full jitter.
+run_batch_pipeline.py uses this mode automatically when a job is below
+REALTIME_MAX_REQUESTS and REALTIME_MAX_TOKENS.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from dotenv import load_dotenv
+import metrics
+from api_client import create_async_client, is_retryable, retry_delay
+from chunking import record_chunk_results, record_reduce_batches
+from compression import open_text
+from process_results import SUMMARIES_DIR, save_summary, share_with_duplicates
+from request_ids import parse_custom_id
+from submit_batch import latest_manifest
+from summary_manifest import SummaryManifest, record_summaries
+from summary_store import SummaryStore, document_for
+from token_estimator import estimate_request_tokens
+
+# Default thresholds below which run_batch_pipeline.py skips the batch API
+DEFAULT_MAX_REQUESTS = 20
+DEFAULT_MAX_TOKENS = 200000
+
+
+def realtime_settings():
+    """Return the REALTIME_* tuning values from the environment."""
+    return {
+        'concurrency': int(os.getenv('REALTIME_CONCURRENCY', '8')),
+        'requests_per_minute': float(os.getenv('REALTIME_REQUESTS_PER_MINUTE', '300')),
+        'tokens_per_minute': float(os.getenv('REALTIME_TOKENS_PER_MINUTE', '0')),
+        'max_retries': int(os.getenv('REALTIME_MAX_RETRIES', '5')),
+        'backoff_base': float(os.getenv('REALTIME_BACKOFF_BASE', '1')),
+        'backoff_max': float(os.getenv('REALTIME_BACKOFF_MAX', '60')),
+    }
+
+
+def choose_mode(manifest_file):
+    """Pick 'realtime' or 'batch' for a manifest from its size; returns (mode, reason)."""
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    requests = manifest['total_requests']
+    tokens = sum(shard['estimated_tokens'] for shard in manifest['shards'])
+    max_requests = int(os.getenv('REALTIME_MAX_REQUESTS', str(DEFAULT_MAX_REQUESTS)))
+    max_tokens = int(os.getenv('REALTIME_MAX_TOKENS', str(DEFAULT_MAX_TOKENS)))
+    size = f"{requests} request(s), ~{tokens:,} input tokens"
+    if requests <= max_requests and tokens <= max_tokens:
+        return 'realtime', f"{size} is within REALTIME_MAX_REQUESTS={max_requests}, REALTIME_MAX_TOKENS={max_tokens:,}"
+    return 'batch', f"{size} exceeds REALTIME_MAX_REQUESTS={max_requests} or REALTIME_MAX_TOKENS={max_tokens:,}"
+
+
+def read_requests(manifest_file):
+    """Return every request in the shards of a batch manifest."""
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    requests = []
+    for shard in manifest['shards']:
+        with open_text(shard['path']) as f:
+            requests.extend(json.loads(line) for line in f if line.strip())
+    return requests
+
+
+class TokenBucket:
+    """Asyncio token bucket holding up to capacity tokens, refilled at rate per second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def per_minute(cls, amount):
+        """A bucket allowing amount per minute with a burst of a few seconds' worth; None if amount is 0."""
+        if amount <= 0:
+            return None
+        return cls(amount / 60, max(1, amount / 60 * 5))
+
+    async def acquire(self, amount=1):
+        """Wait until amount tokens are available and take them.
+
+        Waiters are served in order; an amount larger than the bucket waits
+        for a full bucket rather than forever.
+        """
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+async def send_request(client, request, semaphore, request_bucket, token_bucket, settings):
+    """Send one request, retrying transient errors; returns (response, error)."""
+    custom_id = request['custom_id']
+    tokens = estimate_request_tokens(request)
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+        if request_bucket:
+            await request_bucket.acquire()
+        if token_bucket:
+            await token_bucket.acquire(tokens)
+        try:
+            async with semaphore:
+                response = await client.chat.completions.create(**request['body'])
+        except Exception as e:
+            if not is_retryable(e) or attempt >= settings['max_retries']:
+                metrics.emit('realtime_request', custom_id=custom_id, attempts=attempt + 1,
+                             seconds=round(time.perf_counter() - start, 4), error=str(e))
+                return None, str(e) or type(e).__name__
+            delay = retry_delay(e, attempt, settings['backoff_base'], settings['backoff_max'])
+            attempt += 1
+            print(f"⚠ {custom_id}: {type(e).__name__}, retry {attempt}/{settings['max_retries']} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        seconds = time.perf_counter() - start
+        metrics.observe('batch_realtime_request_seconds', seconds)
+        usage = response.usage
+        metrics.emit('realtime_request', custom_id=custom_id, attempts=attempt + 1, seconds=round(seconds, 4),
+                     prompt_tokens=usage.prompt_tokens if usage else None,
+                     completion_tokens=usage.completion_tokens if usage else None)
+        if not (response.choices and response.choices[0].message.content):
+            return None, 'response has no content'
+        return response, None
+
+
+async def run_requests(requests, summaries_dir=SUMMARIES_DIR):
+    """Send requests concurrently, following up with reduce requests for split documents.
+
+    Returns (number of summaries saved, {custom_id: error} for requests that failed).
+    """
+    settings = realtime_settings()
+    semaphore = asyncio.Semaphore(settings['concurrency'])
+    request_bucket = TokenBucket.per_minute(settings['requests_per_minute'])
+    token_bucket = TokenBucket.per_minute(settings['tokens_per_minute'])
+    summaries_dir.mkdir(parents=True, exist_ok=True)
+
+    saved_count = 0
+    failures = {}
+    documents = SummaryManifest.load().pending_documents()
+    # Stands in for a batch ID in the manifest and the summary store alike
+    batch_id = f'realtime-{metrics.RUN_ID}'
+    with SummaryStore() as store:
+        async with create_async_client() as client:
+            while requests:
+                saved = []
+
+                async def complete(request):
+                    response, error = await send_request(client, request, semaphore, request_bucket,
+                                                         token_bucket, settings)
+                    if error:
+                        failures[request['custom_id']] = error
+                        print(f"✗ {request['custom_id']}: {error}")
+                        return
+                    summary = response.choices[0].message.content
+                    output_path = save_summary(request['custom_id'], summary, summaries_dir)
+                    usage = response.usage.model_dump() if response.usage else None
+                    store.add(request['custom_id'], summary, batch_id,
+                              document_for(documents, request['custom_id']), response.model, usage, output_path)
+                    saved.append((request['custom_id'], str(output_path)))
+                    print(f"✓ Saved: {output_path}")
+
+                await asyncio.gather(*(complete(request) for request in requests))
+                saved_count += len(saved)
+                metrics.inc('batch_results_total', len(saved))
+
+                saved_chunks = [(cid, path) for cid, path in saved if parse_custom_id(cid)['kind'] == 'chunk']
+                saved_summaries = [(cid, path) for cid, path in saved if parse_custom_id(cid)['kind'] != 'chunk']
+                saved_summaries += share_with_duplicates(saved_summaries, batch_id, summaries_dir)
+                record_summaries(batch_id, saved_summaries)
+                requests = record_chunk_results(saved_chunks, [cid for cid, _ in saved_summaries])
+                record_reduce_batches([request['custom_id'] for request in requests], [batch_id])
+                if requests:
+                    print(f"\nAll chunks received for {len(requests)} document(s); sending reduce requests...")
+
+    return saved_count, failures
+
+
+def run_realtime(manifest_file):
+    """Send every request in a batch manifest as a chat completion.
+
+    Returns (number of summaries saved, {custom_id: error} for requests that failed).
+    """
+    requests = read_requests(manifest_file)
+    settings = realtime_settings()
+    print(f"Sending {len(requests)} request(s) from {manifest_file} "
+          f"({settings['concurrency']} at a time, {settings['requests_per_minute']:g} per minute)")
+    with metrics.timed_stage('realtime', requests=len(requests)) as stage:
+        saved, failures = asyncio.run(run_requests(requests))
+        stage.update(saved=saved, failed=len(failures))
+
+    if failures:
+        print(f"\n⚠ {len(failures)} request(s) failed; rerun to resubmit their documents:")
+        for custom_id, error in failures.items():
+            print(f"  - {custom_id}: {error}")
+    return saved, failures
+
+
+def main():
+    # Load environment variables
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Send batch requests as concurrent chat completions')
+    parser.add_argument(
+        '--manifest',
+        metavar='FILE',
+        help='Batch manifest to send (default: most recent batch_manifest_*.json)'
+    )
+    args = parser.parse_args()
+
+    manifest_file = args.manifest or latest_manifest()
+    if not manifest_file:
+        print("Error: No batch_manifest_*.json files found. Run create_batch.py first.")
+        exit(1)
+
+    saved, failures = run_realtime(manifest_file)
+    metrics.write_prometheus('realtime')
+    print(f"\n✓ Saved {saved} summaries to {SUMMARIES_DIR}/")
+    if failures:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
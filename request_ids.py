@@ -0,0 +1,107 @@
+"""Build and parse the custom_id attached to each batch request.
+
+Formats (the API caps custom_id at 64 characters):
+  summary-{stem}                 one request per document, or the reduce step
+  chunk{NNN}of{NNN}-{stem}       one section of a document that was split
+
+In a run with several model or prompt variants (see variants.py) both are
+prefixed with the variant name, e.g. 235b~summary-{stem}.
+
+Summary stems keep up to MAX_STEM_LENGTH characters (less the variant
+prefix), and chunk stems up to CHUNK_STEM_LENGTH. A longer stem keeps its
+beginning and ends in a hash of the full stem, so two documents whose
+names share a long prefix still get distinct IDs. The final summary of a
+split document is named after its chunk stem (see chunk_stem), so a chunk
+result always leads back to its summary's custom_id.
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+
+MAX_CUSTOM_ID_LENGTH = 64
+MAX_VARIANT_LENGTH = 16
+VARIANT_PATTERN = rf'[A-Za-z0-9_.-]{{1,{MAX_VARIANT_LENGTH}}}'
+STEM_HASH_LENGTH = 8
+# Stems were always cut to 55 characters, so existing summary IDs and file names keep them
+MAX_STEM_LENGTH = 55
+CHUNK_STEM_LENGTH = MAX_CUSTOM_ID_LENGTH - len('chunk000of000-')
+
+_CHUNK_ID = re.compile(r'chunk(\d{3})of(\d{3})-(.+)')
+_VARIANT_ID = re.compile(rf'({VARIANT_PATTERN})~((?:summary-|chunk\d{{3}}of\d{{3}}-).+)')
+
+
+def safe_stem(file_path, root=None):
+    """Return a file's stem with characters unsafe for custom_ids replaced.
+
+    With root, a file in a subfolder of it is named by its path below root
+    (reports/2024/q1.pdf -> reports_2024_q1), so files with the same name
+    in different folders get different stems.
+    """
+    path = Path(file_path)
+    stem = path.stem
+    if root is not None:
+        try:
+            folders = path.parent.relative_to(root).parts
+        except ValueError:
+            folders = ()
+        stem = '_'.join(folders + (stem,))
+    # Remove special chars from filename for custom_id (see fit_stem for its length);
+    # '~' separates a variant name from the rest of the ID
+    return stem.replace('%', '_').replace(' ', '_').replace('&', 'and').replace('~', '_')
+
+
+def path_hash(file_path):
+    """Short hash of a file's absolute path, to tell apart files that share a stem."""
+    return hashlib.sha256(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:STEM_HASH_LENGTH]
+
+
+def fit_stem(stem, variant=None, length=MAX_STEM_LENGTH):
+    """Shorten a stem to length characters, less the room taken by the variant prefix.
+
+    A stem that is too long keeps its beginning and ends in a hash of the
+    whole stem. Stems that already fit, including shortened ones, are
+    returned unchanged.
+    """
+    room = length - (len(variant) + 1 if variant else 0)
+    if len(stem) <= room:
+        return stem
+    digest = hashlib.sha256(stem.encode('utf-8')).hexdigest()[:STEM_HASH_LENGTH]
+    return f"{stem[:room - STEM_HASH_LENGTH - 1]}-{digest}"
+
+
+def chunk_stem(stem, variant=None):
+    """The stem of a split document's chunk IDs, and so of its final summary's ID."""
+    return fit_stem(stem, variant, CHUNK_STEM_LENGTH)
+
+
+def _with_variant(custom_id, variant):
+    """Prefix a custom_id with its variant name, if any."""
+    if not variant:
+        return custom_id
+    return f"{variant}~{custom_id}"
+
+
+def summary_custom_id(stem, variant=None):
+    """custom_id of the request whose result is a document's final summary."""
+    return _with_variant(f"summary-{fit_stem(stem, variant)}", variant)
+
+
+def chunk_custom_id(stem, index, count, variant=None):
+    """custom_id of the request summarising chunk index (1-based) of count."""
+    return _with_variant(f"chunk{index:03d}of{count:03d}-{chunk_stem(stem, variant)}", variant)
+
+
+def parse_custom_id(custom_id):
+    """Split a custom_id into kind ('summary' or 'chunk'), stem, chunk position and variant."""
+    variant = None
+    match = _VARIANT_ID.fullmatch(custom_id)
+    if match:
+        variant, custom_id = match.groups()
+    match = _CHUNK_ID.fullmatch(custom_id)
+    if match:
+        return {'kind': 'chunk', 'stem': match.group(3), 'variant': variant,
+                'index': int(match.group(1)), 'count': int(match.group(2))}
+    return {'kind': 'summary', 'stem': custom_id.replace('summary-', '', 1), 'variant': variant,
+            'index': None, 'count': None}
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 """
 Orchestrator script for the batch summarization pipeline.
-Runs all three stages: extraction, submission, and polling.
+Runs all three stages in one process: extraction, submission, and polling.
+The batch manifest and batch IDs are passed between stages directly and a
+single API client is shared by all of them. Small jobs skip the batch API
+and are sent as concurrent chat completions instead (see realtime.py).
 
 Usage:
   # Process all files in default directory (data/papers/)
@@ -12,12 +15,15 @@ Usage:
 
   # Process all files in a custom directory
   python run_batch_pipeline.py --input-dir /path/to/documents/
+
+  # Force realtime chat completions or the batch API regardless of job size
+  python run_batch_pipeline.py --realtime
+  python run_batch_pipeline.py --batch
 """
 
+import json
 import os
 import sys
-import argparse
-import subprocess
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -52,35 +58,34 @@ def validate_environment():
     print(f"  Polling interval: {os.getenv('POLLING_INTERVAL', '30')} seconds")
 
 
-def run_stage(stage_num, description, script_name, extra_args=None):
-    """Run a pipeline stage."""
-    print_header(f"STAGE {stage_num}: {description}")
-
-    cmd = [sys.executable, script_name]
-    if extra_args:
-        cmd.extend(extra_args)
+def main():
+    """Run the complete batch processing pipeline."""
+    print_header("Doubleword Batch Summarization Pipeline")
 
-    try:
-        result = subprocess.run(
-            cmd,
-            check=True,
-            capture_output=False
-        )
-        print(f"\n✓ Stage {stage_num} completed successfully")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"\n✗ Error in stage {stage_num}")
-        print(f"Script '{script_name}' failed with exit code {e.returncode}")
-        return False
+    # Check for .env file
+    env_file = Path('.env')
+    if not env_file.exists():
+        print("\nError: .env file not found!")
+        print("Please copy .env.sample to .env and fill in your credentials")
+        sys.exit(1)
 
+    # Load environment variables before parsing, so env-based defaults apply
+    print("\nLoading environment variables from .env...")
+    load_dotenv()
 
-def main():
-    """Run the complete batch processing pipeline."""
-    # Parse command line arguments
-    parser = argparse.ArgumentParser(
-        description='Run the complete batch summarization pipeline',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog='''
+    # Stages are imported once here and run in this process
+    import metrics
+    from api_client import create_client
+    from create_batch import build_parser, create_batch
+    from poll_and_process import poll_and_process, wait_until_queryable
+    from prune_artifacts import prune_from_env
+    from realtime import choose_mode, run_realtime
+    from submit_batch import save_batch_ids, submit_manifest
+
+    # Accept every create_batch.py option, plus the submission ones
+    parser = build_parser()
+    parser.description = 'Run the complete batch summarization pipeline'
+    parser.epilog = '''
 Examples:
   # Process all files in default directory (data/papers/)
   python run_batch_pipeline.py
@@ -90,74 +95,95 @@ Examples:
 
   # Process all files in a custom directory
   python run_batch_pipeline.py --input-dir /path/to/documents/
+
+  # Send requests as concurrent chat completions instead of a batch
+  python run_batch_pipeline.py --realtime
 '''
-    )
     parser.add_argument(
-        '--files',
-        nargs='+',
-        metavar='FILE',
-        help='Specific file paths to process'
+        '--skip-preflight',
+        action='store_true',
+        help='Upload without first estimating tokens and cost'
     )
-    parser.add_argument(
-        '--input-dir',
-        metavar='DIR',
-        help='Directory to scan for documents (default: data/papers/)'
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument(
+        '--realtime',
+        action='store_true',
+        help='Send requests as concurrent chat completions instead of a batch'
+    )
+    mode_group.add_argument(
+        '--batch',
+        action='store_true',
+        help='Always use the batch API, even for jobs below the realtime thresholds'
     )
-
     args = parser.parse_args()
 
-    print_header("Doubleword Batch Summarization Pipeline")
-
-    # Check for .env file
-    env_file = Path('.env')
-    if not env_file.exists():
-        print("\nError: .env file not found!")
-        print("Please copy .env.sample to .env and fill in your credentials")
-        sys.exit(1)
-
-    # Load environment variables
-    print("\nLoading environment variables from .env...")
-    load_dotenv()
-
     # Validate environment
     validate_environment()
 
-    # Prepare arguments for create_batch.py
-    create_batch_args = []
-    if args.files:
-        create_batch_args.extend(['--files'] + args.files)
-    elif args.input_dir:
-        create_batch_args.extend(['--input-dir', args.input_dir])
+    # One HTTP client for submission, polling and downloads
+    client = create_client()
 
     # Stage 1: Extract documents and create batch requests
-    if not run_stage(
-        1,
-        "Extracting documents and creating batch requests",
-        "create_batch.py",
-        extra_args=create_batch_args if create_batch_args else None
-    ):
-        sys.exit(1)
+    print_header("STAGE 1: Extracting documents and creating batch requests")
+    with metrics.timed_stage('pipeline_extract'):
+        manifest_file = create_batch(args)
+    print("\n✓ Stage 1 completed successfully")
+
+    with open(manifest_file, 'r') as f:
+        total_requests = json.load(f)['total_requests']
+    if args.realtime:
+        mode, reason = 'realtime', 'requested with --realtime'
+    elif args.batch:
+        mode, reason = 'batch', 'requested with --batch'
+    else:
+        mode, reason = choose_mode(manifest_file)
+
+    if mode == 'realtime' and total_requests:
+        # Stage 2: Send requests directly, skipping the batch queue
+        print_header("STAGE 2: Sending requests as realtime chat completions")
+        print(f"Realtime mode: {reason}\n")
+        with metrics.timed_stage('pipeline_realtime', requests=total_requests):
+            saved, _ = run_realtime(manifest_file)
+        metrics.write_prometheus('run_batch_pipeline')
+        if not saved:
+            print("\n✗ Error in stage 2: no requests succeeded")
+            sys.exit(1)
+        print("\n✓ Stage 2 completed successfully")
+        prune_from_env()
+        print_header("✓ Pipeline completed successfully!")
+        print("\nSummaries saved to: data/summaries/")
+        return
 
     # Stage 2: Submit batch to Doubleword API
-    if not run_stage(
-        2,
-        "Submitting batch to Doubleword API",
-        "submit_batch.py"
-    ):
-        sys.exit(1)
-
-    # Allow time for batch ID propagation before polling
-    print("\nWaiting for batch ID to propagate...")
-    import time
-    time.sleep(10)  # Wait 10 seconds for the batch to be queryable
+    print_header("STAGE 2: Submitting batch to Doubleword API")
+    if total_requests:
+        print(f"Batch mode: {reason}\n")
+    with metrics.timed_stage('pipeline_submit'):
+        batch_ids = submit_manifest(client, manifest_file, args.skip_preflight)
+    if not batch_ids:
+        metrics.write_prometheus('run_batch_pipeline')
+        print_header("✓ Nothing to submit")
+        print("\nNo requests were written: every document is up to date or had no extractable text")
+        return
+    batch_id_file = save_batch_ids(batch_ids)
+    print(f"\n{len(batch_ids)} batch ID(s) saved to {batch_id_file}")
+    print("\n✓ Stage 2 completed successfully")
 
     # Stage 3: Poll and process results
-    if not run_stage(
-        3,
-        "Polling for results and processing summaries",
-        "poll_and_process.py"
-    ):
+    print_header("STAGE 3: Polling for results and processing summaries")
+    if not wait_until_queryable(client, batch_ids,
+                                timeout=float(os.getenv('BATCH_READY_TIMEOUT', '60'))):
+        sys.exit(1)
+    with metrics.timed_stage('pipeline_poll', batches=len(batch_ids)):
+        statuses = poll_and_process(client, batch_ids)
+    metrics.write_prometheus('run_batch_pipeline')
+    if statuses is None:
+        sys.exit(1)
+    if 'completed' not in statuses.values():
+        print("\n✗ Error in stage 3: no batches completed")
         sys.exit(1)
+    print("\n✓ Stage 3 completed successfully")
+    prune_from_env()
 
     # Success!
     print_header("✓ Pipeline completed successfully!")
@@ -1,66 +1,158 @@
 #!/usr/bin/env python3
-"""Upload batch requests and submit batch job to Doubleword API."""
+"""Upload batch request shards and submit one batch job per shard to Doubleword API."""
 
 import os
 import glob
+import json
+import argparse
 from datetime import datetime
-from openai import OpenAI
 from dotenv import load_dotenv
+import metrics
+from api_client import create_client
+from compression import UploadStream
+from token_estimator import get_token_counter, preflight
 
-# Load environment variables
-load_dotenv()
-
-# Initialize client with Doubleword credentials
-client = OpenAI(
-    api_key=os.environ['DOUBLEWORD_AUTH_TOKEN'],
-    base_url=os.environ['DOUBLEWORD_BASE_URL']
-)
-
-# Print environment variables being used
-print("Environment Variables:")
-print(f"  DOUBLEWORD_BASE_URL: {os.environ['DOUBLEWORD_BASE_URL']}")
-print(f"  DOUBLEWORD_AUTH_TOKEN: {'*' * 20}...{os.environ['DOUBLEWORD_AUTH_TOKEN'][-4:]}")
-print(f"  COMPLETION_WINDOW: {os.getenv('COMPLETION_WINDOW', '1h')}")
-print(f"  CHAT_COMPLETIONS_ENDPOINT: {os.getenv('CHAT_COMPLETIONS_ENDPOINT', '/v1/chat/completions')}")
-print()
-
-# Find most recent batch_requests file
-batch_files = glob.glob('batch_requests_*.jsonl')
-if not batch_files:
-    print("Error: No batch_requests_*.jsonl files found. Run create_batch.py first.")
-    exit(1)
-
-latest_batch_file = max(batch_files, key=os.path.getmtime)
-print(f"Uploading {latest_batch_file}...")
-
-# Upload batch file
-with open(latest_batch_file, "rb") as file:
-    batch_file = client.files.create(
-        file=file,
-        purpose="batch"
+
+def submit_shards(client, shard_files, metadata=None):
+    """Upload each shard and create a batch job for it; returns the batch IDs.
+
+    metadata (string values only) is attached to every batch created.
+    """
+    completion_window = os.getenv('COMPLETION_WINDOW', '1h')
+    batch_ids = []
+
+    for shard_num, shard_file in enumerate(shard_files, 1):
+        print(f"\n[{shard_num}/{len(shard_files)}] Uploading {shard_file}...")
+
+        # Upload batch file, decompressed on the fly as it is sent
+        with UploadStream(shard_file) as stream:
+            with metrics.timed_stage('upload', shard=shard_file, bytes=stream.size,
+                                     stored_bytes=os.path.getsize(shard_file)) as upload:
+                batch_file = client.files.create(
+                    file=(stream.name, stream),
+                    purpose="batch"
+                )
+                upload['file_id'] = batch_file.id
+        metrics.inc('batch_upload_bytes_total', stream.size)
+
+        print(f"File uploaded successfully!")
+        print(f"File ID: {batch_file.id}")
+
+        # Create batch job
+        print(f"Creating batch job (completion window: {completion_window})...")
+        with metrics.timed_stage('batch_create', file_id=batch_file.id) as create:
+            batch = client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint=os.getenv('CHAT_COMPLETIONS_ENDPOINT', '/v1/chat/completions'),
+                completion_window=completion_window,
+                metadata=metadata
+            )
+            create['batch_id'] = batch.id
+
+        print(f"Batch job created successfully!")
+        print(f"Batch ID: {batch.id}")
+        print(f"Status: {batch.status}")
+        batch_ids.append(batch.id)
+
+    return batch_ids
+
+
+def save_batch_ids(batch_ids):
+    """Save batch IDs (one per line) to a timestamped file; returns its name."""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    batch_id_file = f'batch_id_{timestamp}.txt'
+    # Follow-up batches can be submitted within the same second as another
+    suffix = 1
+    while os.path.exists(batch_id_file):
+        suffix += 1
+        batch_id_file = f'batch_id_{timestamp}_{suffix}.txt'
+    with open(batch_id_file, 'w') as f:
+        f.write('\n'.join(batch_ids) + '\n')
+    return batch_id_file
+
+
+def latest_manifest():
+    """Return the most recent batch_manifest_*.json, or None if there is none."""
+    manifest_files = glob.glob('batch_manifest_*.json')
+    if not manifest_files:
+        return None
+    return max(manifest_files, key=os.path.getmtime)
+
+
+def submit_manifest(client, manifest_file, skip_preflight=False):
+    """Submit every shard listed in a batch manifest; returns the batch IDs.
+
+    Returns an empty list if the manifest lists no shards.
+    """
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+
+    shard_files = [shard['path'] for shard in manifest['shards']]
+    if not shard_files:
+        return []
+
+    if not skip_preflight:
+        # Offline estimate of what is about to be uploaded
+        preflight(shard_files, get_token_counter(), os.getenv('SUMMARY_WORD_COUNT', '2000'),
+                  per_request=False)
+        print()
+
+    print(f"Submitting {len(shard_files)} shard(s) from {manifest_file}")
+    return submit_shards(client, shard_files)
+
+
+def build_parser():
+    """Return the command line parser for this stage."""
+
+    parser = argparse.ArgumentParser(description='Upload batch request shards and create batch jobs')
+    parser.add_argument(
+        '--manifest',
+        metavar='FILE',
+        help='Batch manifest to submit (default: most recent batch_manifest_*.json)'
+    )
+    parser.add_argument(
+        '--skip-preflight',
+        action='store_true',
+        help='Upload without first estimating tokens and cost'
     )
+    return parser
+
+
+def main():
+    # Load environment variables
+    load_dotenv()
+
+    args = build_parser().parse_args()
+
+    # Initialize client with Doubleword credentials
+    client = create_client()
+
+    # Print environment variables being used
+    print("Environment Variables:")
+    print(f"  DOUBLEWORD_BASE_URL: {os.environ['DOUBLEWORD_BASE_URL']}")
+    print(f"  DOUBLEWORD_AUTH_TOKEN: {'*' * 20}...{os.environ['DOUBLEWORD_AUTH_TOKEN'][-4:]}")
+    print(f"  COMPLETION_WINDOW: {os.getenv('COMPLETION_WINDOW', '1h')}")
+    print(f"  CHAT_COMPLETIONS_ENDPOINT: {os.getenv('CHAT_COMPLETIONS_ENDPOINT', '/v1/chat/completions')}")
+    print()
+
+    # Find the shards to submit: from the given or most recent manifest
+    manifest_file = args.manifest or latest_manifest()
+    if not manifest_file:
+        print("Error: No batch_manifest_*.json files found. Run create_batch.py first.")
+        exit(1)
+
+    batch_ids = submit_manifest(client, manifest_file, args.skip_preflight)
+    if not batch_ids:
+        print(f"Error: {manifest_file} lists no request shards. Nothing to submit.")
+        exit(1)
+
+    # Save batch IDs for later retrieval with timestamp
+    batch_id_file = save_batch_ids(batch_ids)
+
+    print(f"\n{len(batch_ids)} batch ID(s) saved to {batch_id_file}")
+    metrics.write_prometheus('submit_batch')
+    print("Next step: Run poll_and_process.py to monitor progress")
+
 
-print(f"File uploaded successfully!")
-print(f"File ID: {batch_file.id}")
-
-# Create batch job
-completion_window = os.getenv('COMPLETION_WINDOW', '1h')
-print(f"\nCreating batch job (completion window: {completion_window})...")
-batch = client.batches.create(
-    input_file_id=batch_file.id,
-    endpoint=os.getenv('CHAT_COMPLETIONS_ENDPOINT', '/v1/chat/completions'),
-    completion_window=completion_window
-)
-
-print(f"Batch job created successfully!")
-print(f"Batch ID: {batch.id}")
-print(f"Status: {batch.status}")
-
-# Save batch ID for later retrieval with timestamp
-timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-batch_id_file = f'batch_id_{timestamp}.txt'
-with open(batch_id_file, 'w') as f:
-    f.write(batch.id)
-
-print(f"\nBatch ID saved to {batch_id_file}")
-print("Next step: Run poll_and_process.py to monitor progress")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Persistent record of which documents already have a current summary.
+
+Each document is keyed by its content hash plus every setting that changes
+the summary: model, prompt hash, MAX_TOKENS, SUMMARY_WORD_COUNT, and any
+extraction budget or non-default text normalisation. Identical files at
+several paths are tracked under a key per path (see key_for), so each
+path gets its own summary, or a linked copy of one. An entry
+is marked pending by create_batch.py when its request is written and marked
+done by process_results.py with the batch ID and summary file produced, so
+later runs can skip documents whose summary is still valid. Entries also
+keep the document's content hash, which the summary store records.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_MANIFEST_PATH = 'data/summary_manifest.json'
+
+# Serialises load-modify-save cycles when several batches finish at once
+_lock = threading.Lock()
+
+
+def manifest_path():
+    """Return the manifest location from SUMMARY_MANIFEST or the default."""
+    return Path(os.getenv('SUMMARY_MANIFEST', DEFAULT_MANIFEST_PATH))
+
+
+def same_source(first, second):
+    """True if two recorded source paths name the same file."""
+    return os.path.realpath(first) == os.path.realpath(second)
+
+
+def prompt_hash(prompt):
+    """Return a short stable hash of a prompt's text."""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+
+def document_key(content_hash, model, prompt_hash, max_tokens, word_count, extraction=None, normalisation=None):
+    """Combine a document hash and summary settings into one manifest key.
+
+    extraction identifies an extraction budget, if only part of the
+    document was read, and normalisation the text clean-up steps when they
+    are not the defaults; keys without either are unchanged.
+    """
+    settings = f"{content_hash}|{model}|{prompt_hash}|{max_tokens}|{word_count}"
+    if extraction:
+        settings += f"|{extraction}"
+    if normalisation:
+        settings += f"|normalise={normalisation}"
+    return hashlib.sha256(settings.encode('utf-8')).hexdigest()
+
+
+class SummaryManifest:
+    """JSON-backed map of document keys to their summary status."""
+
+    def __init__(self, path, documents=None, pending=None):
+        self.path = Path(path)
+        self.documents = documents or {}
+        self.pending = pending or {}  # custom_id -> document key awaiting a result
+
+    @classmethod
+    def load(cls, path=None):
+        """Load the manifest, or return an empty one if it does not exist yet."""
+        path = Path(path) if path else manifest_path()
+        if not path.exists():
+            return cls(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(path, data.get('documents'), data.get('pending'))
+
+    def save(self):
+        """Write the manifest atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'documents': self.documents, 'pending': self.pending}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def key_for(self, key, source):
+        """Return the key to track source under: key itself, unless another path holds it.
+
+        The first path recorded for some content keeps the content key; the
+        same bytes at another path get a key of their own. An entry whose
+        file no longer exists is taken over, as when a document is moved.
+        """
+        entry = self.documents.get(key)
+        recorded = entry.get('source') if entry else None
+        if not recorded or same_source(recorded, source) or not os.path.exists(recorded):
+            return key
+        return hashlib.sha256(f"{key}|{os.path.realpath(source)}".encode('utf-8')).hexdigest()
+
+    def has_current_summary(self, key):
+        """True if the document has a finished summary that still exists on disk."""
+        entry = self.documents.get(key)
+        return bool(entry and entry.get('status') == 'done'
+                    and entry.get('summary_path') and Path(entry['summary_path']).exists())
+
+    def mark_pending(self, key, custom_id, source, **settings):
+        """Record that a request for this document has been written."""
+        entry = self.documents.setdefault(key, {})
+        entry.update(settings)
+        entry.update({
+            'source': str(source),
+            'custom_id': custom_id,
+            'status': 'pending',
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        })
+        self.pending[custom_id] = key
+
+    def pending_documents(self):
+        """Return {custom_id: document entry} for every request awaiting a result."""
+        return {custom_id: self.documents[key] for custom_id, key in self.pending.items()
+                if key in self.documents}
+
+    def mark_done(self, custom_id, batch_id, summary_path):
+        """Record the summary produced for a pending custom_id; returns its key or None."""
+        key = self.pending.pop(custom_id, None)
+        if key is None or key not in self.documents:
+            return None
+        self.documents[key].update({
+            'status': 'done',
+            'batch_id': batch_id,
+            'summary_path': str(summary_path),
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        })
+        return key
+
+
+def record_summaries(batch_id, saved, path=None):
+    """Mark every (custom_id, summary_path) in saved as done under batch_id."""
+    with _lock:
+        manifest = SummaryManifest.load(path)
+        for custom_id, summary_path in saved:
+            manifest.mark_done(custom_id, batch_id, summary_path)
+        manifest.save()
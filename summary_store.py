@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""Indexed SQLite store of every summary the pipeline produces.
+
+process_results.py and realtime.py write each result here as it is saved,
+keyed by document hash, custom_id, model, prompt hash and batch ID, with
+the token usage the API reported. Summaries are indexed for full-text
+search (SQLite FTS5), so the latest summary of a document or every
+summary mentioning a term is one query away instead of a directory scan:
+
+  python summary_store.py lookup data/papers/DGM.pdf   # latest summary of a file
+  python summary_store.py lookup DGM --history         # every version, newest first
+  python summary_store.py lookup DGM --variant 30b     # latest from one model/prompt variant
+  python summary_store.py search "reinforcement learning" --limit 5
+  python summary_store.py usage                        # token totals per model
+  python summary_store.py export --output-dir exports/ # latest summaries as markdown
+
+The markdown files in data/summaries/ are still written as before; export
+regenerates them from the store. The database lives at data/summaries.db
+(SUMMARY_STORE).
+"""
+
+import argparse
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from extraction_cache import file_sha256
+from request_ids import parse_custom_id, summary_custom_id
+
+DEFAULT_STORE_PATH = 'data/summaries.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    id INTEGER PRIMARY KEY,
+    doc_hash TEXT NOT NULL,
+    custom_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    batch_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    source TEXT,
+    summary TEXT NOT NULL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    markdown_path TEXT,
+    created_at TEXT NOT NULL,
+    UNIQUE (doc_hash, custom_id, model, prompt_hash, batch_id)
+);
+CREATE INDEX IF NOT EXISTS summaries_custom_id ON summaries (custom_id, created_at);
+CREATE INDEX IF NOT EXISTS summaries_doc_hash ON summaries (doc_hash, created_at);
+CREATE INDEX IF NOT EXISTS summaries_source ON summaries (source, created_at);
+"""
+
+# External-content FTS index kept in step with the table by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5(
+    summary, source, custom_id, content='summaries', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS summaries_ai AFTER INSERT ON summaries BEGIN
+    INSERT INTO summaries_fts (rowid, summary, source, custom_id)
+    VALUES (new.id, new.summary, new.source, new.custom_id);
+END;
+CREATE TRIGGER IF NOT EXISTS summaries_ad AFTER DELETE ON summaries BEGIN
+    INSERT INTO summaries_fts (summaries_fts, rowid, summary, source, custom_id)
+    VALUES ('delete', old.id, old.summary, old.source, old.custom_id);
+END;
+CREATE TRIGGER IF NOT EXISTS summaries_au AFTER UPDATE ON summaries BEGIN
+    INSERT INTO summaries_fts (summaries_fts, rowid, summary, source, custom_id)
+    VALUES ('delete', old.id, old.summary, old.source, old.custom_id);
+    INSERT INTO summaries_fts (rowid, summary, source, custom_id)
+    VALUES (new.id, new.summary, new.source, new.custom_id);
+END;
+"""
+
+USAGE_FIELDS = ('prompt_tokens', 'completion_tokens', 'total_tokens')
+
+
+def store_path():
+    """Return the store location from SUMMARY_STORE or the default."""
+    return Path(os.getenv('SUMMARY_STORE', DEFAULT_STORE_PATH))
+
+
+def document_for(documents, custom_id):
+    """Return the summary manifest entry a request's result belongs to, or {}.
+
+    documents maps final-summary custom_ids to entries (see
+    SummaryManifest.pending_documents); chunk results belong to the
+    document they are a section of.
+    """
+    parsed = parse_custom_id(custom_id)
+    return documents.get(summary_custom_id(parsed['stem'], parsed['variant'])) or {}
+
+
+class SummaryStore:
+    """SQLite table of summaries with an FTS5 index over their text.
+
+    One connection per thread: open a store in each worker that saves
+    results. WAL mode lets concurrent batches write while others read.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else store_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        try:
+            self.db.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE
+            self.fts = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def add(self, custom_id, summary, batch_id, document=None, model=None, usage=None, markdown_path=None):
+        """Insert one result, or update it if this batch already stored it; commits immediately.
+
+        document is the result's summary manifest entry (content hash,
+        prompt hash, source, model); model and usage come from the response.
+        """
+        document = document or {}
+        usage = usage or {}
+        row = {
+            'doc_hash': document.get('content_hash', ''),
+            'custom_id': custom_id,
+            'model': model or document.get('model', ''),
+            'prompt_hash': document.get('prompt_hash', ''),
+            'batch_id': batch_id,
+            'kind': parse_custom_id(custom_id)['kind'],
+            'source': document.get('source'),
+            'summary': summary,
+            'markdown_path': str(markdown_path) if markdown_path else None,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            **{field: usage.get(field) for field in USAGE_FIELDS},
+        }
+        columns = ', '.join(row)
+        updates = ', '.join(f'{column} = excluded.{column}' for column in row)
+        self.db.execute(
+            f"INSERT INTO summaries ({columns}) VALUES ({', '.join(':' + column for column in row)}) "
+            f"ON CONFLICT (doc_hash, custom_id, model, prompt_hash, batch_id) DO UPDATE SET {updates}",
+            row,
+        )
+        self.db.commit()
+
+    def lookup(self, identifier, history=False, variant=None):
+        """Return the latest summary (or every one, newest first) of a document.
+
+        identifier is a file path (matched by content hash or source path),
+        a custom_id, or the document stem used in its custom_id. variant
+        restricts the match to one model/prompt variant's summaries.
+        """
+        doc_hash = file_sha256(identifier) if os.path.isfile(identifier) else None
+        # A bare stem matches its summary in every variant (235b~summary-DGM)
+        variant_suffix = f'~{summary_custom_id(identifier)}'
+        query = ("SELECT * FROM summaries WHERE kind = 'summary' "
+                 "AND (doc_hash = ? OR source = ? OR custom_id = ? OR custom_id = ? OR substr(custom_id, ?) = ?)")
+        params = [doc_hash, identifier, identifier, summary_custom_id(identifier),
+                  -len(variant_suffix), variant_suffix]
+        if variant:
+            query += " AND substr(custom_id, 1, ?) = ?"
+            params += [len(variant) + 1, f'{variant}~']
+        query += " ORDER BY created_at DESC, id DESC" + ('' if history else ' LIMIT 1')
+        return self.db.execute(query, params).fetchall()
+
+    def search(self, query, limit=20):
+        """Return final summaries matching a full-text query, best match first."""
+        if self.fts:
+            return self.db.execute(
+                "SELECT summaries.*, snippet(summaries_fts, 0, '[', ']', '…', 12) AS snippet "
+                "FROM summaries_fts JOIN summaries ON summaries.id = summaries_fts.rowid "
+                "WHERE summaries_fts MATCH ? AND summaries.kind = 'summary' "
+                "ORDER BY bm25(summaries_fts) LIMIT ?",
+                (query, limit),
+            ).fetchall()
+        return self.db.execute(
+            "SELECT *, substr(summary, 1, 120) AS snippet FROM summaries "
+            "WHERE kind = 'summary' AND summary LIKE ? ORDER BY created_at DESC LIMIT ?",
+            (f'%{query}%', limit),
+        ).fetchall()
+
+    def usage(self):
+        """Return token usage totals per model, chunk and reduce requests included."""
+        return self.db.execute(
+            "SELECT model, COUNT(*) AS results, SUM(prompt_tokens) AS prompt_tokens, "
+            "SUM(completion_tokens) AS completion_tokens, SUM(total_tokens) AS total_tokens "
+            "FROM summaries GROUP BY model ORDER BY model"
+        ).fetchall()
+
+    def latest_summaries(self):
+        """Yield the most recent final summary of every custom_id."""
+        yield from self.db.execute(
+            "SELECT * FROM summaries AS s WHERE kind = 'summary' AND id = ("
+            "SELECT id FROM summaries WHERE custom_id = s.custom_id AND kind = 'summary' "
+            "ORDER BY created_at DESC, id DESC LIMIT 1) ORDER BY custom_id"
+        )
+
+
+def export_markdown(store, output_dir):
+    """Write the latest summary of every document as markdown; returns the number written.
+
+    As in data/summaries/, each model/prompt variant gets its own subdirectory.
+    """
+    count = 0
+    for row in store.latest_summaries():
+        timestamp = datetime.fromisoformat(row['created_at']).strftime('%Y%m%d_%H%M%S')
+        parsed = parse_custom_id(row['custom_id'])
+        variant_dir = Path(output_dir) / (parsed['variant'] or '')
+        variant_dir.mkdir(parents=True, exist_ok=True)
+        with open(variant_dir / f"{parsed['stem']}_summary_{timestamp}.md", 'w', encoding='utf-8') as f:
+            f.write(row['summary'])
+        count += 1
+    return count
+
+
+def print_summary(row):
+    """Print one stored summary with its metadata header."""
+    tokens = f"{row['prompt_tokens'] or 0:,} in / {row['completion_tokens'] or 0:,} out"
+    print(f"# {row['custom_id']}  ({row['created_at']})")
+    print(f"Source: {row['source'] or 'unknown'} | Model: {row['model'] or 'unknown'} | "
+          f"Batch: {row['batch_id']} | Tokens: {tokens}")
+    print(f"Document hash: {row['doc_hash'][:16] or 'unknown'} | Prompt hash: {row['prompt_hash'] or 'unknown'}\n")
+    print(row['summary'])
+
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description='Look up, search and export stored summaries')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    lookup = commands.add_parser('lookup', help='Show the latest summary of a document')
+    lookup.add_argument('document', help='Document path, custom_id or file stem')
+    lookup.add_argument('--history', action='store_true', help='List every stored version, newest first')
+    lookup.add_argument('--variant', metavar='NAME', help='Only summaries of this model/prompt variant')
+
+    search = commands.add_parser('search', help='Full-text search across summaries')
+    search.add_argument('query', help='FTS5 query, e.g. "transformer AND attention"')
+    search.add_argument('--limit', type=int, default=20, help='Maximum number of results (default: 20)')
+
+    commands.add_parser('usage', help='Token usage totals per model')
+
+    export = commands.add_parser('export', help='Write the latest summary of every document as markdown')
+    export.add_argument('--output-dir', default='data/summaries_export',
+                        help='Directory for the markdown files (default: data/summaries_export)')
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not store_path().exists():
+        print(f"Error: {store_path()} not found. Process some batch results first.")
+        exit(1)
+
+    with SummaryStore() as store:
+        if args.command == 'lookup':
+            rows = store.lookup(args.document, history=args.history, variant=args.variant)
+            if not rows:
+                print(f"✗ No summary stored for {args.document}")
+                exit(1)
+            if args.history:
+                for row in rows:
+                    print(f"{row['created_at']}  {row['custom_id']}  {row['model']}  batch {row['batch_id']}  "
+                          f"{row['total_tokens'] or 0:,} tokens")
+            else:
+                print_summary(rows[0])
+
+        elif args.command == 'search':
+            try:
+                rows = store.search(args.query, args.limit)
+            except sqlite3.OperationalError as e:
+                print(f"Error: invalid search query: {e}")
+                exit(1)
+            for row in rows:
+                print(f"{row['custom_id']}  ({row['created_at']}, {row['source'] or 'unknown source'})")
+                print(f"  {' '.join(row['snippet'].split())}\n")
+            print(f"✓ {len(rows)} match(es)")
+
+        elif args.command == 'usage':
+            for row in store.usage():
+                print(f"{row['model'] or 'unknown'}: {row['results']:,} results, "
+                      f"{row['prompt_tokens'] or 0:,} prompt + {row['completion_tokens'] or 0:,} completion "
+                      f"= {row['total_tokens'] or 0:,} tokens")
+
+        elif args.command == 'export':
+            count = export_markdown(store, args.output_dir)
+            print(f"✓ Exported {count} summaries to {args.output_dir}/")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import json
+from types import SimpleNamespace
+
+from chunking import (PAGE_BREAK, ChunkPlans, chunk_text, flatten_pages, record_chunk_results, record_reduce_batches,
+                      reduce_content)
+import process_results
+import pytest
+from token_estimator import CHARS_PER_TOKEN
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text('page one\fpage two', 100) == ['page one\fpage two']
+
+
+def test_chunks_follow_page_boundaries():
+    pages = [f'page {index} ' + 'x' * 90 for index in range(10)]
+    chunks = chunk_text(PAGE_BREAK.join(pages), 250 // CHARS_PER_TOKEN)
+    assert all(len(chunk) <= 250 for chunk in chunks)
+    # No page is cut and none is lost or repeated
+    assert [page for chunk in chunks for page in chunk.split(PAGE_BREAK)] == pages
+
+
+def test_oversized_page_splits_on_paragraphs_then_characters():
+    page = '\n\n'.join(['p' * 30] * 4) + '\n\n' + 'q' * 130
+    chunks = chunk_text(page, 50 // CHARS_PER_TOKEN)
+    assert all(len(chunk) <= 50 // CHARS_PER_TOKEN * CHARS_PER_TOKEN for chunk in chunks)
+    assert ''.join(chunks).replace('\n', '') == page.replace('\n', '')
+
+
+def test_blank_chunks_are_dropped():
+    assert chunk_text('\f   \f\f', 100) == []
+
+
+def test_flatten_pages_and_reduce_order():
+    assert flatten_pages('a\fb') == 'a\nb'
+    content = reduce_content('Summarise.', ['first', 'second'])
+    assert content.index('Section 1 of 2') < content.index('first') < content.index('Section 2 of 2')
+
+
+@pytest.fixture
+def plans(tmp_path, monkeypatch):
+    """A saved plan for one document split into two chunks, with their summaries on disk."""
+    monkeypatch.setenv('CHUNK_PLANS', str(tmp_path / 'plans.json'))
+    plans = ChunkPlans.load()
+    plans.add('summary-doc', ['chunk001of002-doc', 'chunk002of002-doc'], 'doc.pdf', 'Summarise.', 'model', 500,
+              '/v1/chat/completions')
+    plans.save()
+    for number in (1, 2):
+        (tmp_path / f'chunk{number}.md').write_text(f'part {number}')
+    return tmp_path
+
+
+def test_reduce_is_requested_once_all_chunks_are_in(plans):
+    assert record_chunk_results([('chunk001of002-doc', plans / 'chunk1.md')], []) == []
+    requests = record_chunk_results([('chunk002of002-doc', plans / 'chunk2.md')], [])
+    assert [request['custom_id'] for request in requests] == ['summary-doc']
+    # Another batch finishing meanwhile does not send it a second time
+    assert record_chunk_results([('chunk002of002-doc', plans / 'chunk2.md')], []) == []
+    record_reduce_batches(['summary-doc'], ['batch-1'])
+    assert record_chunk_results([], []) == []
+    plan = json.loads((plans / 'plans.json').read_text())['summary-doc']
+    assert (plan['status'], plan['reduce_batch_ids']) == ('reducing', ['batch-1'])
+
+
+def test_failed_reduce_submission_is_sent_again(plans, monkeypatch):
+    monkeypatch.chdir(plans)
+    spool_dir = plans / 'spool'
+    (spool_dir / 'batch-1').mkdir(parents=True)
+    # Both chunk results were saved before the interruption, so nothing is downloaded
+    (spool_dir / 'batch-1' / 'batch-1.done').write_text(f"chunk001of002-doc\t{plans / 'chunk1.md'}\n"
+                                                        f"chunk002of002-doc\t{plans / 'chunk2.md'}\n")
+    batch = SimpleNamespace(id='batch-1', output_file_id=None, error_file_id=None,
+                            request_counts=SimpleNamespace(total=2))
+
+    def fail(client, requests, prefix, metadata=None):
+        raise ConnectionError('submit failed')
+
+    monkeypatch.setattr(process_results, 'submit_follow_up', fail)
+    with pytest.raises(ConnectionError):
+        process_results.process_batch(None, batch, plans / 'summaries', spool_dir)
+    assert json.loads((plans / 'plans.json').read_text())['summary-doc']['status'] == 'mapping'
+
+    submitted = []
+    monkeypatch.setattr(process_results, 'submit_follow_up',
+                        lambda client, requests, prefix, metadata=None: submitted.extend(requests) or ['batch-2'])
+    assert process_results.process_batch(None, batch, plans / 'summaries', spool_dir) == (0, ['batch-2'])
+    assert [request['custom_id'] for request in submitted] == ['summary-doc']
+    assert json.loads((plans / 'plans.json').read_text())['summary-doc']['reduce_batch_ids'] == ['batch-2']
@@ -0,0 +1,117 @@
+import random
+
+from dedup import DuplicateIndex, _probability, duplicate_note, lsh_parameters, signature, similarity, text_hash
+from summary_manifest import SummaryManifest
+import pytest
+
+VOCABULARY = [f"word{number}" for number in range(2000)]
+
+
+def words(count, seed):
+    rng = random.Random(seed)
+    return [rng.choice(VOCABULARY) for _ in range(count)]
+
+
+def edited(original, fraction, seed):
+    """A copy of the word list with roughly fraction of its words replaced."""
+    rng = random.Random(seed)
+    return [rng.choice(VOCABULARY) if rng.random() < fraction else word for word in original]
+
+
+@pytest.fixture
+def index(tmp_path):
+    with DuplicateIndex(tmp_path / 'index.db') as index:
+        yield index
+
+
+def test_text_hash_ignores_case_whitespace_and_punctuation():
+    assert text_hash('Hello,  World!\n') == text_hash('hello world')
+    assert text_hash('hello world') != text_hash('hello there')
+
+
+def test_similarity_of_identical_and_unrelated_texts():
+    text = ' '.join(words(2000, 1))
+    assert similarity(signature(text), signature(text)) == 1.0
+    assert similarity(signature(text), signature(' '.join(words(2000, 2)))) < 0.1
+
+
+def test_similarity_tracks_the_share_of_edited_words():
+    original = words(3000, 3)
+    close = similarity(signature(' '.join(original)), signature(' '.join(edited(original, 0.01, 4))))
+    far = similarity(signature(' '.join(original)), signature(' '.join(edited(original, 0.2, 5))))
+    assert close > 0.85
+    assert far < 0.5
+
+
+def test_short_texts_still_compare():
+    assert similarity(signature('one two three'), signature('one two three')) == 1.0
+    assert similarity(signature('one two three'), signature('four five six')) < 0.5
+
+
+@pytest.mark.parametrize('threshold', [0.5, 0.7, 0.85, 0.95])
+def test_lsh_parameters_separate_pairs_around_the_threshold(threshold):
+    bands, rows = lsh_parameters(threshold)
+    assert bands * rows <= 128
+    assert _probability(min(1.0, threshold + 0.15), bands, rows) > 0.95
+    assert _probability(threshold - 0.15, bands, rows) < 0.15
+
+
+def test_exact_copy_links_to_the_first_path(index):
+    text = ' '.join(words(500, 6))
+    assert index.match(text, 'a/report.txt', 'hash-a') is None
+    match = index.match(text, 'b/report.txt', 'hash-b')
+    assert match['similarity'] == 1.0
+    assert match['content_hash'] == 'hash-a'
+    assert match['source'].endswith('a/report.txt')
+
+
+def test_near_duplicates_match_only_above_the_threshold(index):
+    original = words(3000, 7)
+    index.match(' '.join(original), 'original.txt')
+    close = index.match(' '.join(edited(original, 0.01, 8)), 'close.txt')
+    assert close is not None and close['similarity'] >= index.threshold
+    assert index.match(' '.join(edited(original, 0.2, 9)), 'far.txt') is None
+    assert index.match(' '.join(words(3000, 10)), 'other.txt') is None
+
+
+def test_same_path_keeps_its_role(index):
+    text = ' '.join(words(500, 11))
+    index.match(text, 'first.txt')
+    assert index.match(text, 'second.txt') is not None
+    # Seen again, each path is what it was the first time
+    assert index.match(text, 'first.txt') is None
+    assert index.match(text, 'second.txt')['source'].endswith('first.txt')
+    # The same file named through another relative path is the same source
+    assert index.match(text, './first.txt') is None
+
+
+def test_raised_threshold_demotes_weaker_duplicates(tmp_path):
+    original = words(3000, 12)
+    variant = ' '.join(edited(original, 0.01, 13))
+    with DuplicateIndex(tmp_path / 'index.db', threshold=0.8) as index:
+        index.match(' '.join(original), 'original.txt')
+        score = index.match(variant, 'variant.txt')['similarity']
+    with DuplicateIndex(tmp_path / 'index.db', threshold=min(1.0, score + 0.01)) as index:
+        assert index.match(variant, 'variant.txt') is None
+
+
+def test_duplicate_note_names_the_representative():
+    exact = {'representative': 'papers/DGM.pdf', 'similarity': 1.0}
+    near = {'representative': 'papers/DGM.pdf', 'similarity': 0.912}
+    assert duplicate_note(exact).startswith('> Same text as `DGM.pdf`')
+    assert duplicate_note(near).startswith('> Near-duplicate (91% similar) of `DGM.pdf`')
+
+
+def test_key_for_gives_other_paths_their_own_key(tmp_path):
+    first, second = tmp_path / 'a.txt', tmp_path / 'b.txt'
+    first.write_text('same')
+    second.write_text('same')
+    manifest = SummaryManifest(tmp_path / 'manifest.json')
+    assert manifest.key_for('k', first) == 'k'
+    manifest.mark_pending('k', 'summary-a', first)
+    assert manifest.key_for('k', first) == 'k'
+    other = manifest.key_for('k', second)
+    assert other != 'k' and other == manifest.key_for('k', second)
+    # A moved file takes over the entry its old path left behind
+    first.unlink()
+    assert manifest.key_for('k', second) == 'k'
@@ -0,0 +1,111 @@
+import random
+import re
+import pytest
+from extraction_budget import ExtractionBudget, select_pages, select_stream
+
+MARKER = re.compile(r'\n?\[\.\.\. (.*?) not extracted \.\.\.\]\n?')
+
+
+def uniform_pages(count=20, size=100):
+    return [f'P{index:02d}' + 'x' * (size - 3) for index in range(count)]
+
+
+def read_pages(pages):
+    """A read_pages callback over in-memory pages, recording the pages read."""
+    read = []
+
+    def reader(numbers):
+        for number in numbers:
+            read.append(number)
+            yield pages[number]
+    return reader, read
+
+
+def kept(text, separator):
+    """Extracted text without omission markers or separators."""
+    text = MARKER.sub('', text)
+    return text.replace(separator, '') if separator else text
+
+
+def page_labels(text):
+    return re.findall(r'P\d\d', text)
+
+
+@pytest.mark.parametrize('policy', ['head', 'head_tail', 'sampled'])
+@pytest.mark.parametrize('separator', ['\f', ''])
+def test_documents_within_budget_are_returned_whole(policy, separator):
+    pages = uniform_pages(5)
+    budget = ExtractionBudget(10_000, policy)
+    assert select_stream(iter(pages), budget, separator) == (separator.join(pages), 5, False)
+    reader, _ = read_pages(pages)
+    assert select_pages(reader, len(pages), budget, separator) == (separator.join(pages), 5, False)
+
+
+@pytest.mark.parametrize('policy', ['head', 'head_tail', 'sampled'])
+@pytest.mark.parametrize('separator', ['\f', ''])
+def test_uniform_pages_fill_the_budget_exactly(policy, separator):
+    pages = uniform_pages()
+    budget = ExtractionBudget(1000, policy, sections=5)
+    text, _, truncated = select_stream(iter(pages), budget, separator)
+    assert truncated and len(kept(text, separator)) == 1000
+    reader, _ = read_pages(pages)
+    text, _, truncated = select_pages(reader, len(pages), budget, separator)
+    assert truncated and len(kept(text, separator)) == 1000
+
+
+def test_head_stops_reading_once_the_budget_is_spent():
+    pages = uniform_pages(1000)
+    text, read, _ = select_stream(iter(pages), ExtractionBudget(250), '\f')
+    assert read == 3
+    assert page_labels(text) == ['P00', 'P01', 'P02']
+    reader, numbers = read_pages(pages)
+    select_pages(reader, len(pages), ExtractionBudget(250), '\f')
+    assert numbers == [0, 1, 2]
+
+
+def test_head_tail_keeps_both_ends():
+    pages = uniform_pages()
+    for text, _, _ in (select_stream(iter(pages), ExtractionBudget(400, 'head_tail'), '\f'),
+                       select_pages(read_pages(pages)[0], 20, ExtractionBudget(400, 'head_tail'), '\f')):
+        assert page_labels(text) == ['P00', 'P01', 'P18', 'P19']
+
+
+def test_head_tail_reads_only_the_ends_of_a_random_access_document():
+    reader, numbers = read_pages(uniform_pages(1000))
+    select_pages(reader, 1000, ExtractionBudget(400, 'head_tail'), '\f')
+    assert sorted(numbers) == [0, 1, 998, 999]
+
+
+def test_sampled_sections_are_evenly_spaced_by_page():
+    pages = uniform_pages()
+    budget = ExtractionBudget(1000, 'sampled', sections=5)
+    expected = ['P00', 'P01', 'P04', 'P05', 'P08', 'P09', 'P12', 'P13', 'P16', 'P17']
+    assert page_labels(select_stream(iter(pages), budget, '\f')[0]) == expected
+    assert page_labels(select_pages(read_pages(pages)[0], 20, budget, '\f')[0]) == expected
+
+
+def test_sampled_stream_fills_the_budget_from_few_large_pages():
+    text, _, _ = select_stream(iter(['A' * 5000, 'B' * 5000]), ExtractionBudget(1000, 'sampled', sections=5), '\f')
+    assert len(kept(text, '\f')) == 1000
+    assert 0 < text.count('B') < 1000
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('policy', ['head', 'head_tail', 'sampled'])
+def test_stream_stays_within_budget_and_accounts_for_skipped_text(seed, policy):
+    rng = random.Random(seed)
+    pages = ['z' * rng.randint(0, 600) for _ in range(rng.randint(1, 300))]
+    total = sum(map(len, pages))
+    budget = ExtractionBudget(rng.randint(100, 5000), policy, sections=rng.randint(1, 8))
+    text, _, truncated = select_stream(iter(pages), budget, '\f')
+    content = len(kept(text, '\f'))
+    assert truncated == (total > budget.max_chars)
+    assert content == min(total, budget.max_chars) or (policy == 'sampled' and content >= 0.9 * budget.max_chars)
+    if policy != 'head':
+        skipped = sum(int(detail.split()[0].replace(',', '')) for detail in MARKER.findall(text))
+        assert content + skipped == total
+
+
+def test_budget_identity_names_policy_and_size():
+    assert ExtractionBudget(4000).identity() == 'head:4000'
+    assert ExtractionBudget(4000, 'sampled', 3).identity() == 'sampledx3:4000'
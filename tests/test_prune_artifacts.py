@@ -0,0 +1,65 @@
+import json
+import os
+import time
+
+from prune_artifacts import prune_artifacts
+import pytest
+
+DAY = 86400
+
+
+def write(path, content='x', age_days=0):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    mtime = time.time() - age_days * DAY
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A run submitted 10 days ago, with a retry still in flight and older leftovers."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('WATCH_STATE', str(tmp_path / 'watch_state.json'))
+    write(tmp_path / 'batch_requests_old_001.jsonl', age_days=40)
+    write(tmp_path / 'batch_id_old.txt', 'batch-finished\n', age_days=40)
+    write(tmp_path / 'batch_id_stalled.txt', 'batch-stalled\n', age_days=20)
+    write(tmp_path / 'batch_manifest_new.json', json.dumps({'shards': []}), age_days=10)
+    write(tmp_path / 'batch_id_new.txt', 'batch-1\n', age_days=10)
+    write(tmp_path / 'batch_id_retry.txt', 'batch-retry\n', age_days=9)
+    write(tmp_path / 'batch_id_reduce.txt', 'batch-reduce\n', age_days=8)
+    spool = tmp_path / 'spool'
+    write(spool / 'batch-retry' / 'file-retry.part.jsonl', age_days=9)
+    write(spool / 'batch-stalled' / 'file-stalled.part.jsonl', age_days=20)
+    write(spool / 'batch-watch' / 'file-watch.done', age_days=30)
+    write(tmp_path / 'watch_state.json', json.dumps({'in_flight': {'batch-watch': {}}}))
+    return tmp_path
+
+
+def remaining(workdir):
+    return sorted(str(path.relative_to(workdir)) for path in workdir.rglob('*') if path.is_file())
+
+
+def test_size_budget_spares_in_flight_and_interrupted_batches(workdir):
+    removed, _ = prune_artifacts(max_mb=0, spool_dir=workdir / 'spool')
+    assert sorted(removed) == ['batch_id_old.txt', 'batch_requests_old_001.jsonl']
+    assert remaining(workdir) == [
+        'batch_id_new.txt', 'batch_id_reduce.txt', 'batch_id_retry.txt', 'batch_id_stalled.txt',
+        'batch_manifest_new.json', 'spool/batch-retry/file-retry.part.jsonl',
+        'spool/batch-stalled/file-stalled.part.jsonl', 'spool/batch-watch/file-watch.done', 'watch_state.json',
+    ]
+
+
+def test_interrupted_batches_are_abandoned_after_the_age_limit(workdir):
+    prune_artifacts(max_age_days=15, spool_dir=workdir / 'spool')
+    assert not (workdir / 'spool' / 'batch-stalled').exists()
+    assert not (workdir / 'batch_id_stalled.txt').exists()
+    # Batches still in flight are kept however old
+    assert (workdir / 'spool' / 'batch-watch' / 'file-watch.done').exists()
+    assert (workdir / 'spool' / 'batch-retry' / 'file-retry.part.jsonl').exists()
+
+
+def test_dry_run_deletes_nothing(workdir):
+    before = remaining(workdir)
+    removed, _ = prune_artifacts(max_age_days=0, spool_dir=workdir / 'spool', dry_run=True)
+    assert removed and remaining(workdir) == before
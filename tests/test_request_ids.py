@@ -0,0 +1,78 @@
+from request_ids import (MAX_CUSTOM_ID_LENGTH, MAX_VARIANT_LENGTH, chunk_custom_id, chunk_stem, fit_stem,
+                         parse_custom_id, path_hash, safe_stem, summary_custom_id)
+import pytest
+
+VARIANTS = [None, '235b', '235b.brief', 'v' * MAX_VARIANT_LENGTH]
+
+
+def test_safe_stem_replaces_unsafe_characters():
+    assert safe_stem('data/papers/Green Bonds %5BNov 2023%5D & more.pdf') == 'Green_Bonds__5BNov_2023_5D_and_more'
+
+
+def test_safe_stem_includes_folders_below_the_root():
+    assert safe_stem('share/a/report.txt', 'share') == 'a_report'
+    assert safe_stem('share/b/q1 & q2/report.txt', 'share') == 'b_q1_and_q2_report'
+    assert safe_stem('share/report.txt', 'share') == 'report'
+    # Outside the root, or without one, only the file name counts
+    assert safe_stem('elsewhere/a/report.txt', 'share') == 'report'
+    assert safe_stem('share/a/report.txt') == 'report'
+
+
+def test_path_hash_tells_apart_files_with_the_same_name():
+    assert path_hash('a/report.txt') != path_hash('b/report.txt')
+    assert len(path_hash('a/report.txt')) == 8
+
+
+def test_safe_stem_replaces_the_variant_separator():
+    stem = safe_stem('data/papers/draft~summary-notes.pdf')
+    assert '~' not in stem
+    parsed = parse_custom_id(summary_custom_id(stem))
+    assert (parsed['kind'], parsed['stem'], parsed['variant']) == ('summary', stem, None)
+    parsed = parse_custom_id(chunk_custom_id(safe_stem('v1~chunk001of002-x.txt'), 1, 2, '235b'))
+    assert (parsed['kind'], parsed['stem'], parsed['variant']) == ('chunk', 'v1_chunk001of002-x', '235b')
+
+
+def test_summary_stems_keep_the_original_55_characters():
+    stem = 'x' * 55
+    assert summary_custom_id(stem) == f'summary-{stem}'
+    assert len(parse_custom_id(summary_custom_id('x' * 56))['stem']) == 55
+    assert len(summary_custom_id('x' * 56, '235b')) <= MAX_CUSTOM_ID_LENGTH
+
+
+def test_short_ids_are_unchanged():
+    assert summary_custom_id('DGM') == 'summary-DGM'
+    assert chunk_custom_id('DGM', 2, 12) == 'chunk002of012-DGM'
+    assert summary_custom_id('DGM', '30b.brief') == '30b.brief~summary-DGM'
+
+
+@pytest.mark.parametrize('variant', VARIANTS)
+def test_long_stems_sharing_a_prefix_stay_distinct(variant):
+    first, second = 'A' * 60 + '_first', 'A' * 60 + '_second'
+    ids = [summary_custom_id(first, variant), summary_custom_id(second, variant),
+           chunk_custom_id(first, 999, 999, variant), chunk_custom_id(second, 999, 999, variant)]
+    assert len(set(ids)) == 4
+    assert all(len(custom_id) <= MAX_CUSTOM_ID_LENGTH for custom_id in ids)
+
+
+@pytest.mark.parametrize('variant', VARIANTS)
+@pytest.mark.parametrize('stem', ['DGM', 'x' * 49, 'x' * 50, 'x' * 51, 'x' * 55, 'report_' * 20])
+def test_chunk_ids_map_back_to_their_summary(stem, variant):
+    # A split document's summary is named after its chunk stem
+    summary_id = summary_custom_id(chunk_stem(stem, variant), variant)
+    for index in (1, 7, 120):
+        parsed = parse_custom_id(chunk_custom_id(stem, index, 120, variant))
+        assert (parsed['kind'], parsed['index'], parsed['count'], parsed['variant']) == ('chunk', index, 120, variant)
+        assert summary_custom_id(parsed['stem'], parsed['variant']) == summary_id
+
+
+@pytest.mark.parametrize('variant', VARIANTS)
+def test_summary_ids_round_trip(variant):
+    summary_id = summary_custom_id('r' * 70, variant)
+    parsed = parse_custom_id(summary_id)
+    assert (parsed['kind'], parsed['variant']) == ('summary', variant)
+    assert summary_custom_id(parsed['stem'], parsed['variant']) == summary_id
+
+
+def test_fit_stem_is_idempotent():
+    fitted = fit_stem('s' * 80, '235b')
+    assert fit_stem(fitted, '235b') == fitted
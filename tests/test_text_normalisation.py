@@ -0,0 +1,69 @@
+import pytest
+from chunking import PAGE_BREAK
+from summary_manifest import document_key
+from text_normalisation import (DEFAULT_STEPS, collapse_whitespace, drop_references, normalise_text, parse_steps,
+                                rejoin_hyphenation, remove_page_numbers, remove_repeated_lines, steps_identity)
+
+
+def page(number, body):
+    return f"Annual Report 2024\n{body}\nPage {number} of 9"
+
+
+def test_page_numbers_at_page_edges_are_removed():
+    text = PAGE_BREAK.join(['Intro\ntext\n- 3 -', 'iv\nPreface text', 'Body\n12/40'])
+    assert remove_page_numbers(text) == PAGE_BREAK.join(['Intro\ntext', 'Preface text', 'Body'])
+
+
+def test_numbers_in_the_body_are_kept():
+    body = ['Heading', 'intro line', 'more text', 'Year', '2023', '42', 'I', 'v', 'x', 'closing', 'last', 'end']
+    text = '\n'.join(body)
+    assert remove_page_numbers(text) == text
+
+
+def test_upper_case_roman_numerals_are_kept():
+    assert remove_page_numbers('II\nThe second part') == 'II\nThe second part'
+
+
+def test_repeated_headers_and_footers_are_removed():
+    bodies = ['Alpha section', 'Beta section', 'Gamma section', 'Delta section']
+    text = PAGE_BREAK.join(page(number, body) for number, body in enumerate(bodies, 1))
+    assert remove_repeated_lines(text).split(PAGE_BREAK) == bodies
+
+
+def test_numbered_footers_leave_bare_numbers_in_the_body():
+    # Each page has its own lines at the edges, so only the footer repeats there
+    bodies = [f"Section {name}\nopening {name}\nthen {name}\nIn\n2019\nrevenue was\n42\nmillion\n"
+              f"in total {name}\nnext {name}\nclosing {name}"
+              for name in ('alpha', 'beta', 'gamma', 'delta', 'epsilon')]
+    text = PAGE_BREAK.join(f"{body}\n{number}" for number, body in enumerate(bodies, 1))
+    assert remove_repeated_lines(text).split(PAGE_BREAK) == bodies
+    assert normalise_text(text).split(PAGE_BREAK) == bodies
+
+def test_hyphenation_and_whitespace():
+    assert rejoin_hyphenation('extrac-\n  tion and Anglo-\nSaxon') == 'extraction and Anglo-\nSaxon'
+    assert collapse_whitespace('a  \t b \n\n\n\n c ') == 'a b\n\nc '
+
+
+def test_references_are_cut_only_in_the_second_half():
+    text = 'References\nearly mention\n' + 'body text\n' * 10 + '7. References\n[1] Someone, 2020\n'
+    assert drop_references(text).endswith('body text\n')
+    assert drop_references('References\n' + 'body\n' * 10) == 'References\n' + 'body\n' * 10
+
+
+def test_page_breaks_survive_normalisation():
+    text = PAGE_BREAK.join(page(number, 'Some  text') for number in range(1, 6))
+    assert normalise_text(text).count(PAGE_BREAK) == 4
+
+
+def test_parse_steps_rejects_unknown_steps():
+    assert parse_steps('whitespace, references') == ['whitespace', 'references']
+    with pytest.raises(ValueError):
+        parse_steps('whitespace,nonsense')
+
+
+def test_only_non_default_steps_change_the_manifest_key():
+    settings = dict(model='m', prompt_hash='p', max_tokens=5000, word_count=2000)
+    default = document_key('hash', **settings, normalisation=steps_identity(DEFAULT_STEPS))
+    assert default == document_key('hash', **settings)
+    assert document_key('hash', **settings, normalisation=steps_identity([])) != default
+    assert document_key('hash', **settings, normalisation=steps_identity(DEFAULT_STEPS + ['references'])) != default
@@ -0,0 +1,65 @@
+from variants import DEFAULT_MODEL, DEFAULT_PROMPT_FILE, _label, _parse_list, load_variants
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def prompts_dir(tmp_path, monkeypatch):
+    """Run in a folder holding the prompt files, with no variant settings in the environment."""
+    for name in ('SUMMARY_MODELS', 'SUMMARY_PROMPTS', 'DOUBLEWORD_MODEL'):
+        monkeypatch.delenv(name, raising=False)
+    for name in (DEFAULT_PROMPT_FILE, 'brief_prompt.txt', 'detailed.txt'):
+        (tmp_path / name).write_text('Summarise this.')
+    monkeypatch.chdir(tmp_path)
+
+
+def test_label_of_models_and_prompt_files():
+    assert _label('Qwen/Qwen3-VL-235B-A22B-Instruct-FP8') == 'qwen3-vl-235b-a2'
+    assert _label('prompts/brief_prompt.txt') == 'brief'
+    assert _label('summarisation-prompt.txt') == 'summarisation'
+    assert _label('My Prompt v2.txt') == 'my-prompt-v2'
+
+
+def test_parse_list_names_and_derives():
+    assert _parse_list('235b=Qwen/A, Qwen/B ,') == [('235b', 'Qwen/A'), ('b', 'Qwen/B')]
+    assert _parse_list('') == []
+    assert _parse_list(None) == []
+
+
+def test_single_model_and_prompt_have_no_name():
+    assert load_variants() == [{'name': None, 'model': DEFAULT_MODEL, 'prompt_file': DEFAULT_PROMPT_FILE}]
+
+
+def test_environment_fallbacks(monkeypatch):
+    monkeypatch.setenv('DOUBLEWORD_MODEL', 'Qwen/Other')
+    assert [variant['model'] for variant in load_variants()] == ['Qwen/Other']
+    monkeypatch.setenv('SUMMARY_MODELS', 'a=Qwen/A,b=Qwen/B')
+    assert [variant['name'] for variant in load_variants()] == ['a', 'b']
+    # Arguments win over the environment
+    assert [variant['name'] for variant in load_variants(models='c=Qwen/C')] == [None]
+
+
+def test_names_only_include_the_dimensions_that_vary():
+    variants = load_variants(models='235b=Qwen/A,30b=Qwen/B',
+                             prompts=f'full={DEFAULT_PROMPT_FILE},brief_prompt.txt')
+    assert [variant['name'] for variant in variants] == ['235b.full', '235b.brief', '30b.full', '30b.brief']
+    variants = load_variants(prompts='brief_prompt.txt,long=detailed.txt')
+    assert [(variant['name'], variant['model']) for variant in variants] == [('brief', DEFAULT_MODEL),
+                                                                             ('long', DEFAULT_MODEL)]
+
+
+def test_duplicate_names_are_rejected():
+    with pytest.raises(SystemExit, match='duplicate variant name'):
+        load_variants(models='Org1/model,Org2/model')
+
+
+def test_invalid_names_are_rejected():
+    with pytest.raises(SystemExit, match="variant name 'a/b'"):
+        load_variants(models='a/b=Qwen/A,Qwen/B')
+    # Combined names can outgrow the limit even when each part fits
+    with pytest.raises(SystemExit, match='must be 1-16'):
+        load_variants(models='235b=Qwen/A,30b=Qwen/B', prompts=f'{DEFAULT_PROMPT_FILE},brief_prompt.txt')
+
+
+def test_missing_prompt_file_is_rejected():
+    with pytest.raises(SystemExit, match="prompt file 'missing.txt' not found"):
+        load_variants(prompts='missing.txt')
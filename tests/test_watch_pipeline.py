@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from openai import InternalServerError
+import pytest
+import watch_pipeline
+from watch_pipeline import WatchState, poll_due
+
+
+def server_error():
+    error = InternalServerError.__new__(InternalServerError)
+    error.status_code = 500
+    error.response = SimpleNamespace(headers={})
+    return error
+
+
+def finished_batch(batch_id='batch-1'):
+    return SimpleNamespace(id=batch_id, status='completed', output_file_id=f'file-{batch_id}', errors=None,
+                           request_counts=SimpleNamespace(completed=2, total=2), created_at=None)
+
+
+class FakeBatches:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+
+    def retrieve(self, batch_id):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    state = WatchState(tmp_path / 'state.json')
+    state.track('batch-1', 1)
+    return state
+
+
+def poll(client, state):
+    state.in_flight.get('batch-1', {})['next_check'] = 0
+    poll_due(client, state, 1, 60, 1.5)
+
+
+def test_transient_errors_postpone_the_check(state, monkeypatch):
+    processed = []
+    monkeypatch.setattr(watch_pipeline, 'process_batch', lambda client, batch: processed.append(batch.id) or (2, []))
+    client = SimpleNamespace(batches=FakeBatches(server_error(), finished_batch()))
+    poll(client, state)
+    assert state.in_flight['batch-1']['errors'] == 1
+    assert state.in_flight['batch-1']['next_check'] > 0
+    poll(client, state)
+    assert processed == ['batch-1'] and not state.in_flight
+
+
+def test_failed_processing_is_resumed(state, monkeypatch):
+    def interrupted(client, batch):
+        raise server_error()
+
+    monkeypatch.setattr(watch_pipeline, 'process_batch', interrupted)
+    client = SimpleNamespace(batches=FakeBatches(finished_batch(), finished_batch()))
+    poll(client, state)
+    assert state.in_flight['batch-1']['processing']
+    monkeypatch.setattr(watch_pipeline, 'process_batch', lambda client, batch: (2, ['retry-1']))
+    poll(client, state)
+    assert list(state.in_flight) == ['retry-1']
+
+
+def test_finished_processing_is_not_repeated(state, monkeypatch):
+    # Processing completed (its progress file is gone) but the daemon stopped before saving the state
+    state.in_flight['batch-1']['processing'] = True
+    monkeypatch.setattr(watch_pipeline, 'process_batch', lambda client, batch: pytest.fail('processed twice'))
+    poll(SimpleNamespace(batches=FakeBatches(finished_batch())), state)
+    assert not state.in_flight
+
+
+def test_permanent_errors_are_raised(state):
+    with pytest.raises(ValueError):
+        poll(SimpleNamespace(batches=FakeBatches(ValueError('bad response'))), state)
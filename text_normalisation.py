@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Clean extracted text before it goes into a prompt.
+
+Extracted PDFs carry running headers and footers on every page, page
+numbers, words hyphenated across line breaks, whitespace runs and long
+reference lists, all of which are billed as input tokens. Each step below
+removes one kind of noise; page breaks are preserved so chunking still
+works on the result.
+
+Run directly to measure the savings on a folder of documents:
+  python text_normalisation.py data/papers_samples
+"""
+
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+from chunking import PAGE_BREAK
+from token_estimator import estimate_tokens
+
+DEFAULT_STEPS = ['repeated_lines', 'page_numbers', 'hyphenation', 'whitespace']
+
+# Lines this far from the top or bottom of a page are header/footer candidates
+EDGE_LINES = 3
+
+# Roman numerals only in lower case, as front matter is numbered; 'II' may be a heading
+_PAGE_NUMBER = re.compile(
+    r'(?:(?i:page)\s+)?\d{1,4}(?:\s*(?i:of|/)\s*\d{1,4})?'
+    r'|(?=[ivxlc])(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})'
+    r'|[-–—]\s*\d{1,4}\s*[-–—]'
+)
+_REFERENCES_HEADING = re.compile(
+    r'(?:\d+(?:\.\d+)*\.?\s+)?(?:references|bibliography|works cited|reference list)\s*:?',
+    re.IGNORECASE,
+)
+_HYPHENATED = re.compile(r'([a-z])-\n[ \t]*([a-z])')
+
+
+def _line_signature(line):
+    """Normalise a line so headers that differ only by page number match."""
+    return re.sub(r'\d+', '#', line.strip().lower())
+
+
+def _edge_indexes(lines):
+    """Indexes of the first and last EDGE_LINES non-blank lines of a page."""
+    filled = [index for index, line in enumerate(lines) if line.strip()]
+    return set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+
+
+def remove_repeated_lines(text, min_fraction=0.5, min_pages=3):
+    """Drop header/footer lines that repeat on many pages.
+
+    Lines are counted and removed only at page edges, so a footer such as
+    '12' does not take every bare number in the body with it.
+    """
+    pages = [page.split('\n') for page in text.split(PAGE_BREAK)]
+    if len(pages) < min_pages:
+        return text
+
+    edges = [_edge_indexes(lines) for lines in pages]
+    counts = Counter()
+    for lines, indexes in zip(pages, edges):
+        counts.update({_line_signature(lines[index]) for index in indexes})
+
+    threshold = max(min_pages, min_fraction * len(pages))
+    repeated = {signature for signature, count in counts.items() if count >= threshold}
+    if not repeated:
+        return text
+
+    return PAGE_BREAK.join(
+        '\n'.join(line for index, line in enumerate(lines)
+                  if index not in indexes or _line_signature(line) not in repeated)
+        for lines, indexes in zip(pages, edges)
+    )
+
+
+def remove_page_numbers(text):
+    """Drop page-number lines at the top or bottom of each page.
+
+    Only the first and last EDGE_LINES non-blank lines of a page are
+    candidates, so numbers standing alone in the body (table cells, years,
+    equation numbers) are kept.
+    """
+    pages = []
+    for page in text.split(PAGE_BREAK):
+        lines = page.split('\n')
+        edges = _edge_indexes(lines)
+        pages.append('\n'.join(line for index, line in enumerate(lines)
+                               if index not in edges or not _PAGE_NUMBER.fullmatch(line.strip())))
+    return PAGE_BREAK.join(pages)
+
+
+def rejoin_hyphenation(text):
+    """Rejoin lower-case words split with a hyphen across a line break."""
+    return _HYPHENATED.sub(r'\1\2', text)
+
+
+def collapse_whitespace(text):
+    """Collapse runs of spaces and blank lines, and strip trailing spaces."""
+    text = re.sub(r'[ \t\u00a0]+', ' ', text)
+    text = re.sub(r' *\n *', '\n', text)
+    return re.sub(r'\n{3,}', '\n\n', text)
+
+
+def drop_references(text, min_position=0.5):
+    """Cut everything from the last references heading in the second half of the text."""
+    cut = None
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        if offset >= len(text) * min_position and _REFERENCES_HEADING.fullmatch(line.strip()):
+            cut = offset
+        offset += len(line)
+    return text if cut is None else text[:cut]
+
+
+NORMALISATION_STEPS = {
+    'repeated_lines': remove_repeated_lines,
+    'page_numbers': remove_page_numbers,
+    'hyphenation': rejoin_hyphenation,
+    'whitespace': collapse_whitespace,
+    'references': drop_references,
+}
+
+
+def normalise_text(text, steps=DEFAULT_STEPS):
+    """Apply the named normalisation steps in order."""
+    for step in steps:
+        text = NORMALISATION_STEPS[step](text)
+    return text
+
+
+def steps_identity(steps):
+    """Describe the steps for the summary manifest; None for the defaults, whose keys predate it."""
+    if list(steps) == DEFAULT_STEPS:
+        return None
+    return ','.join(steps) or 'none'
+
+
+def parse_steps(value):
+    """Parse a comma-separated NORMALISE_STEPS value, rejecting unknown steps."""
+    steps = [step.strip() for step in value.split(',') if step.strip()]
+    unknown = [step for step in steps if step not in NORMALISATION_STEPS]
+    if unknown:
+        raise ValueError(f"Unknown normalisation step(s): {', '.join(unknown)}. "
+                         f"Choose from: {', '.join(NORMALISATION_STEPS)}")
+    return steps
+
+
+def savings(before, after):
+    """Return a dict of before/after character and estimated token counts."""
+    return {
+        'chars_before': len(before),
+        'chars_after': len(after),
+        'tokens_before': estimate_tokens(before),
+        'tokens_after': estimate_tokens(after),
+    }
+
+
+def format_savings(stats):
+    """One-line human-readable summary of a savings dict."""
+    saved = 1 - stats['chars_after'] / stats['chars_before'] if stats['chars_before'] else 0
+    return (f"{stats['chars_before']:,} → {stats['chars_after']:,} chars, "
+            f"~{stats['tokens_before']:,} → ~{stats['tokens_after']:,} tokens (-{saved:.1%})")
+
+
+def main():
+    """Report normalisation savings for every supported file in the given folders."""
+    from extractors import extract_document, supported_extensions
+
+    steps = DEFAULT_STEPS + ['references'] if '--drop-references' in sys.argv else DEFAULT_STEPS
+    folders = [arg for arg in sys.argv[1:] if not arg.startswith('--')] or ['data/papers_samples']
+    totals = Counter()
+    extensions = supported_extensions()
+
+    for folder in folders:
+        for path in sorted(Path(folder).iterdir()):
+            if path.suffix.lower() not in extensions:
+                continue
+            result = extract_document(str(path))
+            if result['error'] or not result['text']:
+                print(f"{path.name}: skipped ({result['error'] or 'no text'})")
+                continue
+            stats = savings(result['text'], normalise_text(result['text'], steps))
+            totals.update(stats)
+            print(f"{path.name}: {format_savings(stats)}")
+
+    if totals:
+        print(f"\nTotal: {format_savings(totals)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Offline token and cost estimation for batch requests.
+
+Used as a library for quick estimates (chars/4) while building requests,
+and as a pre-flight check over generated JSONL before anything is uploaded:
+
+  python token_estimator.py                      # latest batch manifest
+  python token_estimator.py batch_requests_*.jsonl.gz --tokenizer tiktoken:cl100k_base
+  python token_estimator.py --set-max-tokens     # rewrite max_tokens per request
+
+A real tokenizer can be plugged in with --tokenizer or TOKENIZER:
+  chars                      heuristic, no dependencies (default)
+  tiktoken:<encoding>        requires tiktoken
+  hf:<model name or path>    requires tokenizers (Hugging Face)
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+from collections import defaultdict
+from compression import open_text, temporary_path
+
+# Rough average for English prose with BPE tokenizers
+CHARS_PER_TOKEN = 4
+
+# Tokens per English word for output budgeting
+TOKENS_PER_WORD = 1.35
+
+# Shortest summary budget for very short documents
+MIN_SUMMARY_TOKENS = 500
+
+# Context window of the default Qwen3-VL models
+DEFAULT_CONTEXT_TOKENS = 128000
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a string without a tokenizer."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_request_tokens(request, count_tokens=estimate_tokens):
+    """Estimate the input tokens of a batch request from its message contents."""
+    return sum(count_tokens(message['content']) for message in request['body']['messages'])
+
+
+def get_token_counter(spec=None):
+    """Return a text -> token count function for a tokenizer spec.
+
+    Optional tokenizer libraries are imported only when requested.
+    """
+    spec = spec or os.getenv('TOKENIZER', 'chars')
+    kind, _, name = spec.partition(':')
+
+    if kind == 'chars':
+        return estimate_tokens
+
+    if kind == 'tiktoken':
+        try:
+            import tiktoken
+        except ImportError:
+            raise SystemExit("Error: tokenizer 'tiktoken' requested but tiktoken is not installed "
+                             "(pip install tiktoken)")
+        encoding = tiktoken.get_encoding(name or 'cl100k_base')
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+    if kind == 'hf':
+        try:
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise SystemExit("Error: tokenizer 'hf' requested but tokenizers is not installed "
+                             "(pip install tokenizers)")
+        tokenizer = Tokenizer.from_pretrained(name or os.getenv('DOUBLEWORD_MODEL'))
+        return lambda text: len(tokenizer.encode(text).ids)
+
+    raise SystemExit(f"Error: unknown tokenizer '{spec}' (use chars, tiktoken:<encoding> or hf:<model>)")
+
+
+def context_tokens():
+    """Return the model context window from MODEL_CONTEXT_TOKENS."""
+    return int(os.getenv('MODEL_CONTEXT_TOKENS', str(DEFAULT_CONTEXT_TOKENS)))
+
+
+def expected_output_tokens(input_tokens, word_count):
+    """Expected summary length: the target word count, but no longer than the document."""
+    target = math.ceil(int(word_count) * TOKENS_PER_WORD)
+    return min(target, max(MIN_SUMMARY_TOKENS, input_tokens))
+
+
+def budget_max_tokens(input_tokens, word_count, reasoning_tokens=None):
+    """Choose max_tokens for one request from its length and SUMMARY_WORD_COUNT.
+
+    Allows 25% over the expected summary length plus a fixed allowance for
+    reasoning (MAX_TOKENS_REASONING), capped at what is left of the context.
+    """
+    if reasoning_tokens is None:
+        reasoning_tokens = int(os.getenv('MAX_TOKENS_REASONING', '1000'))
+    wanted = math.ceil(expected_output_tokens(input_tokens, word_count) * 1.25) + reasoning_tokens
+    return max(1, min(wanted, context_tokens() - input_tokens))
+
+
+def load_pricing():
+    """Return {model: (input $/Mtok, output $/Mtok)} from MODEL_PRICING_FILE or PRICE_* vars.
+
+    A '*' entry applies to models without their own price. Returns an empty
+    dict when no pricing is configured.
+    """
+    pricing = {}
+    pricing_file = os.getenv('MODEL_PRICING_FILE')
+    if pricing_file:
+        with open(pricing_file, 'r') as f:
+            for model, prices in json.load(f).items():
+                pricing[model] = (float(prices['input']), float(prices['output']))
+    if os.getenv('PRICE_INPUT_PER_MTOK') and os.getenv('PRICE_OUTPUT_PER_MTOK'):
+        pricing.setdefault('*', (float(os.environ['PRICE_INPUT_PER_MTOK']),
+                                 float(os.environ['PRICE_OUTPUT_PER_MTOK'])))
+    return pricing
+
+
+def estimate_file(path, count_tokens=estimate_tokens, word_count=2000):
+    """Yield a per-request estimate dict for every request in a JSONL file."""
+    window = context_tokens()
+    with open_text(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            input_tokens = estimate_request_tokens(request, count_tokens)
+            max_tokens = request['body'].get('max_tokens', 0)
+            yield {
+                'custom_id': request['custom_id'],
+                'model': request['body'].get('model', 'unknown'),
+                'input_tokens': input_tokens,
+                'max_tokens': max_tokens,
+                'expected_output_tokens': min(max_tokens or math.inf,
+                                              expected_output_tokens(input_tokens, word_count)),
+                'overflows': input_tokens + max_tokens > window,
+            }
+
+
+def set_max_tokens(path, count_tokens=estimate_tokens, word_count=2000):
+    """Rewrite a JSONL file in place with a budgeted max_tokens per request."""
+    tmp_path = temporary_path(path)
+    with open_text(path) as src, open_text(tmp_path, 'w') as dst:
+        for line in src:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            input_tokens = estimate_request_tokens(request, count_tokens)
+            request['body']['max_tokens'] = budget_max_tokens(input_tokens, word_count)
+            dst.write(json.dumps(request) + '\n')
+    os.replace(tmp_path, path)
+
+
+def request_files_from_manifest(manifest_file=None):
+    """Return the shard paths of a batch manifest (default: the most recent)."""
+    if manifest_file is None:
+        manifest_files = glob.glob('batch_manifest_*.json')
+        if not manifest_files:
+            return []
+        manifest_file = max(manifest_files, key=os.path.getmtime)
+    with open(manifest_file, 'r') as f:
+        return [shard['path'] for shard in json.load(f)['shards']]
+
+
+def preflight(request_files, count_tokens=estimate_tokens, word_count=2000, per_request=True):
+    """Print per-request and total token estimates and projected cost.
+
+    Returns the list of custom_ids whose input plus max_tokens exceeds the
+    model context window.
+    """
+    totals = defaultdict(lambda: {'requests': 0, 'input': 0, 'expected_output': 0, 'max_output': 0})
+    overflowing = []
+
+    for path in request_files:
+        if per_request:
+            print(f"\n{path}")
+        for estimate in estimate_file(path, count_tokens, word_count):
+            model_totals = totals[estimate['model']]
+            model_totals['requests'] += 1
+            model_totals['input'] += estimate['input_tokens']
+            model_totals['expected_output'] += estimate['expected_output_tokens']
+            model_totals['max_output'] += estimate['max_tokens']
+            flag = ''
+            if estimate['overflows']:
+                overflowing.append(estimate['custom_id'])
+                flag = '  ⚠ exceeds context'
+            if per_request:
+                print(f"  {estimate['custom_id']}: ~{estimate['input_tokens']:,} in, "
+                      f"~{estimate['expected_output_tokens']:,} out (max {estimate['max_tokens']:,}){flag}")
+
+    pricing = load_pricing()
+    print(f"\nToken estimate (context window {context_tokens():,}):")
+    for model, t in totals.items():
+        print(f"  {model}: {t['requests']} requests, ~{t['input']:,} input tokens, "
+              f"~{t['expected_output']:,} expected output tokens (max {t['max_output']:,})")
+        prices = pricing.get(model) or pricing.get('*')
+        if prices:
+            expected = (t['input'] * prices[0] + t['expected_output'] * prices[1]) / 1_000_000
+            worst = (t['input'] * prices[0] + t['max_output'] * prices[1]) / 1_000_000
+            print(f"    Projected cost: ${expected:.4f} (at most ${worst:.4f})")
+    if totals and not pricing:
+        print("  Set PRICE_INPUT_PER_MTOK/PRICE_OUTPUT_PER_MTOK or MODEL_PRICING_FILE for a cost projection")
+
+    if overflowing:
+        print(f"\n⚠ {len(overflowing)} request(s) would exceed the context window:")
+        for custom_id in overflowing:
+            print(f"  - {custom_id}")
+    return overflowing
+
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description='Estimate tokens and cost of batch request files')
+    parser.add_argument('files', nargs='*', metavar='FILE',
+                        help='JSONL request files (default: shards of the latest batch manifest)')
+    parser.add_argument('--manifest', metavar='FILE', help='Estimate the shards listed in this manifest')
+    parser.add_argument('--tokenizer', metavar='SPEC',
+                        help='chars (default), tiktoken:<encoding> or hf:<model>')
+    parser.add_argument('--set-max-tokens', action='store_true',
+                        help='Rewrite each request\'s max_tokens from its length and SUMMARY_WORD_COUNT')
+    parser.add_argument('--totals-only', action='store_true', help='Skip the per-request lines')
+    args = parser.parse_args()
+
+    load_dotenv()
+    word_count = os.getenv('SUMMARY_WORD_COUNT', '2000')
+    count_tokens = get_token_counter(args.tokenizer)
+
+    request_files = args.files or request_files_from_manifest(args.manifest)
+    if not request_files:
+        print("Error: No request files given and no batch_manifest_*.json found.")
+        exit(1)
+
+    if args.set_max_tokens:
+        for path in request_files:
+            set_max_tokens(path, count_tokens, word_count)
+        print(f"✓ Set per-request max_tokens in {len(request_files)} file(s)")
+
+    overflowing = preflight(request_files, count_tokens, word_count, per_request=not args.totals_only)
+    if overflowing:
+        exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Model and prompt variants generated from a single extraction pass.
+
+create_batch.py builds one request per document for every combination of
+model and prompt template, so models or prompts can be compared side by
+side without extracting the documents again. Lists come from --models and
+--prompts or SUMMARY_MODELS and SUMMARY_PROMPTS, comma-separated, and each
+entry may be given a short name:
+
+  SUMMARY_MODELS=235b=Qwen/Qwen3-VL-235B-A22B-Instruct-FP8,30b=Qwen/Qwen3-VL-30B-A3B-Instruct-FP8
+  SUMMARY_PROMPTS=summarisation_prompt.txt,brief=brief_prompt.txt
+
+The variant name (e.g. '235b', or '235b.brief' when both lists have
+several entries) prefixes each custom_id and names the subdirectory of
+data/summaries/ its results go to. With a single model and prompt there is
+no variant name, and custom_ids and output paths are as before.
+"""
+
+import os
+import re
+from pathlib import Path
+from request_ids import MAX_VARIANT_LENGTH, VARIANT_PATTERN
+
+DEFAULT_MODEL = 'Qwen/Qwen3-VL-235B-A22B-Instruct-FP8'
+DEFAULT_PROMPT_FILE = 'summarisation_prompt.txt'
+
+
+def _label(value):
+    """Derive a custom_id-safe name from a model ID or prompt path."""
+    if value.endswith('.txt'):
+        # summarisation_prompt.txt -> summarisation
+        name = re.sub(r'[_-]prompt$', '', Path(value).stem)
+    else:
+        name = value.rsplit('/', 1)[-1]
+    return re.sub(r'[^a-z0-9_.-]', '-', name.lower())[:MAX_VARIANT_LENGTH]
+
+
+def _parse_list(spec):
+    """Split 'name=value,value' into [(name, value)], deriving missing names."""
+    entries = []
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, value = item.rpartition('=')
+        entries.append((name.strip() or _label(value), value.strip()))
+    return entries
+
+
+def load_variants(models=None, prompts=None):
+    """Return the variants to generate as dicts with name, model and prompt_file.
+
+    models and prompts are comma-separated specs (see module docstring),
+    falling back to SUMMARY_MODELS / DOUBLEWORD_MODEL and SUMMARY_PROMPTS.
+    Exits with an error if two variants end up with the same name.
+    """
+    model_list = _parse_list(models or os.getenv('SUMMARY_MODELS')) or \
+        [('', os.getenv('DOUBLEWORD_MODEL', DEFAULT_MODEL))]
+    prompt_list = _parse_list(prompts or os.getenv('SUMMARY_PROMPTS')) or [('', DEFAULT_PROMPT_FILE)]
+
+    variants = []
+    for model_name, model in model_list:
+        for prompt_name, prompt_file in prompt_list:
+            # Only the dimensions that vary appear in the name
+            parts = [model_name if len(model_list) > 1 else '', prompt_name if len(prompt_list) > 1 else '']
+            name = '.'.join(part for part in parts if part) or None
+            variants.append({'name': name, 'model': model, 'prompt_file': prompt_file})
+
+    names = [variant['name'] for variant in variants]
+    for name in names:
+        if name and not re.fullmatch(VARIANT_PATTERN, name):
+            raise SystemExit(f"Error: variant name '{name}' must be 1-{MAX_VARIANT_LENGTH} letters, digits, "
+                             "'.', '_' or '-'; name it explicitly, e.g. --models 235b=<model> "
+                             "or --prompts brief=<file>")
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise SystemExit(f"Error: duplicate variant name(s) {', '.join(sorted(map(str, duplicates)))}; "
+                         "name them explicitly, e.g. --models 235b=<model>,30b=<model>")
+    for variant in variants:
+        if not os.path.exists(variant['prompt_file']):
+            raise SystemExit(f"Error: prompt file '{variant['prompt_file']}' not found")
+    return variants
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""Watch the input folder and summarise documents as they arrive.
+
+Runs until stopped with Ctrl+C or SIGTERM:
+
+  python watch_pipeline.py                          # watch data/papers/
+  python watch_pipeline.py --input-dir /srv/inbox --max-wait 60
+  python watch_pipeline.py --once                   # process what is there now, then exit
+
+Every scan extracts files that are new or changed, using create_batch.py
+and all of its options. A file is left alone until it has not been modified
+for WATCH_SETTLE_SECONDS, so half-copied files are skipped. The requests
+are held back and submitted together as one micro-batch as soon as
+WATCH_MAX_REQUESTS requests, WATCH_MAX_TOKENS estimated tokens or
+WATCH_MAX_WAIT seconds is reached. Any number of batches can be in flight.
+Each one is checked on the adaptive POLLING_* schedule, and its summaries
+are saved as soon as it completes. Reduce and retry batches are followed
+too.
+
+Progress is kept in data/watch_state.json (WATCH_STATE), which is written
+atomically after every step. A restarted daemon picks up its in-flight
+batches and held-back requests. A micro-batch interrupted during
+submission is matched to its batch by metadata instead of being submitted
+again, and a finished batch is not processed twice. Transient API errors
+postpone the affected check or submission instead of stopping the daemon.
+"""
+
+import copy
+import json
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+from openai import NotFoundError
+import metrics
+from api_client import create_client, is_retryable, retry_delay
+from batch_writer import ShardedBatchWriter
+from compression import open_text
+from create_batch import build_parser, create_batch
+from discovery import discovery_options, iter_files
+from extractors import supported_extensions
+from poll_and_process import TERMINAL_STATUSES, next_interval, polling_intervals, record_batch_timings
+from process_results import done_path_for, process_batch
+from prune_artifacts import prune_from_env
+from submit_batch import submit_shards
+
+DEFAULT_STATE_PATH = 'data/watch_state.json'
+
+
+class WatchState:
+    """JSON-backed daemon state: files seen, requests held back and batches in flight."""
+
+    def __init__(self, path, seen=None, pending=None, submitting=None, in_flight=None):
+        self.path = Path(path)
+        self.seen = seen or {}              # file path -> [size, mtime_ns] when last extracted
+        self.pending = pending or []        # create_batch.py outputs not yet in a micro-batch
+        self.submitting = submitting or []  # micro-batch shards not yet known to have a batch
+        self.in_flight = in_flight or {}    # batch ID -> polling schedule
+
+    @classmethod
+    def load(cls, path=None):
+        """Load the state, or return an empty one if it does not exist yet."""
+        path = Path(path or os.getenv('WATCH_STATE', DEFAULT_STATE_PATH))
+        if not path.exists():
+            return cls(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(path, data.get('seen'), data.get('pending'), data.get('submitting'),
+                   data.get('in_flight'))
+
+    def save(self):
+        """Write the state atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'seen': self.seen, 'pending': self.pending, 'submitting': self.submitting,
+                       'in_flight': self.in_flight}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def track(self, batch_id, interval):
+        """Start polling a newly submitted batch."""
+        self.in_flight[batch_id] = {'interval': interval, 'next_check': time.time(), 'last_seen': None}
+
+    def pending_totals(self):
+        """Return (requests, estimated tokens, age in seconds of the oldest) held back."""
+        if not self.pending:
+            return 0, 0, 0
+        return (sum(entry['requests'] for entry in self.pending),
+                sum(entry['tokens'] for entry in self.pending),
+                time.time() - min(entry['created'] for entry in self.pending))
+
+
+def watch_limits():
+    """Return the micro-batch limits and scan timings from WATCH_* variables."""
+    return {
+        'max_requests': int(os.getenv('WATCH_MAX_REQUESTS', '100')),
+        'max_tokens': int(os.getenv('WATCH_MAX_TOKENS', '2000000')),
+        'max_wait': float(os.getenv('WATCH_MAX_WAIT', '300')),
+        'scan_interval': float(os.getenv('WATCH_SCAN_INTERVAL', '10')),
+        'settle_seconds': float(os.getenv('WATCH_SETTLE_SECONDS', '5')),
+    }
+
+
+def scan_ready(input_dir, seen, settle_seconds, options=None):
+    """Return {path: [size, mtime_ns]} for supported files that are new or changed and settled.
+
+    options are the discovery filters (recursion, include/exclude, size,
+    age) from the command line; see discovery.py.
+    """
+    now = time.time()
+    ready = {}
+    for path, stat in iter_files(input_dir, supported_extensions(), **(options or {})):
+        signature = [stat.st_size, stat.st_mtime_ns]
+        path = str(Path(path).resolve())
+        if seen.get(path) != signature and now - stat.st_mtime >= settle_seconds:
+            ready[path] = signature
+    return dict(sorted(ready.items()))
+
+
+def extract_files(args, ready, state):
+    """Extract new files with create_batch.py and hold their requests back."""
+    file_args = copy.copy(args)
+    file_args.files = list(ready)
+    file_args.input_dir = None
+    manifest_path = create_batch(file_args)
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+
+    if manifest['total_requests']:
+        state.pending.append({
+            'manifest': str(manifest_path),
+            'shards': [shard['path'] for shard in manifest['shards']],
+            'requests': manifest['total_requests'],
+            'tokens': sum(shard['estimated_tokens'] for shard in manifest['shards']),
+            'created': time.time(),
+        })
+    else:
+        Path(manifest_path).unlink(missing_ok=True)
+    state.seen.update(ready)
+    state.save()
+
+
+def flush_reason(state, limits, force=False):
+    """Return why the held-back requests should be submitted now, or None."""
+    requests, tokens, age = state.pending_totals()
+    if not requests:
+        return None
+    if force:
+        return f"{requests} request(s) pending"
+    if requests >= limits['max_requests']:
+        return f"{requests} requests (WATCH_MAX_REQUESTS={limits['max_requests']})"
+    if tokens >= limits['max_tokens']:
+        return f"~{tokens:,} tokens (WATCH_MAX_TOKENS={limits['max_tokens']:,})"
+    if age >= limits['max_wait']:
+        return f"oldest request waited {age:.0f}s (WATCH_MAX_WAIT={limits['max_wait']:g})"
+    return None
+
+
+def flush(client, state, reason, min_interval):
+    """Combine the held-back requests into one micro-batch and submit it."""
+    requests, tokens, _ = state.pending_totals()
+    print(f"\nSubmitting micro-batch: {reason}")
+    writer = ShardedBatchWriter.from_env(datetime.now().strftime('%Y%m%d_%H%M%S_%f'), prefix='watch')
+    for entry in state.pending:
+        for shard in entry['shards']:
+            with open_text(shard) as f:
+                for line in f:
+                    if line.strip():
+                        writer.write(json.loads(line))
+    writer.close()
+    metrics.emit('micro_batch', requests=requests, tokens=tokens, shards=len(writer.shards), reason=reason)
+
+    consumed, state.pending = state.pending, []
+    state.submitting.extend({'shard': shard['path'], 'started': time.time(), 'attempted': False}
+                            for shard in writer.shards)
+    state.save()
+    # The requests now live in the micro-batch shards
+    for entry in consumed:
+        for path in entry['shards'] + [entry['manifest']]:
+            Path(path).unlink(missing_ok=True)
+    submit_waiting(client, state, min_interval)
+
+
+def find_submitted(client, shard_name, since):
+    """Return the ID of a batch created for shard_name since the given time, or None."""
+    for batch in client.batches.list(limit=100):
+        if (batch.metadata or {}).get('watch_shard') == shard_name:
+            return batch.id
+        if batch.created_at and batch.created_at < since - 60:
+            break
+    return None
+
+
+def submit_waiting(client, state, min_interval):
+    """Submit micro-batch shards that have no batch yet, without creating duplicates.
+
+    A transient API error leaves the remaining shards waiting for the next
+    call; a shard already attempted is then looked up before it is sent.
+    """
+    for entry in list(state.submitting):
+        name = Path(entry['shard']).name
+        try:
+            batch_id = find_submitted(client, name, entry['started']) if entry['attempted'] else None
+            if batch_id:
+                print(f"✓ {name} was already submitted as {batch_id}")
+            else:
+                entry['attempted'] = True
+                state.save()
+                batch_id = submit_shards(client, [entry['shard']], {'watch_shard': name})[0]
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            print(f"⚠ Submitting {name} failed ({type(e).__name__}); trying again on the next scan")
+            return
+        state.submitting.remove(entry)
+        state.track(batch_id, min_interval)
+        state.save()
+
+
+def finish_batch(client, state, batch, min_interval):
+    """Save a finished batch's results and start following its follow-up batches.
+
+    The entry is marked as processing, and process_batch()'s progress file
+    created, before any result is saved. If the daemon stops part-way, the
+    progress file is still there and processing resumes where it left off;
+    if it is gone, processing had finished and is not repeated.
+    """
+    entry = state.in_flight[batch.id]
+    follow_up_ids = []
+    if batch.status in ('completed', 'expired'):
+        done_path = done_path_for(batch)
+        if entry.get('processing') and not done_path.exists():
+            print(f"\n✓ Batch {batch.id} was already processed; any follow-up batches it submitted are "
+                  "in the batch ID files for poll_and_process.py")
+        else:
+            done_path.parent.mkdir(parents=True, exist_ok=True)
+            done_path.touch()
+            entry['processing'] = True
+            state.save()
+            print(f"\n✓ Batch {batch.id} {batch.status}; processing results...\n")
+            results_count, follow_up_ids = process_batch(client, batch)
+            print(f"\n✓ Saved {results_count} results from {batch.id}")
+    else:
+        print(f"\n✗ Batch {batch.id} {batch.status}!")
+        if batch.errors:
+            print(f"Errors: {batch.errors}")
+    del state.in_flight[batch.id]
+    for follow_up_id in follow_up_ids:
+        print(f"Following up batch {follow_up_id} submitted by {batch.id}")
+        state.track(follow_up_id, min_interval)
+    state.save()
+
+
+def poll_due(client, state, min_interval, max_interval, backoff):
+    """Check every in-flight batch whose next check is due, processing finished ones.
+
+    Rate limits, connection and server errors, and a new batch that is
+    briefly unknown to the API, only delay that batch's next check, with
+    jittered backoff; the daemon keeps running.
+    """
+    changed = False
+    for batch_id, entry in list(state.in_flight.items()):
+        now = time.time()
+        if entry['next_check'] > now:
+            continue
+        changed = True
+        try:
+            batch = client.batches.retrieve(batch_id)
+            status = batch.status
+            completed = batch.request_counts.completed
+            total = batch.request_counts.total
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+            print(f"[{timestamp}] {batch_id} Status: {status} | Progress: {completed}/{total}")
+
+            if status in TERMINAL_STATUSES:
+                record_batch_timings(batch)
+                finish_batch(client, state, batch, min_interval)
+                continue
+        except Exception as e:
+            if not (is_retryable(e) or isinstance(e, NotFoundError)):
+                raise
+            errors = entry.get('errors', 0)
+            entry['errors'] = errors + 1
+            delay = retry_delay(e, errors, min_interval, max_interval)
+            print(f"⚠ {batch_id}: check failed ({type(e).__name__}); trying again in {delay:.0f}s")
+            entry['next_check'] = now + delay
+            continue
+
+        entry.pop('errors', None)
+        progressed = entry['last_seen'] != [status, completed]
+        entry['last_seen'] = [status, completed]
+        entry['interval'] = next_interval(entry['interval'], progressed, completed, total,
+                                          min_interval, max_interval, backoff)
+        entry['next_check'] = now + entry['interval']
+
+    if changed:
+        state.save()
+
+
+def stop_on_sigterm(signum, frame):
+    """Treat SIGTERM like Ctrl+C so state is saved and the loop exits cleanly."""
+    raise KeyboardInterrupt
+
+
+def main():
+    # Load environment variables
+    load_dotenv()
+
+    # Accept every create_batch.py option, plus the watch ones
+    limits = watch_limits()
+    parser = build_parser()
+    parser.description = 'Watch a folder and summarise documents as they arrive'
+    parser.epilog = None
+    parser.add_argument('--once', action='store_true',
+                        help='Process the files present now, wait for their batches, then exit')
+    parser.add_argument('--max-requests', type=int, default=limits['max_requests'], metavar='N',
+                        help='Submit a micro-batch at N requests (default: 100, or WATCH_MAX_REQUESTS)')
+    parser.add_argument('--max-tokens', type=int, default=limits['max_tokens'], metavar='N',
+                        help='...or N estimated tokens (default: 2000000, or WATCH_MAX_TOKENS)')
+    parser.add_argument('--max-wait', type=float, default=limits['max_wait'], metavar='SECONDS',
+                        help='...or when the oldest request has waited this long (default: 300, or WATCH_MAX_WAIT)')
+    args = parser.parse_args()
+    limits.update(max_requests=args.max_requests, max_tokens=args.max_tokens, max_wait=args.max_wait)
+
+    input_dir = Path(args.input_dir or 'data/papers')
+    if not input_dir.is_dir():
+        print(f"Error: Directory '{input_dir}' does not exist")
+        sys.exit(1)
+
+    client = create_client()
+    min_interval, max_interval, backoff = polling_intervals()
+    state = WatchState.load()
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+
+    print(f"Watching {input_dir}/ every {limits['scan_interval']:g}s")
+    print(f"Micro-batches: {limits['max_requests']} requests, ~{limits['max_tokens']:,} tokens "
+          f"or {limits['max_wait']:g}s, whichever comes first")
+    if state.in_flight or state.pending or state.submitting:
+        print(f"Resuming: {len(state.in_flight)} batch(es) in flight, "
+              f"{state.pending_totals()[0]} request(s) pending")
+    print("Press Ctrl+C to stop\n")
+
+    try:
+        submit_waiting(client, state, min_interval)
+        scanned = False
+        while True:
+            if not (args.once and scanned):
+                ready = scan_ready(input_dir, state.seen, 0 if args.once else limits['settle_seconds'],
+                                   discovery_options(args))
+                scanned = True
+                if ready:
+                    print(f"\n{len(ready)} new or changed file(s) in {input_dir}/")
+                    extract_files(args, ready, state)
+
+            reason = flush_reason(state, limits, force=args.once)
+            if reason:
+                flush(client, state, reason, min_interval)
+            elif state.submitting:
+                submit_waiting(client, state, min_interval)
+
+            poll_due(client, state, min_interval, max_interval, backoff)
+            prune_from_env()
+            metrics.write_prometheus('watch_pipeline')
+
+            if args.once and not (state.pending or state.submitting or state.in_flight):
+                break
+            time.sleep(min(limits['scan_interval'], min_interval) if state.in_flight
+                       else limits['scan_interval'])
+    except KeyboardInterrupt:
+        state.save()
+        metrics.write_prometheus('watch_pipeline')
+        print(f"\n\nStopped; {len(state.in_flight)} batch(es) in flight and "
+              f"{state.pending_totals()[0]} request(s) pending are saved in {state.path}")
+        print("Run watch_pipeline.py again to resume")
+        return
+
+    print(f"\n✓ All files in {input_dir}/ processed; summaries saved to data/summaries/")
+
+
+if __name__ == '__main__':
+    main()